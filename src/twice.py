@@ -0,0 +1,58 @@
+"""
+TWICE — Point d'entree unique
+  python src/twice.py run [options]       simulation (options de twice_run)
+  python src/twice.py report [--workers]  rapport depuis outputs/resultats_latest.json
+  python src/twice.py all [options]       simulation puis rapport, dans le meme processus
+Avec all, le resultat du run est remis au rendu en memoire : le JSON est
+ecrit une seule fois (compact) et n'est pas relu. Chaque sous-commande
+n'importe que les modules de son chemin : report relit les colonnes avec
+numpy, mais ne charge ni le run (twice_run, graphe OSM) ni l'acquisition
+meteo (twice_meteo, twice_cache, requests).
+"""
+
+import argparse
+import sys
+
+
+def _run(argv):
+    import twice_run
+    twice_run.main(argv)
+
+
+def _report(argv):
+    import twice_report
+    twice_report.main(argv)
+
+
+def _all(argv):
+    import twice_format as fmt
+    import twice_report as report
+    import twice_run
+    import twice_telemetrie as tel
+    ap = argparse.ArgumentParser(prog="twice.py all", description="TWICE — simulation puis rapport HTML")
+    a  = report.arguments(twice_run.arguments(ap)).parse_args(argv)
+    rapport = twice_run.executer(a)
+
+    # Meme structure que twice_report apres relecture, sans passer par le disque
+    tel.demarrer()
+    with tel.span("passage_memoire") as sp:
+        data = fmt.vers_legacy(fmt.etendre(rapport))
+        sp.compter(len(data["meteo"]["times"]) * len(data["resultats"]))
+    report.publier(data, a.workers)
+
+
+COMMANDES = {"run": _run, "report": _report, "all": _all}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    ap = argparse.ArgumentParser(description="TWICE — simulation pluie -> pertes et rapport HTML",
+                                 usage="%(prog)s {run,report,all} [options]")
+    ap.add_argument("commande", choices=COMMANDES,
+                    help="run : simulation ; report : rapport ; all : les deux, passage en memoire")
+    commande = ap.parse_args(argv[:1]).commande
+    COMMANDES[commande](argv[1:])
+
+
+if __name__ == "__main__":
+    main()
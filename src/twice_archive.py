@@ -0,0 +1,281 @@
+"""
+TWICE — Archive des runs (SQLite, ajout seul)
+Chaque run est ajoute a une base SQLite locale au lieu de seulement ecraser
+resultats_latest.json : entrees (pluie par point), hypotheses, statuts des
+routes et, par site, agregats et intervalles [debut, fin[ (accessibilite,
+taux, perte horaire) en heures de validite. Index par date d'emission, site
+et heure de validite : "perte prevue pour le site X par le run emis a T pour
+l'heure H" et "evolution de cette prevision sur les 48 derniers runs" sont
+des lectures d'index.
+Retention : tous les runs des RETENTION_COMPLETE_J derniers jours, puis un
+run par jour (le dernier emis) jusqu'a RETENTION_J jours ; au-dela, supprime.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import twice_format as fmt
+
+# ============================================================
+# PARAMETRES
+# ============================================================
+CHEMIN               = os.environ.get("TWICE_ARCHIVE", "archive/twice.sqlite")
+RETENTION_COMPLETE_J = 14      # jours ou tous les runs sont conserves
+RETENTION_J          = 365     # au-dela : runs supprimes
+FMT_EMIS             = "%Y-%m-%dT%H:%M:%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY,
+    emis        TEXT NOT NULL,          -- generated_at, UTC
+    maintenant  TEXT NOT NULL,          -- heure de validite de now_index
+    debut       TEXT NOT NULL,          -- premiere heure de validite
+    fin         TEXT NOT NULL,          -- derniere heure + pas (exclue)
+    config_hash TEXT,
+    hypotheses  TEXT NOT NULL,          -- JSON
+    routes      TEXT NOT NULL,          -- JSON : routes, intervalles de statuts
+    entrees     BLOB NOT NULL           -- JSON zlib : temps, points meteo et pluie
+);
+CREATE INDEX IF NOT EXISTS runs_emis ON runs (emis);
+
+CREATE TABLE IF NOT EXISTS sites (
+    id      INTEGER PRIMARY KEY,
+    site_id TEXT NOT NULL UNIQUE,
+    nom     TEXT
+);
+
+CREATE TABLE IF NOT EXISTS resultats (
+    site              INTEGER NOT NULL REFERENCES sites (id),
+    run               INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    perte_totale_eur  REAL NOT NULL,
+    heures_normales   INTEGER NOT NULL,
+    heures_degradees  INTEGER NOT NULL,
+    heures_arret      INTEGER NOT NULL,
+    accessibilite_min REAL NOT NULL,
+    PRIMARY KEY (site, run)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS resultats_run ON resultats (run);
+
+CREATE TABLE IF NOT EXISTS intervalles (
+    site          INTEGER NOT NULL REFERENCES sites (id),
+    run           INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    debut         TEXT NOT NULL,
+    fin           TEXT NOT NULL,
+    accessibilite REAL NOT NULL,
+    taux_activite REAL NOT NULL,
+    perte_eur     REAL NOT NULL,
+    PRIMARY KEY (site, run, debut)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS intervalles_run ON intervalles (run);
+"""
+
+
+# ============================================================
+# OUVERTURE
+# ============================================================
+
+def ouvrir(chemin=CHEMIN):
+    d = os.path.dirname(chemin)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    con = sqlite3.connect(chemin)
+    con.execute("PRAGMA journal_mode = WAL")
+    con.execute("PRAGMA foreign_keys = ON")
+    con.executescript(SCHEMA)
+    return con
+
+
+def instant(iso):
+    # Date ISO (avec ou sans fuseau ; sans = UTC) -> texte UTC de la colonne emis
+    d = datetime.fromisoformat(iso)
+    if d.tzinfo is not None:
+        d = d.astimezone(timezone.utc).replace(tzinfo=None)
+    return d.strftime(FMT_EMIS)
+
+
+def heure_validite(iso):
+    # Heure locale de validite, au format des temps du rapport
+    return datetime.fromisoformat(iso).strftime(fmt.FMT_TEMPS)
+
+
+def _heures_validite(temps):
+    # Heures de validite, plus l'heure qui suit la derniere (bornes fin)
+    times = fmt.decoder_temps(temps)
+    if not times:
+        return times
+    pas = temps.get("pas_h", 1)
+    suite = datetime.strptime(times[-1], fmt.FMT_TEMPS) + timedelta(hours=pas)
+    return times + [suite.strftime(fmt.FMT_TEMPS)]
+
+
+# ============================================================
+# AJOUT
+# ============================================================
+
+def ajouter(con, rapport):
+    # Ajoute un rapport v3 (construire_rapport) ; renvoie l'id du run
+    heures  = _heures_validite(rapport["temps"])
+    if not heures:
+        raise ValueError("run sans heure de validite : rien a archiver")
+    points  = [{k: p[k] for k in ("lat", "lon", "precipitation")} for p in rapport["meteo"]["points"]]
+    entrees = zlib.compress(json.dumps({"temps": rapport["temps"], "points": points},
+                                       separators=(",", ":")).encode("utf-8"))
+    routes  = json.dumps({"routes": rapport["routes"], "statuts_codes": rapport["statuts_codes"],
+                          "statuts": rapport["statuts"]}, separators=(",", ":"))
+    with con:
+        run = con.execute(
+            "INSERT INTO runs (emis, maintenant, debut, fin, config_hash, hypotheses, routes, entrees) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (instant(rapport["generated_at"]), heures[rapport["now_index"]], heures[0], heures[-1],
+             rapport.get("config_hash"), json.dumps(rapport["hypotheses"], ensure_ascii=False),
+             routes, entrees),
+        ).lastrowid
+        con.executemany("INSERT OR IGNORE INTO sites (site_id, nom) VALUES (?, ?)",
+                        [(r["site_id"], r["site_nom"]) for r in rapport["resultats"]])
+        ids = dict(con.execute("SELECT site_id, id FROM sites"))
+        con.executemany(
+            "INSERT INTO resultats VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(ids[r["site_id"]], run, r["perte_totale_eur"], r["heures_normales"], r["heures_degradees"],
+              r["heures_arret"], r["accessibilite_min"]) for r in rapport["resultats"]],
+        )
+        con.executemany(
+            "INSERT INTO intervalles VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((ids[r["site_id"]], run, heures[d], heures[f], a, t, p)
+             for r in rapport["resultats"]
+             for d, f, a, t, p in zip(*(r["intervalles"][c] for c in
+                                        ("debut", "fin", "accessibilite", "taux_activite", "perte_eur")))),
+        )
+    return run
+
+
+# ============================================================
+# RETENTION
+# ============================================================
+
+def compacter(con, maintenant=None, complet_j=RETENTION_COMPLETE_J, total_j=RETENTION_J):
+    # Supprime les runs hors politique de retention, puis rend la place
+    # au systeme de fichiers si besoin. Renvoie le nombre de runs supprimes.
+    ref     = datetime.strptime(instant(maintenant or datetime.now(timezone.utc).isoformat()), FMT_EMIS)
+    complet = (ref - timedelta(days=complet_j)).strftime(FMT_EMIS)
+    limite  = (ref - timedelta(days=total_j)).strftime(FMT_EMIS)
+    with con:
+        n = con.execute("DELETE FROM runs WHERE emis < ?", (limite,)).rowcount
+        n += con.execute(
+            "DELETE FROM runs WHERE emis < ? AND emis NOT IN ("
+            "  SELECT MAX(emis) FROM runs WHERE emis < ? GROUP BY substr(emis, 1, 10))",
+            (complet, complet),
+        ).rowcount
+    if n:
+        con.execute("VACUUM")
+    return n
+
+
+# ============================================================
+# REQUETES
+# ============================================================
+
+def run_emis(con, emis):
+    # Dernier run emis au plus tard a emis : (id, emis) ou None
+    return con.execute("SELECT id, emis FROM runs WHERE emis <= ? ORDER BY emis DESC LIMIT 1",
+                       (instant(emis),)).fetchone()
+
+
+def prevision(con, site_id, emis, heure):
+    # Prevision du site pour l'heure de validite heure, par le dernier run
+    # emis au plus tard a emis ; None si aucun run ne couvre cette heure
+    run = run_emis(con, emis)
+    if run is None:
+        return None
+    heure = heure_validite(heure)
+    ligne = con.execute(
+        "SELECT i.accessibilite, i.taux_activite, i.perte_eur FROM intervalles i JOIN sites s ON s.id = i.site "
+        "WHERE s.site_id = ? AND i.run = ? AND i.debut <= ? AND i.fin > ? ORDER BY i.debut DESC LIMIT 1",
+        (site_id, run[0], heure, heure),
+    ).fetchone()
+    if ligne is None:
+        return None
+    return {"site_id": site_id, "emis": run[1], "heure": heure,
+            "accessibilite": ligne[0], "taux_activite": ligne[1], "perte_eur": ligne[2]}
+
+
+def evolution(con, site_id, heure, n_runs=48, emis=None):
+    # Prevision de l'heure heure par les n_runs derniers runs (les plus
+    # anciens d'abord) ; valeurs None si l'heure sort de l'horizon d'un run
+    heure  = heure_validite(heure)
+    emis   = instant(emis) if emis else datetime.now(timezone.utc).strftime(FMT_EMIS)
+    lignes = con.execute(
+        "SELECT r.emis, i.accessibilite, i.taux_activite, i.perte_eur FROM ("
+        "  SELECT id, emis FROM runs WHERE emis <= ? ORDER BY emis DESC LIMIT ?) r "
+        "LEFT JOIN intervalles i ON i.run = r.id "
+        "  AND i.site = (SELECT id FROM sites WHERE site_id = ?) AND i.debut <= ? AND i.fin > ? "
+        "ORDER BY r.emis",
+        (emis, n_runs, site_id, heure, heure),
+    ).fetchall()
+    return [{"emis": e, "accessibilite": a, "taux_activite": t, "perte_eur": p} for e, a, t, p in lignes]
+
+
+def totaux(con, site_id, n_runs=48):
+    # Agregats du site sur les n_runs derniers runs (les plus anciens d'abord)
+    lignes = con.execute(
+        "SELECT r.emis, x.perte_totale_eur, x.heures_arret, x.heures_degradees, x.accessibilite_min "
+        "FROM resultats x JOIN runs r ON r.id = x.run "
+        "WHERE x.site = (SELECT id FROM sites WHERE site_id = ?) ORDER BY r.emis DESC LIMIT ?",
+        (site_id, n_runs),
+    ).fetchall()
+    return [{"emis": e, "perte_totale_eur": p, "heures_arret": a, "heures_degradees": d, "accessibilite_min": m}
+            for e, p, a, d, m in reversed(lignes)]
+
+
+def runs(con, n_runs=20):
+    lignes = con.execute("SELECT id, emis, maintenant, debut, fin, config_hash FROM runs "
+                         "ORDER BY emis DESC LIMIT ?", (n_runs,)).fetchall()
+    return [dict(zip(("id", "emis", "maintenant", "debut", "fin", "config_hash"), l)) for l in reversed(lignes)]
+
+
+def entrees(con, run):
+    # Entrees d'un run : temps encodes et points meteo avec leur pluie
+    return json.loads(zlib.decompress(con.execute("SELECT entrees FROM runs WHERE id = ?", (run,)).fetchone()[0]))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="TWICE — archive des runs")
+    ap.add_argument("--archive", default=CHEMIN)
+    sous = ap.add_subparsers(dest="commande", required=True)
+    p = sous.add_parser("runs", help="derniers runs archives")
+    p.add_argument("-n", type=int, default=20)
+    p = sous.add_parser("prevision", help="prevision d'un site pour une heure, par le run emis a une date")
+    p.add_argument("--site", required=True)
+    p.add_argument("--heure", required=True, help="heure de validite AAAA-MM-JJTHH:MM (heure locale)")
+    p.add_argument("--emis", default=datetime.now(timezone.utc).isoformat(), help="date d'emission (UTC)")
+    p = sous.add_parser("evolution", help="prevision d'une heure sur les derniers runs")
+    p.add_argument("--site", required=True)
+    p.add_argument("--heure", required=True)
+    p.add_argument("-n", type=int, default=48)
+    p = sous.add_parser("totaux", help="agregats d'un site sur les derniers runs")
+    p.add_argument("--site", required=True)
+    p.add_argument("-n", type=int, default=48)
+    p = sous.add_parser("compacter", help="appliquer la politique de retention")
+    p.add_argument("--complet-j", type=int, default=RETENTION_COMPLETE_J)
+    p.add_argument("--total-j", type=int, default=RETENTION_J)
+    a = ap.parse_args()
+
+    con = ouvrir(a.archive)
+    if a.commande == "runs":
+        out = runs(con, a.n)
+    elif a.commande == "prevision":
+        out = prevision(con, a.site, a.emis, a.heure)
+    elif a.commande == "evolution":
+        out = evolution(con, a.site, a.heure, a.n)
+    elif a.commande == "totaux":
+        out = totaux(con, a.site, a.n)
+    else:
+        out = {"runs_supprimes": compacter(con, complet_j=a.complet_j, total_j=a.total_j)}
+    print(json.dumps(out, ensure_ascii=False, indent=1))
+
+
+if __name__ == "__main__":
+    main()
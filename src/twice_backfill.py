@@ -0,0 +1,297 @@
+"""
+TWICE — Rejeu historique long (backfill)
+Rejoue des annees de pluie horaire (archive Open-Meteo aux points meteo du
+run, ou fichier local CSV / Parquet : une serie appliquee a tous les points)
+en flux, bloc par bloc, sur le portefeuille et le modele compile du run :
+l'etat de la fenetre glissante est reporte d'un bloc au suivant, les sites
+sont evalues par lots, et seuls des
+agregats par mois (pertes, heures d'arret / degradees, accessibilite min) et
+les pires evenements par site sont conserves. La memoire ne depend que de la
+taille des blocs et des lots, pas de la duree rejouee.
+"""
+
+import argparse
+import csv
+import heapq
+import json
+import os
+from datetime import date, timedelta
+
+import numpy as np
+
+import twice_engine as engine
+import twice_meteo as meteo
+import twice_run as twice
+
+# ============================================================
+# PARAMETRES
+# ============================================================
+URL_ARCHIVE     = "https://archive-api.open-meteo.com/v1/archive"
+MOIS_PAR_REQUETE = 12
+HEURES_PAR_BLOC = 24 * 31
+SITES_PAR_LOT   = 1000
+N_PIRES         = 10
+SORTIE          = "outputs/backfill.json"
+
+
+# ============================================================
+# SOURCES (generateurs de blocs (times, precip))
+# ============================================================
+# precip : une ligne par point meteo (points x heures), ou une seule serie
+# commune a tous les points (fichiers locaux)
+
+def _mois_suivant(d, n):
+    m = d.month - 1 + n
+    return date(d.year + m // 12, m % 12 + 1, 1)
+
+
+def source_archive(points, debut, fin, mois_par_requete=MOIS_PAR_REQUETE):
+    # points : twice_run.points_meteo ; requetes multi-localisations comme le run
+    d = debut
+    while d <= fin:
+        f = min(_mois_suivant(d, mois_par_requete) - timedelta(days=1), fin)
+        params = {
+            "start_date": d.isoformat(),
+            "end_date":   f.isoformat(),
+            "hourly":     "precipitation",
+            "timezone":   "Europe/Luxembourg",
+        }
+        times, horaire = meteo.fetch_horaire(points, params, URL_ARCHIVE)
+        yield times, [horaire[p]["precipitation"] for p in points]
+        d = f + timedelta(days=1)
+
+
+def source_csv(chemin, col_temps="time", col_pluie="precipitation", bloc=HEURES_PAR_BLOC):
+    with open(chemin, newline="", encoding="utf-8") as f:
+        times, precip = [], []
+        for ligne in csv.DictReader(f):
+            times.append(ligne[col_temps])
+            precip.append(float(ligne[col_pluie]) if ligne[col_pluie] not in ("", None) else None)
+            if len(times) == bloc:
+                yield times, precip
+                times, precip = [], []
+        if times:
+            yield times, precip
+
+
+def source_parquet(chemin, col_temps="time", col_pluie="precipitation", bloc=HEURES_PAR_BLOC):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Lecture Parquet : installer pyarrow (pip install pyarrow)")
+    for lot in pq.ParquetFile(chemin).iter_batches(batch_size=bloc, columns=[col_temps, col_pluie]):
+        times = [str(t)[:16].replace(" ", "T") for t in lot.column(col_temps).to_pylist()]
+        yield times, lot.column(col_pluie).to_pylist()
+
+
+# ============================================================
+# AGREGATS
+# ============================================================
+
+class Agregats:
+    # Agregats mensuels (sites x mois) et pires evenements par site. Un
+    # evenement = suite d'heures consecutives a taux < 1, suivie a cheval sur
+    # les blocs.
+
+    def __init__(self, n_sites, n_pires=N_PIRES):
+        self.n_sites  = n_sites
+        self.n_pires  = n_pires
+        self.mois     = []
+        self.colonnes = {c: [] for c in ("perte_eur", "heures_arret", "heures_degradees",
+                                          "heures_normales", "accessibilite_min")}
+        self.en_cours = {}                       # site -> [debut, fin, heures, perte, taux_min]
+        self.pires    = [[] for _ in range(n_sites)]
+
+    def _colonne(self, mois):
+        if not self.mois or self.mois[-1] != mois:
+            self.mois.append(mois)
+            self.colonnes["perte_eur"].append(np.zeros(self.n_sites))
+            for c in ("heures_arret", "heures_degradees", "heures_normales"):
+                self.colonnes[c].append(np.zeros(self.n_sites, dtype=np.int64))
+            self.colonnes["accessibilite_min"].append(np.full(self.n_sites, np.inf))
+        return len(self.mois) - 1
+
+    def segments(self, times):
+        # Decoupe un bloc par mois : [(colonne, debut, fin)], a appeler une fois par bloc
+        mois = [t[:7] for t in times]
+        coupures = [0] + [i for i in range(1, len(mois)) if mois[i] != mois[i - 1]]
+        return [(self._colonne(mois[d]), d, f) for d, f in zip(coupures, coupures[1:] + [len(mois)])]
+
+    def ajouter(self, times, segments, lot, sim):
+        # lot : slice des sites ; sim : colonnes (sites du lot x heures du bloc)
+        taux, acc, perte = sim["taux_activite"], sim["accessibilite"], sim["perte_eur"]
+        c = self.colonnes
+        for k, d, f in segments:
+            c["perte_eur"][k][lot]         += perte[:, d:f].sum(axis=1)
+            c["heures_arret"][k][lot]      += (taux[:, d:f] == 0.0).sum(axis=1)
+            c["heures_degradees"][k][lot]  += ((taux[:, d:f] > 0) & (taux[:, d:f] < 1.0)).sum(axis=1)
+            c["heures_normales"][k][lot]   += (taux[:, d:f] == 1.0).sum(axis=1)
+            c["accessibilite_min"][k][lot]  = np.minimum(c["accessibilite_min"][k][lot], acc[:, d:f].min(axis=1))
+        self._evenements(times, lot, taux, perte)
+
+    def _evenements(self, times, lot, taux, perte):
+        degrade = taux < 1.0
+        n       = len(times)
+        actifs  = set(np.flatnonzero(degrade.any(axis=1)).tolist())
+        actifs |= {s - lot.start for s in self.en_cours if lot.start <= s < lot.stop}
+        for j in sorted(actifs):
+            s  = lot.start + j
+            ev = self.en_cours.pop(s, None)
+            # Suites d'heures degradees du bloc : [debuts[r], fins[r])
+            bord   = np.diff(np.concatenate([[0], degrade[j].astype(np.int8), [0]]))
+            debuts = np.flatnonzero(bord == 1)
+            fins   = np.flatnonzero(bord == -1)
+            cumul  = np.concatenate([[0.0], np.cumsum(perte[j])])
+            if debuts.size:
+                t_min = np.minimum.reduceat(np.append(taux[j], 1.0), np.ravel([debuts, fins], order="F"))[::2]
+            for r, (d, f) in enumerate(zip(debuts.tolist(), fins.tolist())):
+                if r == 0 and d == 0 and ev is not None:
+                    ev[1]  = times[f - 1]
+                    ev[2] += f
+                    ev[3] += float(cumul[f])
+                    ev[4]  = min(ev[4], float(t_min[r]))
+                else:
+                    if ev is not None:
+                        self._clore(s, ev)
+                    ev = [times[d], times[f - 1], f - d, float(cumul[f] - cumul[d]), float(t_min[r])]
+                if f < n:
+                    self._clore(s, ev)
+                    ev = None
+            if ev is not None and not debuts.size:
+                self._clore(s, ev)
+            elif ev is not None:
+                self.en_cours[s] = ev
+
+    def _clore(self, s, ev):
+        cle = (round(ev[3], 2), ev[0])
+        if len(self.pires[s]) < self.n_pires:
+            heapq.heappush(self.pires[s], (cle, ev))
+        elif cle > self.pires[s][0][0]:
+            heapq.heapreplace(self.pires[s], (cle, ev))
+
+    def terminer(self):
+        for s, ev in list(self.en_cours.items()):
+            self._clore(s, ev)
+        self.en_cours = {}
+
+
+# ============================================================
+# EXECUTION
+# ============================================================
+
+def rejouer(blocs, pf=None, points=None, sites_par_lot=SITES_PAR_LOT, n_pires=N_PIRES):
+    # pf : portefeuille du run (twice_run.portefeuille() par defaut) ; points :
+    # points meteo des lignes de precip (twice_run.points_meteo(pf) par defaut)
+    pf     = twice.portefeuille() if pf is None else pf
+    points = twice.points_meteo(pf) if points is None else points
+    fen    = twice.FENETRE_GLISSANTE_H
+    routes = twice.point_routes({p: k for k, p in enumerate(points)})
+    lots   = [slice(i, min(i + sites_par_lot, len(pf))) for i in range(0, len(pf), sites_par_lot)]
+    # Modele compile et evaluateur OSM a la demande, un par lot de sites
+    g       = twice.graphe_osm()
+    modeles = {}
+
+    agg    = Agregats(len(pf), n_pires)
+    reste  = np.zeros((len(points), 0))     # fenetre - 1 dernieres heures du bloc precedent
+    n_h    = 0
+    bornes = [None, None]
+    for times, precip in blocs:
+        if not times:
+            continue
+        p       = np.broadcast_to(engine.en_tableau(precip), (len(points), len(times)))
+        etendu  = np.concatenate([reste, p], axis=-1)
+        indices = engine.indice_alea(etendu, fen, twice.SEUIL_MAX_MM)[:, reste.shape[-1]:]
+        reste   = etendu[:, etendu.shape[-1] - (fen - 1):] if fen > 1 else reste
+
+        segments = agg.segments(times)
+        for lot in lots:
+            if lot.start not in modeles:
+                sous = pf.lot(lot)
+                modeles[lot.start] = (engine.compiler(sous, twice.RESEAU_ROUTIER, twice.STATUT_VERS_SCORE),
+                                      twice.acces_osm(sous, g))
+            modele, acces = modeles[lot.start]
+            sim = engine.evaluer(modele, indices, twice.SEUIL_NORMAL, twice.SEUIL_ARRET, routes, acces)
+            agg.ajouter(times, segments, lot, sim)
+
+        n_h += len(times)
+        bornes[0] = bornes[0] or times[0]
+        bornes[1] = times[-1]
+        print(f"  {times[0][:10]} -> {times[-1][:10]}  ({n_h} heures)")
+    agg.terminer()
+    return agg, n_h, bornes
+
+
+def ecrire(agg, pf, n_h, bornes, source, chemin=SORTIE):
+    # Ecrit site par site : le document complet n'est jamais assemble en memoire
+    d = os.path.dirname(chemin)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    entete = {
+        "projet":      "TWICE",
+        "mode":        "backfill",
+        "source":      source,
+        "config_hash": twice.config_hash(),
+        "periode":     {"debut": bornes[0], "fin": bornes[1], "heures": n_h},
+        "hypotheses":  twice.hypotheses(),
+        "mois":        agg.mois,
+    }
+    cols = {c: np.stack(v, axis=1) if v else np.zeros((len(pf), 0)) for c, v in agg.colonnes.items()}
+    with open(chemin, "w", encoding="utf-8") as f:
+        f.write(json.dumps(entete, ensure_ascii=False)[:-1] + ',"sites":[')
+        for k in range(len(pf)):
+            pires = sorted(agg.pires[k], reverse=True)
+            bloc = {
+                "site_id":           pf.ids[k],
+                "site_nom":          pf.noms[k],
+                "perte_eur":         np.round(cols["perte_eur"][k], 2).tolist(),
+                "heures_arret":      cols["heures_arret"][k].tolist(),
+                "heures_degradees":  cols["heures_degradees"][k].tolist(),
+                "heures_normales":   cols["heures_normales"][k].tolist(),
+                "accessibilite_min": cols["accessibilite_min"][k].tolist(),
+                "pires_evenements": [
+                    {"debut": ev[0], "fin": ev[1], "heures": ev[2],
+                     "perte_eur": round(ev[3], 2), "taux_min": ev[4]}
+                    for _, ev in pires
+                ],
+            }
+            f.write(("," if k else "") + json.dumps(bloc, ensure_ascii=False, separators=(",", ":")))
+        f.write("]}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="TWICE — rejeu historique long")
+    ap.add_argument("--source", choices=("archive", "csv", "parquet"), default="archive")
+    ap.add_argument("--debut", type=date.fromisoformat, help="archive : premier jour (AAAA-MM-JJ)")
+    ap.add_argument("--fin", type=date.fromisoformat, help="archive : dernier jour (AAAA-MM-JJ)")
+    ap.add_argument("--fichier", help="csv / parquet : fichier de pluie horaire")
+    ap.add_argument("--colonne-temps", default="time")
+    ap.add_argument("--colonne-pluie", default="precipitation")
+    ap.add_argument("--bloc", type=int, default=HEURES_PAR_BLOC, help="heures par bloc (csv / parquet)")
+    ap.add_argument("--sites-par-lot", type=int, default=SITES_PAR_LOT)
+    ap.add_argument("--sortie", default=SORTIE)
+    # Memes sites, CA et reseau que le run deterministe
+    a = twice.options_configuration(ap).parse_args()
+    twice.configurer(a)
+
+    print("=== TWICE backfill démarrage ===")
+    pf     = twice.portefeuille()
+    points = twice.points_meteo(pf)
+    if a.source == "archive":
+        if not (a.debut and a.fin):
+            ap.error("--source archive : --debut et --fin requis")
+        blocs  = source_archive(points, a.debut, a.fin)
+        source = {"type": "archive", "url": URL_ARCHIVE, "points": len(points)}
+    else:
+        if not a.fichier:
+            ap.error(f"--source {a.source} : --fichier requis")
+        lire   = source_csv if a.source == "csv" else source_parquet
+        blocs  = lire(a.fichier, a.colonne_temps, a.colonne_pluie, a.bloc)
+        source = {"type": a.source, "fichier": a.fichier}
+
+    agg, n_h, bornes = rejouer(blocs, pf, points, sites_par_lot=a.sites_par_lot)
+    ecrire(agg, pf, n_h, bornes, source, a.sortie)
+    print(f"  Sauvegarde : {a.sortie}")
+    print("=== TWICE backfill termine ===")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+TWICE — Banc de performance
+Charges synthetiques (series de pluie de longueur et regime donnes, portefeuilles
+de N sites sur M routes a poids aleatoires) passees dans la chaine de run() etape
+par etape : indice d'alea, statuts, compilation des tables, chaine par
+intervalles, agregation, assemblage et ecriture JSON, relecture et rapport HTML.
+Chaque etape est chronometree (meilleur de n repetitions) puis mesuree en pic
+memoire (tracemalloc, passe separee). Les resultats sont compares a un fichier
+de reference ; code de sortie 1 si une etape regresse au-dela de la tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+import twice_engine as engine
+import twice_evenements as evenements
+import twice_format as fmt
+import twice_portefeuille as portefeuille
+import twice_report as report
+import twice_run as twice
+
+# ============================================================
+# PARAMETRES
+# ============================================================
+SCENARIOS = {
+    "actuel":   {"heures": 216,  "sites": 2,     "routes": 4},
+    "mois_1k":  {"heures": 744,  "sites": 1000,  "routes": 200},
+    "an_1k":    {"heures": 8760, "sites": 1000,  "routes": 500},
+    "an_10k":   {"heures": 8760, "sites": 10000, "routes": 2000},
+}
+PAR_DEFAUT = ("actuel", "mois_1k", "an_1k")
+
+# Alternance episodes secs / pluvieux : duree moyenne (h) de chacun, pluie
+# moyenne (mm/h) pendant un episode pluvieux
+REGIMES = {
+    "sec":     {"sec_h": 120, "pluie_h": 3,  "mm_h": 0.8},
+    "normal":  {"sec_h": 40,  "pluie_h": 6,  "mm_h": 1.5},
+    "orageux": {"sec_h": 60,  "pluie_h": 3,  "mm_h": 8.0},
+}
+REGIME = "normal"
+
+ROUTES_PAR_POINT     = 20          # routes partageant une serie meteo
+ROUTES_PAR_SITE      = (1, 6)
+RAPPORT_MAX_CELLULES = 1_000_000   # site-heures au-dela desquelles le rapport HTML est saute
+REPETITIONS          = 3
+TOLERANCE            = 0.25
+PLANCHER_S           = 0.005       # ecarts de temps ignores en dessous
+BASELINE             = "bench/baseline.json"   # reference versionnee
+SORTIE               = "bench/latest.json"     # derniere mesure (ignoree par git)
+
+
+# ============================================================
+# CHARGES SYNTHETIQUES
+# ============================================================
+
+def pluie_synthetique(n_points, heures, regime, rng):
+    # (points, heures) en mm arrondis au dixieme, episodes a durees geometriques
+    r   = REGIMES[regime]
+    out = np.zeros((n_points, heures))
+    for p in range(n_points):
+        h, pluie = 0, rng.random() < r["pluie_h"] / (r["sec_h"] + r["pluie_h"])
+        while h < heures:
+            d = int(rng.geometric(1.0 / (r["pluie_h"] if pluie else r["sec_h"])))
+            if pluie:
+                out[p, h:h + d] = rng.gamma(0.8, r["mm_h"] / 0.8, size=len(out[p, h:h + d]))
+            h, pluie = h + d, not pluie
+    return np.round(out, 1)
+
+
+def portefeuille_synthetique(n_sites, n_routes, rng):
+    types  = ("motorway", "primary", "secondary")
+    seuils = {"motorway": (0.50, 1.00), "primary": (0.42, 0.83), "secondary": (0.33, 0.67)}
+    reseau = []
+    for r in range(n_routes):
+        t = types[int(rng.integers(len(types)))]
+        reseau.append({"id": f"route_{r}", "nom": f"Route {r}", "type": t,
+                       "seuil_impact": seuils[t][0], "seuil_coupure": seuils[t][1]})
+    sites = []
+    for s in range(n_sites):
+        k   = int(rng.integers(ROUTES_PAR_SITE[0], min(ROUTES_PAR_SITE[1], n_routes) + 1))
+        rid = rng.choice(n_routes, size=k, replace=False)
+        sites.append({
+            "id": f"site_{s}", "nom": f"Site {s}", "type": "entrepots",
+            "ca_journalier": float(np.round(rng.lognormal(11.5, 0.8), -3)),
+            "routes_critiques": {f"route_{r}": int(rng.integers(1, 4)) for r in rid},
+        })
+    return sites, reseau
+
+
+def charge(scenario, regime, seed):
+    rng      = np.random.default_rng(seed)
+    n_points = max(1, -(-scenario["routes"] // ROUTES_PAR_POINT))
+    sites, reseau = portefeuille_synthetique(scenario["sites"], scenario["routes"], rng)
+    t0    = datetime(2026, 1, 1)
+    times = [(t0 + timedelta(hours=i)).strftime(fmt.FMT_TEMPS) for i in range(scenario["heures"])]
+    return {
+        "sites":        sites,
+        "portefeuille": portefeuille.depuis_sites(sites),
+        "reseau":       reseau,
+        "times":        times,
+        "points":       [(round(49.4 + 0.02 * k, 2), 6.11) for k in range(n_points)],
+        "precip":       pluie_synthetique(n_points, scenario["heures"], regime, rng),
+        "point_routes": [r // ROUTES_PAR_POINT for r in range(scenario["routes"])],
+    }
+
+
+# ============================================================
+# ETAPES
+# ============================================================
+
+def etapes(c, dossier):
+    # (nom, fonction(etat) -> nombre d'elements traites), executees dans l'ordre
+    sites, h = c["sites"], len(c["times"])
+    chemin   = os.path.join(dossier, "resultats.json")
+
+    def indice(e):
+        e["indices"] = engine.indice_alea(c["precip"], twice.FENETRE_GLISSANTE_H, twice.SEUIL_MAX_MM)
+        return e["indices"].size
+
+    def statuts(e):
+        e["modele"] = engine.compiler(c["portefeuille"], c["reseau"], twice.STATUT_VERS_SCORE)
+        e["codes"]  = engine.statuts_routes(engine.indices_routes(e["indices"], c["point_routes"]),
+                                            e["modele"].seuils_impact, e["modele"].seuils_coupure)
+        return e["codes"].size
+
+    def tables(e):
+        engine._TABLES.clear()
+        t = e["modele"].table(twice.SEUIL_NORMAL, twice.SEUIL_ARRET)
+        return len(t.configs)
+
+    def chaine(e):
+        e["chrono"] = evenements.evaluer_statuts(e["modele"], e["codes"], twice.SEUIL_NORMAL,
+                                                 twice.SEUIL_ARRET, indices=e["indices"])
+        return len(e["chrono"].debuts) * len(sites)
+
+    def agregation(e):
+        e["agg"] = e["chrono"].agreger()
+        return len(sites) * h
+
+    def assemblage(e):
+        e["rapport"] = twice.construire_rapport(c["portefeuille"], e["modele"], e["chrono"], c["times"], 0,
+                                                c["points"], c["precip"], [0] * len(sites), e["agg"])
+        return len(sites)
+
+    def ecriture(e):
+        fmt.ecrire_json(e["rapport"], chemin)
+        return os.path.getsize(chemin)
+
+    def lecture(e):
+        e["data"] = fmt.charger(chemin)
+        return len(sites) * h
+
+    def rapport_html(e):
+        return len(report.generate(e["data"])) + len(report.generate(e["data"], 0))
+
+    out = [("indice_alea", indice), ("statuts", statuts), ("tables", tables), ("chaine", chaine),
+           ("agregation", agregation), ("assemblage", assemblage), ("ecriture_json", ecriture)]
+    if len(sites) * h <= RAPPORT_MAX_CELLULES:
+        out += [("lecture", lecture), ("rapport_html", rapport_html)]
+    return out
+
+
+def mesurer(c, repetitions):
+    res = {}
+    with tempfile.TemporaryDirectory() as dossier:
+        # Temps : meilleur de n executions completes de la chaine
+        for _ in range(repetitions):
+            etat = {}
+            for nom, f in etapes(c, dossier):
+                t0, cpu0 = time.perf_counter(), time.process_time()
+                n = f(etat)
+                t, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+                r = res.setdefault(nom, {"temps_s": t, "cpu_s": cpu, "elements": n})
+                if t < r["temps_s"]:
+                    r.update(temps_s=t, cpu_s=cpu)
+            del etat
+        # Memoire : pic alloue pendant chaque etape, au-dela de l'existant
+        etat = {}
+        tracemalloc.start()
+        try:
+            for nom, f in etapes(c, dossier):
+                tracemalloc.reset_peak()
+                avant = tracemalloc.get_traced_memory()[0]
+                f(etat)
+                res[nom]["memoire_mo"] = (tracemalloc.get_traced_memory()[1] - avant) / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return {nom: {"temps_s": round(r["temps_s"], 6), "cpu_s": round(r["cpu_s"], 6),
+                  "memoire_mo": round(r["memoire_mo"], 3), "elements": r["elements"]}
+            for nom, r in res.items()}
+
+
+# ============================================================
+# REFERENCE
+# ============================================================
+
+def comparer(resultats, reference, tolerance):
+    # Liste des regressions (scenario, etape, mesure, reference, valeur)
+    regressions = []
+    for sc, r in resultats["scenarios"].items():
+        ref = reference.get("scenarios", {}).get(sc)
+        if not ref or ref["parametres"] != r["parametres"]:
+            continue
+        for nom, m in r["etapes"].items():
+            b = ref["etapes"].get(nom)
+            if not b:
+                continue
+            if m["temps_s"] > b["temps_s"] * (1 + tolerance) and m["temps_s"] - b["temps_s"] > PLANCHER_S:
+                regressions.append((sc, nom, "temps_s", b["temps_s"], m["temps_s"]))
+            if m["memoire_mo"] > b["memoire_mo"] * (1 + tolerance) and m["memoire_mo"] - b["memoire_mo"] > 1.0:
+                regressions.append((sc, nom, "memoire_mo", b["memoire_mo"], m["memoire_mo"]))
+    return regressions
+
+
+def _ecrire(donnees, chemin):
+    d = os.path.dirname(chemin)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    with open(chemin, "w", encoding="utf-8") as f:
+        json.dump(donnees, f, ensure_ascii=False, indent=2)
+
+
+# ============================================================
+# EXECUTION
+# ============================================================
+
+def run(scenarios, regime=REGIME, seed=0, repetitions=REPETITIONS):
+    print("=== TWICE banc de performance ===")
+    resultats = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "machine":      {"python": platform.python_version(), "numpy": np.__version__,
+                         "plateforme": platform.platform(), "processeur": platform.processor()},
+        "scenarios":    {},
+    }
+    for nom, sc in scenarios.items():
+        params = dict(sc, regime=regime, seed=seed)
+        print(f"  [{nom}] {sc['heures']} h x {sc['sites']} sites x {sc['routes']} routes ({regime})")
+        m = mesurer(charge(sc, regime, seed), repetitions)
+        for etape, v in m.items():
+            print(f"    {etape:<14} {v['temps_s'] * 1000:>10.1f} ms  {v['memoire_mo']:>9.1f} Mo  ({v['elements']})")
+        resultats["scenarios"][nom] = {"parametres": params, "etapes": m}
+    return resultats
+
+
+def main():
+    ap = argparse.ArgumentParser(description="TWICE — banc de performance sur charges synthetiques")
+    ap.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                    help=f"scenario(s) a mesurer (defaut : {', '.join(PAR_DEFAUT)})")
+    ap.add_argument("--heures", type=int, help="scenario ad hoc : longueur de la serie")
+    ap.add_argument("--sites", type=int, help="scenario ad hoc : nombre de sites")
+    ap.add_argument("--routes", type=int, help="scenario ad hoc : nombre de routes")
+    ap.add_argument("--regime", choices=list(REGIMES), default=REGIME)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repetitions", type=int, default=REPETITIONS)
+    ap.add_argument("--baseline", default=BASELINE, help="fichier de reference")
+    ap.add_argument("--enregistrer", action="store_true", help="ecrire les mesures comme nouvelle reference")
+    ap.add_argument("--tolerance", type=float, default=TOLERANCE,
+                    help="regression toleree (fraction de la reference, temps et memoire)")
+    a = ap.parse_args()
+
+    if a.heures or a.sites or a.routes:
+        scenarios = {"ad_hoc": {"heures": a.heures or 216, "sites": a.sites or 2, "routes": a.routes or 4}}
+    else:
+        scenarios = {n: SCENARIOS[n] for n in (a.scenario or PAR_DEFAUT)}
+
+    resultats = run(scenarios, a.regime, a.seed, a.repetitions)
+    _ecrire(resultats, SORTIE)
+    print(f"  Sauvegarde : {SORTIE}")
+
+    if a.enregistrer:
+        reference = {}
+        if os.path.exists(a.baseline):
+            with open(a.baseline, encoding="utf-8") as f:
+                reference = json.load(f)
+        reference.update(generated_at=resultats["generated_at"], machine=resultats["machine"])
+        reference.setdefault("scenarios", {}).update(resultats["scenarios"])
+        _ecrire(reference, a.baseline)
+        print(f"  Reference : {a.baseline}")
+        return
+    if not os.path.exists(a.baseline):
+        print(f"  Pas de reference ({a.baseline}) : relancer avec --enregistrer")
+        return
+    with open(a.baseline, encoding="utf-8") as f:
+        reference = json.load(f)
+    if reference.get("machine") != resultats["machine"]:
+        print(f"  ! reference mesuree sur une autre machine ({reference.get('machine', {}).get('plateforme')}) : "
+              f"temps indicatifs, relancer avec --enregistrer pour une reference locale")
+    regressions = comparer(resultats, reference, a.tolerance)
+    for sc, etape, mesure, ref, v in regressions:
+        print(f"  ! regression [{sc}] {etape} {mesure} : {ref:g} -> {v:g} (+{(v / ref - 1) * 100:.0f} %)")
+    if regressions:
+        sys.exit(1)
+    print(f"  Aucune regression au-dela de {a.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+TWICE — Cache disque des reponses meteo
+Chaque reponse Open-Meteo est stockee sous une cle derivee de l'URL et des
+parametres (localisation comprise). Elle reste fraiche jusqu'au prochain cycle
+de mise a jour du modele, est ensuite revalidee par requete conditionnelle,
+et sert de repli si le reseau est indisponible. Eviction LRU au-dela de
+TAILLE_MAX_MO. Modes hors ligne (cache seul) et rejeu d'un instantane.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+# ============================================================
+# PARAMETRES
+# ============================================================
+REPERTOIRE    = os.environ.get("TWICE_CACHE_DIR", ".cache/meteo")
+CYCLE_MAJ_H   = 1     # cadence de publication des previsions
+DELAI_MAJ_MIN = 15    # retard de publication apres le debut du cycle
+TAILLE_MAX_MO = 50
+
+MODES = ("reseau", "hors_ligne", "rejeu")
+
+_mode           = "reseau"
+_instantane     = None   # rejeu : {"maintenant": iso, "reponses": {cle: payload}}
+_enregistrement = None   # reponses utilisees par l'execution, si enregistrees
+_debut          = None
+_verrou         = threading.Lock()
+
+
+def configurer(hors_ligne=False, rejeu=None, enregistrer=False):
+    global _mode, _instantane, _enregistrement, _debut
+    _debut          = datetime.now(timezone.utc)
+    _enregistrement = {} if enregistrer else None
+    _instantane     = None
+    _mode           = "hors_ligne" if hors_ligne else "reseau"
+    if rejeu:
+        with open(rejeu, encoding="utf-8") as f:
+            _instantane = json.load(f)
+        _mode = "rejeu"
+
+
+def maintenant():
+    # Heure de reference de l'execution : celle de l'instantane en rejeu
+    if _mode == "rejeu":
+        return datetime.fromisoformat(_instantane["maintenant"])
+    return datetime.now(timezone.utc)
+
+
+def sauver_instantane(chemin):
+    d = os.path.dirname(chemin)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    with open(chemin, "w", encoding="utf-8") as f:
+        json.dump({"maintenant": (_debut or maintenant()).isoformat(), "reponses": _enregistrement or {}},
+                  f, ensure_ascii=False)
+
+
+# ============================================================
+# STOCKAGE
+# ============================================================
+
+def cle(url, params):
+    brut = json.dumps({"url": url, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(brut.encode("utf-8")).hexdigest()
+
+
+def _chemin(k):
+    return os.path.join(REPERTOIRE, k + ".json")
+
+
+def frais(meta, t):
+    # Frais tant qu'aucun nouveau cycle de prevision n'a ete publie depuis la reception
+    def cycle(x):
+        return int((x - DELAI_MAJ_MIN * 60) // (CYCLE_MAJ_H * 3600))
+    return cycle(meta["recu_a"]) == cycle(t)
+
+
+def lire(k):
+    try:
+        with open(_chemin(k), encoding="utf-8") as f:
+            entree = json.load(f)
+    except (OSError, ValueError):
+        return None
+    os.utime(_chemin(k))   # date d'acces pour l'eviction LRU
+    return entree
+
+
+def ecrire(k, meta, payload):
+    os.makedirs(REPERTOIRE, exist_ok=True)
+    tmp = f"{_chemin(k)}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "payload": payload}, f, ensure_ascii=False)
+    os.replace(tmp, _chemin(k))
+    evincer()
+
+
+def evincer():
+    try:
+        noms = [n for n in os.listdir(REPERTOIRE) if n.endswith(".json")]
+    except OSError:
+        return
+    stats = []
+    for n in noms:
+        try:
+            st = os.stat(os.path.join(REPERTOIRE, n))
+        except OSError:
+            continue
+        stats.append((st.st_mtime, st.st_size, n))
+    total = sum(s for _, s, _ in stats)
+    for _, taille, n in sorted(stats):
+        if total <= TAILLE_MAX_MO * 1024 * 1024:
+            break
+        try:
+            os.remove(os.path.join(REPERTOIRE, n))
+        except OSError:
+            pass
+        total -= taille
+
+
+# ============================================================
+# REQUETES
+# ============================================================
+
+def _noter(k, payload):
+    if _enregistrement is not None:
+        with _verrou:
+            _enregistrement[k] = payload
+    return payload
+
+
+def get_json(session, url, params, timeout):
+    # session : session HTTP, ou fonction qui la fournit (appelee seulement
+    # si une requete part vraiment)
+    k = cle(url, params)
+
+    if _mode == "rejeu":
+        if k not in _instantane["reponses"]:
+            raise RuntimeError(f"Rejeu : reponse absente de l'instantane ({url})")
+        return _noter(k, _instantane["reponses"][k])
+
+    entree = lire(k)
+    t      = time.time()
+    if entree and (_mode == "hors_ligne" or frais(entree["meta"], t)):
+        return _noter(k, entree["payload"])
+    if _mode == "hors_ligne":
+        raise RuntimeError(f"Hors ligne : reponse absente du cache ({url})")
+
+    import requests     # chemin reseau seulement
+    if callable(session):
+        session = session()
+    headers = {}
+    if entree and entree["meta"].get("etag"):
+        headers["If-None-Match"] = entree["meta"]["etag"]
+    if entree and entree["meta"].get("last_modified"):
+        headers["If-Modified-Since"] = entree["meta"]["last_modified"]
+
+    try:
+        r = session.get(url, params=params, headers=headers, timeout=timeout)
+        if r.status_code == 304 and entree:
+            ecrire(k, dict(entree["meta"], recu_a=t), entree["payload"])
+            return _noter(k, entree["payload"])
+        r.raise_for_status()
+        payload = r.json()
+    except requests.RequestException as e:
+        if not entree:
+            raise
+        print(f"  ! reseau indisponible ({e.__class__.__name__}), reponse en cache du "
+              f"{datetime.fromtimestamp(entree['meta']['recu_a'], timezone.utc):%Y-%m-%d %H:%M} UTC")
+        return _noter(k, entree["payload"])
+
+    meta = {
+        "url":           url,
+        "params":        params,
+        "recu_a":        t,
+        "etag":          r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+    }
+    ecrire(k, meta, payload)
+    return _noter(k, payload)
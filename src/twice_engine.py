@@ -0,0 +1,373 @@
+"""
+TWICE — Moteur vectorise (NumPy)
+Meme chaine causale que twice_run (pluie -> route -> accessibilite -> pertes),
+evaluee en bloc : routes x heures pour les statuts, sites x heures pour
+l'accessibilite, l'activite et les pertes.
+
+Les resultats sont identiques, au bit pres, a ceux des fonctions scalaires
+de twice_run (memes ordres de sommation, meme semantique que round()).
+Toutes les fonctions acceptent des dimensions de tete supplementaires
+(ex. membres d'ensemble) : l'axe des heures est toujours le dernier.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+import twice_portefeuille as portefeuille
+
+STATUTS     = ("normal", "impacte", "coupe")
+CODE_STATUT = {s: k for k, s in enumerate(STATUTS)}
+
+TABLE_MAX_ROUTES = 8       # au-dela (3^R entrees par site) : cache LRU
+TAILLE_LRU       = 4096    # combinaisons memorisees par site hors table
+VALIDATION_MAX   = 81      # entrees verifiees par table a la construction
+
+
+# ============================================================
+# ARRONDIS
+# ============================================================
+
+def arrondi(x, n):
+    # Equivalent exact de round(v, n) applique element par element.
+    # np.round arrondit x*10^n deja arrondi en flottant, round() la valeur
+    # exacte : les deux ne divergent qu'a moins d'un ulp d'une demi-unite,
+    # cas rares que l'on delegue a round().
+    x = np.asarray(x, dtype=float)
+    f = 10.0 ** n
+    y = x * f
+    r = np.rint(y)
+    e = np.abs(y - r)
+    e -= 0.5
+    np.abs(e, out=e)
+    douteux = e <= 4.5e-16 * np.abs(y)      # a 2 ulp d'une demi-unite
+    r /= f
+    if douteux.any():
+        r[douteux] = [round(v, n) for v in x[douteux].tolist()]
+    return r
+
+
+# ============================================================
+# CHAINE
+# ============================================================
+
+def en_tableau(precip):
+    # float(p or 0) de twice_run : les valeurs manquantes (None) valent 0
+    p = np.array(precip, dtype=float)
+    p[np.isnan(p)] = 0.0
+    return p
+
+
+def cumul_glissant(precip, fenetre):
+    # Somme sur la fenetre [i-fenetre+1, i], accumulee dans le meme ordre que
+    # sum() (plus ancienne heure d'abord). Une difference de sommes cumulees
+    # (cumsum) serait O(n) mais ne reproduit pas les arrondis flottants de
+    # twice_run ; ici fenetre additions vectorisees, chacune O(n).
+    p   = np.asarray(precip, dtype=float)
+    n   = p.shape[-1]
+    pad = np.concatenate([np.zeros(p.shape[:-1] + (fenetre - 1,)), p], axis=-1)
+    out = pad[..., 0:n].copy()
+    for k in range(1, fenetre):
+        out += pad[..., k:k + n]
+    return out
+
+
+def indice_alea(precip, fenetre, seuil_max):
+    cumul = cumul_glissant(precip, fenetre)
+    return arrondi(np.minimum(cumul / seuil_max, 1.0), 3)
+
+
+def statuts_routes(indices, seuils_impact, seuils_coupure):
+    # indices : (..., routes, heures), ou (..., 1, heures) si commun au reseau
+    idx = np.asarray(indices, dtype=float)
+    si = np.asarray(seuils_impact, dtype=float)[:, None]
+    sc = np.asarray(seuils_coupure, dtype=float)[:, None]
+    codes = np.where(idx >= sc, CODE_STATUT["coupe"],
+                     np.where(idx >= si, CODE_STATUT["impacte"], CODE_STATUT["normal"]))
+    return codes.astype(np.int8)
+
+
+class Modele:
+    # Configuration compilee : seuils par route, et pour chaque site la liste
+    # de ses routes critiques (indices de lignes, poids) completee a une
+    # largeur commune. Les routes absentes du reseau pointent sur une ligne
+    # supplementaire toujours "normal" (statuts.get(rid, "normal")).
+    # sites : liste de dicts (format SITES) ou twice_portefeuille.Portefeuille.
+
+    def __init__(self, sites, reseau, score_statut):
+        pf = sites if isinstance(sites, portefeuille.Portefeuille) else portefeuille.depuis_sites(sites)
+        self.route_ids      = [r["id"] for r in reseau]
+        self.site_ids       = list(pf.ids)
+        self.seuils_impact  = np.array([r["seuil_impact"] for r in reseau], dtype=float)
+        self.seuils_coupure = np.array([r["seuil_coupure"] for r in reseau], dtype=float)
+        self.scores         = np.array([score_statut[s] for s in STATUTS], dtype=float)
+        self.ca_journalier  = np.asarray(pf.ca_journalier, dtype=float)
+
+        # Matrice creuse du portefeuille -> tableaux (sites, largeur)
+        indptr, colonnes, poids = pf.matrice(self.route_ids)
+        self.longueurs  = np.diff(indptr)
+        largeur         = int(self.longueurs.max(initial=0))
+        ligne           = np.repeat(np.arange(len(pf)), self.longueurs)
+        rang            = np.arange(len(colonnes)) - indptr[ligne]
+        self.routes     = np.full((len(pf), largeur), len(self.route_ids), dtype=np.intp)
+        self.poids      = np.zeros((len(pf), largeur))
+        self.routes[ligne, rang] = colonnes
+        self.poids[ligne, rang]  = poids
+        self.poids_tot  = np.asarray(pf.poids_tot, dtype=float)
+        self._tables = {}
+
+    def table(self, seuil_normal, seuil_arret):
+        # Tables de correspondance statuts -> (acc, taux, perte), une par paire de seuils
+        cle = (float(seuil_normal), float(seuil_arret))
+        if cle not in self._tables:
+            self._tables[cle] = Tables(self, *cle)
+        return self._tables[cle]
+
+
+def compiler(sites, reseau, score_statut):
+    return Modele(sites, reseau, score_statut)
+
+
+def accessibilite(modele, codes):
+    # codes : (..., routes, heures) -> (..., sites, heures)
+    scores = modele.scores[codes]
+    normal = np.full(scores.shape[:-2] + (1, scores.shape[-1]), modele.scores[CODE_STATUT["normal"]])
+    scores = np.concatenate([scores, normal], axis=-2)
+
+    # score = 0.0 ; score += p * STATUT_VERS_SCORE[s], route par route dans
+    # l'ordre de routes_critiques (produit creux : a la position k, seuls les
+    # sites ayant au moins k + 1 routes critiques)
+    score = np.zeros(scores.shape[:-2] + (len(modele.site_ids), scores.shape[-1]))
+    for k in range(modele.routes.shape[1]):
+        lignes = np.flatnonzero(modele.longueurs > k)
+        if len(lignes) == len(modele.site_ids):
+            score += modele.poids[:, k, None] * scores[..., modele.routes[:, k], :]
+        else:
+            score[..., lignes, :] += modele.poids[lignes, k, None] * scores[..., modele.routes[lignes, k], :]
+
+    avec_poids = modele.poids_tot != 0
+    den = np.where(avec_poids, modele.poids_tot, 1.0)[:, None]
+    return np.where(avec_poids[:, None], arrondi(score / den, 3), 1.0)
+
+
+def taux_activite(acc, seuil_normal, seuil_arret):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        partiel = arrondi((acc - seuil_arret) / (seuil_normal - seuil_arret), 3)
+    return np.where(acc >= seuil_normal, 1.0, np.where(acc <= seuil_arret, 0.0, partiel))
+
+
+def perte_horaire(ca_journalier, taux):
+    return arrondi((ca_journalier / 24.0) * (1.0 - taux), 2)
+
+
+def pertes(modele, taux):
+    return perte_horaire(modele.ca_journalier[:, None], taux)
+
+
+def chaine(modele, codes, seuil_normal, seuil_arret, acces=None):
+    # codes : (..., routes, heures) -> accessibilite, taux, pertes (..., sites, heures)
+    if acces is None:
+        acc, taux, perte = modele.table(seuil_normal, seuil_arret)(codes)
+    else:
+        acc   = acces(codes)
+        taux  = taux_activite(acc, seuil_normal, seuil_arret)
+        perte = pertes(modele, taux)
+    return {"accessibilite": acc, "taux_activite": taux, "perte_eur": perte}
+
+
+# ============================================================
+# TABLES PAR SITE
+# ============================================================
+# accessibilite / taux d'un site ne dependent que du statut de ses routes
+# critiques : table dense indexee par le code base 3 de ces statuts (route k
+# de routes_critiques -> chiffre 3^k). Les sites de memes poids partagent leur
+# table, quel que soit leur CA : la perte se lit dans une petite table par
+# site indexee par le niveau de taux, si bien qu'un portefeuille de milliers
+# de sites n'a que quelques centaines de tables. Les tables sont memorisees
+# au niveau du module (runs, balayages, lots d'ensemble successifs). Au-dela
+# de TABLE_MAX_ROUTES routes, repli sur un cache LRU par combinaison.
+
+_TABLES = {}
+
+
+def combinaison(poids, scores, codes, ca_journalier, seuil_normal, seuil_arret):
+    # Reference scalaire (twice_run.accessibilite / taux_activite) pour une
+    # combinaison de statuts des routes critiques d'un site
+    score, tot = 0.0, 0.0
+    for p, c in zip(poids, codes):
+        score += p * scores[c]
+        tot   += p
+    acc = round(score / tot, 3) if tot else 1.0
+    return (acc, *activite(acc, ca_journalier, seuil_normal, seuil_arret))
+
+
+def activite(acc, ca_journalier, seuil_normal, seuil_arret):
+    # Reference scalaire (twice_run.taux_activite) : (taux, perte horaire)
+    if acc >= seuil_normal:
+        taux = 1.0
+    elif acc <= seuil_arret:
+        taux = 0.0
+    else:
+        taux = round((acc - seuil_arret) / (seuil_normal - seuil_arret), 3)
+    return taux, round((ca_journalier / 24.0) * (1.0 - taux), 2)
+
+
+def _table_site(poids, scores, seuil_normal, seuil_arret):
+    # (acc, taux) de toutes les combinaisons via le moteur vectorise, puis
+    # verification contre la reference scalaire
+    cle = (poids, scores, seuil_normal, seuil_arret)
+    if cle in _TABLES:
+        return _TABLES[cle]
+    w     = len(poids)
+    n     = 3 ** w
+    combi = (np.arange(n)[None, :] // 3 ** np.arange(w)[:, None]) % 3       # (w, n)
+    m     = Modele([{"id": "s", "ca_journalier": 0.0, "routes_critiques": {str(k): p for k, p in enumerate(poids)}}],
+                   [{"id": str(k), "seuil_impact": 0.0, "seuil_coupure": 0.0} for k in range(w)],
+                   dict(zip(STATUTS, scores)))
+    acc   = accessibilite(m, combi.astype(np.int8))[0]
+    taux  = taux_activite(acc, seuil_normal, seuil_arret)
+    table = np.stack([acc, taux])
+
+    a_verifier = range(n) if n <= VALIDATION_MAX else \
+        np.random.default_rng(0).choice(n, VALIDATION_MAX, replace=False).tolist()
+    for j in a_verifier:
+        ref = combinaison(poids, scores, combi[:, j].tolist(), 0.0, seuil_normal, seuil_arret)[:2]
+        if tuple(table[:, j].tolist()) != ref:
+            raise RuntimeError(f"Table de site invalide : combinaison {combi[:, j].tolist()} "
+                               f"-> {table[:, j].tolist()} au lieu de {ref}")
+    _TABLES[cle] = table
+    return table
+
+
+class Tables:
+    # Evaluateur codes -> (acc, taux, perte) par consultation de tables : acc
+    # et taux par configuration, perte par site et niveau de taux
+
+    def __init__(self, modele, seuil_normal, seuil_arret):
+        self.modele       = modele
+        self.scores       = tuple(modele.scores.tolist())
+        self.seuil_normal = float(seuil_normal)
+        self.seuil_arret  = float(seuil_arret)
+
+        # Configuration d'un site : poids jusqu'au dernier non nul (les colonnes
+        # de bourrage n'ajoutent rien) ; une table par configuration
+        configs, groupe = {}, []
+        for i, p in enumerate(modele.poids.tolist()):
+            w = int(modele.longueurs[i])
+            while w and p[w - 1] == 0:
+                w -= 1
+            groupe.append(configs.setdefault(tuple(p[:w]), len(configs)))
+        self.configs  = list(configs)
+        self.groupe   = np.array(groupe, dtype=np.intp)
+        self.en_table = np.array([len(p) <= TABLE_MAX_ROUTES for p in self.configs], dtype=bool)
+        self.w_max    = max((len(p) for p, t in zip(self.configs, self.en_table) if t), default=0)
+        # Chiffre base 3 de la colonne k pour chaque site (0 au-dela de sa largeur)
+        largeur     = np.array([len(self.configs[g]) for g in groupe], dtype=np.intp)
+        k           = np.arange(min(self.w_max, modele.routes.shape[1]))
+        self.chiffres = np.where(k[None, :] < largeur[:, None], 3 ** k[None, :], 0)
+
+        self.tables = np.ones((len(self.configs), 2, 3 ** self.w_max))
+        self.niveau = np.zeros((len(self.configs), 3 ** self.w_max), dtype=np.intp)
+        self.lru    = {}
+        niveaux     = [np.ones(1)] * len(self.configs)
+        for g, poids in enumerate(self.configs):
+            if self.en_table[g]:
+                tab = _table_site(poids, self.scores, self.seuil_normal, self.seuil_arret)
+                self.tables[g, :, :tab.shape[1]] = tab
+                niveaux[g], self.niveau[g, :tab.shape[1]] = np.unique(tab[1], return_inverse=True)
+            else:
+                self.lru[g] = OrderedDict()
+        # Perte horaire de chaque site a chaque niveau de taux de sa table
+        d       = max(len(v) for v in niveaux) if niveaux else 1
+        taux    = np.ones((len(self.configs), d))
+        for g, v in enumerate(niveaux):
+            taux[g, :len(v)] = v
+        self.pertes = pertes(modele, taux[self.groupe])
+
+    def _combinaison_lru(self, g, codes):
+        cache = self.lru[g]
+        if codes in cache:
+            cache.move_to_end(codes)
+            return cache[codes]
+        v = cache[codes] = combinaison(self.configs[g], self.scores, codes, 0.0,
+                                       self.seuil_normal, self.seuil_arret)[:2]
+        if len(cache) > TAILLE_LRU:
+            cache.popitem(last=False)
+        return v
+
+    def __call__(self, codes):
+        m      = self.modele
+        codes  = np.asarray(codes)
+        normal = np.zeros(codes.shape[:-2] + (1, codes.shape[-1]), dtype=codes.dtype)
+        pad    = np.concatenate([codes, normal], axis=-2)
+        s, h   = len(m.site_ids), codes.shape[-1]
+        out    = np.empty((3,) + codes.shape[:-2] + (s, h))
+
+        dans = self.en_table[self.groupe]
+        if dans.any():
+            sites = np.flatnonzero(dans)
+            enc = np.zeros(codes.shape[:-2] + (len(sites), h), dtype=np.intp)
+            for k in range(self.chiffres.shape[1]):
+                enc += pad[..., m.routes[sites, k], :].astype(np.intp) * self.chiffres[sites, k, None]
+            g = self.groupe[sites][:, None]
+            for c in range(2):
+                out[c][..., sites, :] = self.tables[g, c, enc]
+            out[2][..., sites, :] = self.pertes[sites[:, None], self.niveau[g, enc]]
+        for i in np.flatnonzero(~dans):
+            g   = int(self.groupe[i])
+            w   = len(self.configs[g])
+            col = np.moveaxis(pad[..., m.routes[i, :w], :], -2, -1).reshape(-1, w)
+            uniq, inv = np.unique(col, axis=0, return_inverse=True)
+            vals = np.array([self._combinaison_lru(g, tuple(u)) for u in uniq.tolist()]).reshape(-1, 2)
+            for c in range(2):
+                out[c][..., i, :] = vals[inv.reshape(-1), c].reshape(codes.shape[:-2] + (h,))
+            out[2][..., i, :] = perte_horaire(m.ca_journalier[i], out[1][..., i, :])
+        return out[0], out[1], out[2]
+
+
+def indice_alea_heures(precip, heures, fenetre, seuil_max):
+    # indice_alea restreint aux colonnes heures (meme ordre de sommation)
+    p     = np.asarray(precip, dtype=float)
+    cols  = np.asarray(heures, dtype=np.intp)[:, None] - (fenetre - 1) + np.arange(fenetre)
+    vals  = np.where(cols >= 0, p[..., np.clip(cols, 0, None)], 0.0)
+    cumul = vals[..., 0].copy()
+    for k in range(1, fenetre):
+        cumul += vals[..., k]
+    return arrondi(np.minimum(cumul / seuil_max, 1.0), 3)
+
+
+def indices_routes(indices, point_routes=None):
+    # indices : (..., heures) commun au reseau, ou (..., points, heures) avec
+    # point_routes[r] = ligne de la serie qui alimente la route r, ou une
+    # projection indices -> routes (ex. twice_spatial.Projection)
+    if point_routes is None:
+        return indices[..., None, :]
+    if callable(point_routes):
+        return point_routes(indices)
+    return indices[..., point_routes, :]
+
+
+def evaluer(modele, indices, seuil_normal, seuil_arret, point_routes=None, acces=None):
+    # acces : evaluateur codes -> accessibilite remplacant la moyenne ponderee
+    # des routes critiques (ex. twice_graphe.Accessibilite)
+    idx_routes = indices_routes(indices, point_routes)
+    codes = statuts_routes(idx_routes, modele.seuils_impact, modele.seuils_coupure)
+    return {"statuts": codes, **chaine(modele, codes, seuil_normal, seuil_arret, acces)}
+
+
+def simuler(modele, precip, fenetre, seuil_max, seuil_normal, seuil_arret, point_routes=None, acces=None):
+    indices = indice_alea(precip, fenetre, seuil_max)
+    return {"indices": indices, **evaluer(modele, indices, seuil_normal, seuil_arret, point_routes, acces)}
+
+
+def agreger(sim):
+    taux = sim["taux_activite"]
+    # np.cumsum accumule sequentiellement comme sum() ; np.sum (par paires) non
+    perte_totale = arrondi(np.cumsum(sim["perte_eur"], axis=-1)[..., -1], 2)
+    return {
+        "perte_totale_eur":  perte_totale,
+        "heures_normales":   (taux == 1.0).sum(axis=-1),
+        "heures_degradees":  ((taux > 0) & (taux < 1.0)).sum(axis=-1),
+        "heures_arret":      (taux == 0.0).sum(axis=-1),
+        "accessibilite_min": sim["accessibilite"].min(axis=-1),
+    }
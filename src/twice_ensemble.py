@@ -0,0 +1,245 @@
+"""
+TWICE — Mode ensemble (Monte Carlo)
+Evalue la chaine pluie -> route -> accessibilite -> pertes sur N scenarios de
+precipitation : membres de l'API ensemble Open-Meteo, ou perturbations des
+series deterministes. Meme modele que le run (portefeuille, points meteo,
+troncons, OSM, CA) ; les membres sont evalues par lots sur le moteur vectorise,
+repartis sur un pool de processus, et resumes en percentiles / probabilites.
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+import twice_engine as engine
+import twice_meteo as meteo
+import twice_run as twice
+
+# ============================================================
+# PARAMETRES PAR DEFAUT
+# ============================================================
+N_MEMBRES      = 1000
+TAILLE_LOT     = 1000
+BRUIT          = "multiplicatif"
+SIGMA          = 0.5
+DECALAGE_MAX_H = 3
+MODELE_ENSEMBLE = "icon_seamless"
+PERCENTILES    = (10, 50, 90)
+# Seuils de depassement exprimes en jours de CA perdu
+SEUILS_JOURS_CA = (0.25, 0.5, 1.0, 2.0)
+
+BRUITS = ("multiplicatif", "decalage", "mixte")
+
+
+# ============================================================
+# SCENARIOS
+# ============================================================
+URL_ENSEMBLE = "https://ensemble-api.open-meteo.com/v1/ensemble"
+
+
+def fetch_ensemble(points, modele=MODELE_ENSEMBLE):
+    # Membres de prevision aux points du run : (membres, points, heures)
+    params = {
+        "hourly":        "precipitation",
+        "models":        modele,
+        "past_days":     twice.PAST_DAYS,
+        "forecast_days": twice.FORECAST_DAYS,
+        "timezone":      "Europe/Luxembourg",
+    }
+    times, horaire = meteo.fetch_horaire(points, params, URL_ENSEMBLE)
+    # "precipitation" = controle, "precipitation_memberNN" = membres perturbes
+    cles    = sorted(k for k in horaire[points[0]] if k == "precipitation" or k.startswith("precipitation_member"))
+    membres = np.stack([engine.en_tableau([horaire[p][k] for p in points]) for k in cles])
+    return times, membres, twice.index_maintenant(times)
+
+
+def perturber(precip, n, rng, bruit=BRUIT, sigma=SIGMA, decalage_max=DECALAGE_MAX_H):
+    # precip : (heures) ou (points, heures) -> (n, ...). Une meme perturbation
+    # par membre pour tous les points : un membre est un scenario de la zone.
+    # multiplicatif : facteur lognormal de moyenne 1, independant par heure
+    # decalage      : serie decalee de -decalage_max..+decalage_max heures
+    # mixte         : les deux
+    p    = engine.en_tableau(precip)
+    base = np.broadcast_to(p, (n,) + p.shape)
+    h    = p.shape[-1]
+    axes = (n,) + (1,) * (p.ndim - 1)
+    if bruit in ("decalage", "mixte") and decalage_max > 0:
+        dec = rng.integers(-decalage_max, decalage_max + 1, size=n)
+        src = np.clip(np.arange(h)[None, :] - dec[:, None], 0, h - 1).reshape(axes + (h,))
+        base = np.take_along_axis(base, np.broadcast_to(src, base.shape), axis=-1)
+    if bruit in ("multiplicatif", "mixte") and sigma > 0:
+        facteur = np.exp(sigma * rng.standard_normal(axes + (h,)) - sigma ** 2 / 2)
+        base = base * facteur
+    return np.array(base)
+
+
+# ============================================================
+# EVALUATION PAR LOTS
+# ============================================================
+# Meme modele que le run deterministe (twice_run.run) : portefeuille
+# (--portefeuille, --ca), une serie par point meteo, projection sur les
+# troncons et accessibilite OSM le cas echeant. Il est transmis une fois par
+# processus (initialiseur du pool), pas a chaque lot.
+
+_contexte = None
+
+
+def _initialiser(modele, params):
+    global _contexte
+    _contexte = (modele, params)
+
+
+def _evaluer(membres):
+    # membres : (n, points, heures)
+    modele, params = _contexte
+    sim  = engine.simuler(modele, membres, params["fenetre"], params["seuil_max"], params["seuil_normal"],
+                          params["seuil_arret"], params["point_routes"], params["acces"])
+    agg  = engine.agreger(sim)
+    taux = sim["taux_activite"]
+    return {
+        "perte_totale": agg["perte_totale_eur"],
+        "heures_arret": agg["heures_arret"],
+        "perte_eur":    sim["perte_eur"].astype(np.float32),
+        "n_degrade":    ((taux > 0) & (taux < 1.0)).sum(axis=0),
+        "n_arret":      (taux == 0.0).sum(axis=0),
+    }
+
+
+def _lot_perturbe(args):
+    precip, n, graine, bruit, sigma, decalage_max = args
+    rng = np.random.default_rng(graine)
+    return _evaluer(perturber(precip, n, rng, bruit, sigma, decalage_max))
+
+
+def _lot_membres(membres):
+    return _evaluer(membres)
+
+
+def evaluer_ensemble(lots, fonction, workers, modele, params):
+    if workers <= 1:
+        _initialiser(modele, params)
+        return [fonction(a) for a in lots]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initialiser,
+                             initargs=(modele, params)) as pool:
+        return list(pool.map(fonction, lots))
+
+
+def resumer(parts, n_membres, pf):
+    perte_totale = np.concatenate([p["perte_totale"] for p in parts])
+    heures_arret = np.concatenate([p["heures_arret"] for p in parts])
+    perte_eur    = np.concatenate([p["perte_eur"] for p in parts])
+    n_degrade    = sum(p["n_degrade"] for p in parts)
+    n_arret      = sum(p["n_arret"] for p in parts)
+
+    ca        = pf.ca_journalier.tolist()
+    resultats = []
+    for k in range(len(pf)):
+        pt  = perte_totale[:, k]
+        ha  = heures_arret[:, k]
+        q_h = np.percentile(perte_eur[:, k, :], PERCENTILES, axis=0)
+        valeurs, comptes = np.unique(ha, return_counts=True)
+        resultats.append({
+            "site_id":           pf.ids[k],
+            "site_nom":          pf.noms[k],
+            "type":              pf.types[k],
+            "ca_journalier_eur": ca[k],
+            "perte_totale_eur": {
+                **{f"p{q}": round(float(v), 2) for q, v in zip(PERCENTILES, np.percentile(pt, PERCENTILES))},
+                "moyenne": round(float(pt.mean()), 2),
+            },
+            "heures_arret": {
+                **{f"p{q}": float(v) for q, v in zip(PERCENTILES, np.percentile(ha, PERCENTILES))},
+                "distribution": {str(int(v)): int(c) for v, c in zip(valeurs, comptes)},
+            },
+            "proba_depassement": [
+                {"jours_ca": j, "seuil_eur": round(j * ca[k], 2),
+                 "proba": round(float((pt > j * ca[k]).mean()), 4)}
+                for j in SEUILS_JOURS_CA
+            ],
+            "chronologie": {
+                **{f"perte_p{q}": np.round(q_h[i], 2).tolist() for i, q in enumerate(PERCENTILES)},
+                "proba_degrade": np.round(n_degrade[k] / n_membres, 4).tolist(),
+                "proba_arret":   np.round(n_arret[k] / n_membres, 4).tolist(),
+            },
+        })
+    return resultats
+
+
+# ============================================================
+# EXECUTION
+# ============================================================
+
+def run(source="perturbation", n=N_MEMBRES, bruit=BRUIT, sigma=SIGMA,
+        decalage_max=DECALAGE_MAX_H, seed=None, taille_lot=TAILLE_LOT, workers=None):
+    print("=== TWICE ensemble démarrage ===")
+    workers = workers or os.cpu_count() or 1
+    pf      = twice.portefeuille()
+    modele  = engine.compiler(pf, twice.RESEAU_ROUTIER, twice.STATUT_VERS_SCORE)
+
+    if source == "open-meteo":
+        points = twice.points_meteo(pf)
+        rang   = {p: k for k, p in enumerate(points)}
+        params = twice.parametres(rang, pf)
+        times, membres, now_index = fetch_ensemble(points)
+        n     = len(membres)
+        lots  = [membres[i:i + taille_lot] for i in range(0, n, taille_lot)]
+        parts = evaluer_ensemble(lots, _lot_membres, workers, modele, params)
+        desc  = {"source": "open-meteo", "modele": MODELE_ENSEMBLE}
+    else:
+        times, now_index, points, rang, precip = twice.entrees_meteo(pf)
+        params  = twice.parametres(rang, pf)
+        tailles = [min(taille_lot, n - i) for i in range(0, n, taille_lot)]
+        # Une graine par lot : resultats reproductibles quel que soit workers
+        graines = np.random.SeedSequence(seed).spawn(len(tailles))
+        lots    = [(precip, t, g, bruit, sigma, decalage_max) for t, g in zip(tailles, graines)]
+        parts   = evaluer_ensemble(lots, _lot_perturbe, workers, modele, params)
+        desc    = {"source": "perturbation", "bruit": bruit, "sigma": sigma,
+                   "decalage_max_h": decalage_max, "seed": seed}
+    print(f"  {n} membres, {len(times)} heures, {workers} processus")
+
+    resultats = resumer(parts, n, pf)
+    for s in resultats:
+        pt = s["perte_totale_eur"]
+        print(f"  [{s['site_nom']}] perte P10={pt['p10']:,.0f}€  P50={pt['p50']:,.0f}€  P90={pt['p90']:,.0f}€")
+
+    rapport = {
+        "projet":       "TWICE",
+        "zone":         "Bettembourg, Luxembourg",
+        "mode":         "ensemble",
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "now_index":    now_index,
+        "config_hash":  twice.config_hash(),
+        "ensemble":     {**desc, "n_membres": n, "percentiles": list(PERCENTILES)},
+        "meteo":        {"times": times, "now_index": now_index},
+        "resultats":    resultats,
+    }
+
+    os.makedirs("outputs", exist_ok=True)
+    with open("outputs/ensemble_latest.json", "w", encoding="utf-8") as f:
+        json.dump(rapport, f, ensure_ascii=False, indent=2)
+    print("  Sauvegarde : outputs/ensemble_latest.json")
+    print("=== TWICE ensemble termine ===")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="TWICE — mode ensemble Monte Carlo")
+    ap.add_argument("--source", choices=("perturbation", "open-meteo"), default="perturbation")
+    ap.add_argument("--membres", type=int, default=N_MEMBRES)
+    ap.add_argument("--bruit", choices=BRUITS, default=BRUIT)
+    ap.add_argument("--sigma", type=float, default=SIGMA)
+    ap.add_argument("--decalage-max", type=int, default=DECALAGE_MAX_H)
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--lot", type=int, default=TAILLE_LOT)
+    ap.add_argument("--workers", type=int, default=None)
+    # Memes options que le run deterministe, appliquees a sa configuration
+    twice.options_configuration(ap)
+    a = ap.parse_args(argv)
+    twice.configurer(a)
+    run(a.source, a.membres, a.bruit, a.sigma, a.decalage_max, a.seed, a.lot, a.workers)
+
+if __name__ == "__main__":
+    main()
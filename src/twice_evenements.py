@@ -0,0 +1,113 @@
+"""
+TWICE — Chronologie par evenements
+Les statuts des routes ne changent qu'aux franchissements de seuil_impact /
+seuil_coupure. La chaine est evaluee une fois par intervalle ou l'etat du
+reseau est constant (points de changement), et les resultats sont stockes en
+intervalles [debut, fin[ par site (accessibilite, taux, perte horaire) au lieu
+d'un enregistrement par heure. Chronologie.heures() restitue la serie horaire.
+"""
+
+import numpy as np
+
+import twice_engine as engine
+
+BLOC_H = 1024    # heures etendues a la fois pour la perte totale
+
+
+def changements(*series):
+    # Debuts des intervalles ou toutes les series (..., heures) sont constantes
+    n = series[0].shape[-1]
+    if n == 0:
+        return np.zeros(0, dtype=np.intp)
+    diff = np.zeros(n - 1, dtype=bool)
+    for s in series:
+        s = s.reshape(-1, n)
+        diff |= (s[:, 1:] != s[:, :-1]).any(axis=0)
+    return np.concatenate([[0], np.flatnonzero(diff) + 1]).astype(np.intp)
+
+
+class Chronologie:
+    # n heures decoupees en K intervalles : debuts (K,), statuts (routes, K),
+    # colonnes de site (sites, K) ; indices horaires conserves pour le rapport.
+
+    def __init__(self, n, debuts, statuts, accessibilite, taux_activite, perte_eur, indices=None):
+        self.n             = n
+        self.debuts        = debuts
+        self.statuts       = statuts
+        self.accessibilite = accessibilite
+        self.taux_activite = taux_activite
+        self.perte_eur     = perte_eur
+        self.indices       = indices
+        self.longueurs     = np.diff(np.append(debuts, n))
+
+    def heures(self, champ):
+        # Intervalles -> serie horaire (..., n)
+        return np.repeat(getattr(self, champ), self.longueurs, axis=-1)
+
+    def intervalles_statuts(self):
+        return {"debut": self.debuts.tolist(), "codes": self.statuts.tolist()}
+
+    def site(self, k):
+        # Intervalles du site k, fusionnes quand ses colonnes ne changent pas
+        cols = [self.accessibilite[k], self.taux_activite[k], self.perte_eur[k]]
+        garde = np.ones(len(self.debuts), dtype=bool)
+        garde[1:] = np.any([c[1:] != c[:-1] for c in cols], axis=0)
+        debut = self.debuts[garde]
+        return {
+            "debut":         debut.tolist(),
+            "fin":           np.append(debut[1:], self.n).tolist(),
+            "accessibilite": cols[0][garde].tolist(),
+            "taux_activite": cols[1][garde].tolist(),
+            "perte_eur":     cols[2][garde].tolist(),
+        }
+
+    def perte_totale(self):
+        # Somme sequentielle heure par heure (meme arrondi que sum()), par
+        # blocs d'heures pour ne jamais etendre toute la serie
+        total = np.zeros(self.perte_eur.shape[:-1])
+        for debut in range(0, self.n, BLOC_H):
+            h   = np.arange(debut, min(debut + BLOC_H, self.n))
+            bloc = self.perte_eur[..., np.searchsorted(self.debuts, h, side="right") - 1].copy()
+            bloc[..., 0] += total
+            total = np.cumsum(bloc, axis=-1)[..., -1]
+        return engine.arrondi(total, 2)
+
+    def agreger(self):
+        # Comptes et minimum sur les intervalles
+        taux, l = self.taux_activite, self.longueurs
+        return {
+            "perte_totale_eur":  self.perte_totale(),
+            "heures_normales":   ((taux == 1.0) * l).sum(axis=-1),
+            "heures_degradees":  (((taux > 0) & (taux < 1.0)) * l).sum(axis=-1),
+            "heures_arret":      ((taux == 0.0) * l).sum(axis=-1),
+            "accessibilite_min": self.accessibilite.min(axis=-1),
+        }
+
+
+def evaluer(modele, indices, seuil_normal, seuil_arret, point_routes=None, acces=None):
+    # Statuts horaires par seuillage, puis chaine evaluee aux seuls changements
+    codes = engine.statuts_routes(engine.indices_routes(indices, point_routes),
+                                  modele.seuils_impact, modele.seuils_coupure)
+    return evaluer_statuts(modele, codes, seuil_normal, seuil_arret, acces, indices)
+
+
+def evaluer_statuts(modele, codes, seuil_normal, seuil_arret, acces=None, indices=None):
+    codes  = np.broadcast_to(codes, (len(modele.route_ids), codes.shape[-1]))
+    debuts = changements(codes)
+    etats  = codes[:, debuts]
+    ch     = engine.chaine(modele, etats, seuil_normal, seuil_arret, acces)
+    return Chronologie(codes.shape[-1], debuts, etats, ch["accessibilite"], ch["taux_activite"],
+                       ch["perte_eur"], indices)
+
+
+def simuler(modele, precip, fenetre, seuil_max, seuil_normal, seuil_arret, point_routes=None, acces=None):
+    indices = engine.indice_alea(precip, fenetre, seuil_max)
+    return evaluer(modele, indices, seuil_normal, seuil_arret, point_routes, acces)
+
+
+def depuis_heures(sim):
+    # Sim horaire (engine.simuler, recalcul incremental) -> Chronologie
+    cols   = [sim[c] for c in ("accessibilite", "taux_activite", "perte_eur")]
+    debuts = changements(sim["statuts"], *cols)
+    return Chronologie(sim["statuts"].shape[-1], debuts, sim["statuts"][:, debuts],
+                       *(c[:, debuts] for c in cols), sim["indices"])
@@ -0,0 +1,325 @@
+"""
+TWICE — Format de resultats en colonnes (version 3)
+Un tableau par champ au lieu d'un dict par heure : temps = debut + pas,
+statuts des routes en codes entiers, accessibilite / taux / pertes par site.
+v3 : statuts et colonnes de site en intervalles [debut, fin[ (taille fonction
+du nombre d'evenements) ; v2 : series horaires (matrice routes x heures,
+colonnes par site). Ecriture JSON compacte ou conteneur binaire .npz (series
+horaires, non compresse, chaque tableau projetable en memoire).
+Le lecteur ramene tout fichier a la forme horaire v2, et le lecteur de
+compatibilite reconstruit la structure historique (v1) pour
+twice_report.generate ; les anciens fichiers restent acceptes. Dans cette
+structure, la chronologie d'un site est un conteneur de tableaux
+(ChronologieSite) qui se lit comme l'ancienne liste de dicts.
+"""
+
+import json
+import os
+import zipfile
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+
+import numpy as np
+
+FORMAT  = "twice-colonnes"
+VERSION = 3
+VERSION_HORAIRE = 2
+
+COLONNES_SITE = ("accessibilite", "taux_activite", "perte_eur")
+STATUTS       = ("normal", "impacte", "coupe")
+FMT_TEMPS     = "%Y-%m-%dT%H:%M"
+
+
+# ============================================================
+# TEMPS
+# ============================================================
+
+def encoder_temps(times):
+    # debut + pas si la serie est reguliere, liste explicite sinon
+    # (ex. heures locales autour d'un changement d'heure)
+    if len(times) >= 2:
+        t0  = datetime.strptime(times[0], FMT_TEMPS)
+        pas = datetime.strptime(times[1], FMT_TEMPS) - t0
+        if pas > timedelta(0) and pas % timedelta(hours=1) == timedelta(0):
+            enc = {"debut": times[0], "pas_h": pas // timedelta(hours=1), "n": len(times)}
+            if decoder_temps(enc) == list(times):
+                return enc
+    return {"liste": list(times)}
+
+
+def decoder_temps(enc):
+    if "liste" in enc:
+        return list(enc["liste"])
+    t0  = datetime.strptime(enc["debut"], FMT_TEMPS)
+    pas = timedelta(hours=enc["pas_h"])
+    return [(t0 + i * pas).strftime(FMT_TEMPS) for i in range(enc["n"])]
+
+
+# ============================================================
+# ECRITURE
+# ============================================================
+
+def ecrire_json(rapport, chemin):
+    with open(chemin, "w", encoding="utf-8") as f:
+        json.dump(rapport, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def ajouter_json(chemin, cle, valeur):
+    # Ajoute une cle en fin d'objet d'un fichier ecrit par ecrire_json, sans
+    # relire ni reserialiser le rapport (ex. telemetrie mesuree apres ecriture)
+    suite = "," + json.dumps(cle) + ":" + json.dumps(valeur, ensure_ascii=False, separators=(",", ":")) + "}"
+    with open(chemin, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"}":
+            raise ValueError(f"{chemin} : objet JSON attendu")
+        f.seek(-1, os.SEEK_END)
+        f.write(suite.encode("utf-8"))
+
+
+def _tableaux(rapport):
+    # Tableaux du rapport v2 ; le reste part dans l'entete JSON
+    points = rapport["meteo"]["points"]
+    tab = {
+        "precipitation": np.array([p["precipitation"] for p in points], dtype=float),
+        "indice_alea":   np.array([p["indice_alea"] for p in points], dtype=float),
+        "statuts":       np.array(rapport["statuts"], dtype=np.int8).reshape(len(rapport["routes"]), len(points[0]["precipitation"])),
+    }
+    for c in COLONNES_SITE:
+        tab[c] = np.array([r["colonnes"][c] for r in rapport["resultats"]], dtype=float)
+    entete = dict(rapport)
+    entete["meteo"]     = {"points": [{"lat": p["lat"], "lon": p["lon"]} for p in points]}
+    entete["statuts"]   = None
+    entete["resultats"] = [{k: v for k, v in r.items() if k != "colonnes"} for r in rapport["resultats"]]
+    return entete, tab
+
+
+def ecrire_npz(rapport, chemin):
+    entete, tab = _tableaux(etendre(rapport))
+    brut = np.frombuffer(json.dumps(entete, ensure_ascii=False).encode("utf-8"), dtype=np.uint8)
+    tmp  = chemin + ".tmp.npz"
+    np.savez(tmp, entete=brut, **tab)
+    os.replace(tmp, chemin)
+
+
+# ============================================================
+# INTERVALLES
+# ============================================================
+
+def etendre_intervalles(iv, n):
+    # {"debut": [...], "fin": [...], champ: [...]} -> {champ: serie horaire}
+    longueurs = np.asarray(iv["fin"], dtype=np.intp) - np.asarray(iv["debut"], dtype=np.intp)
+    return {c: np.repeat(np.asarray(v, dtype=float), longueurs)
+            for c, v in iv.items() if c not in ("debut", "fin")}
+
+
+def etendre(rapport):
+    # v3 (intervalles) -> forme horaire v2 ; inchange si deja horaire
+    if not isinstance(rapport.get("statuts"), dict):
+        return rapport
+    n   = len(decoder_temps(rapport["temps"]))
+    st  = rapport["statuts"]
+    lon = np.diff(np.append(np.asarray(st["debut"], dtype=np.intp), n))
+    out = dict(rapport, version=VERSION_HORAIRE)
+    out["statuts"] = np.repeat(np.asarray(st["codes"], dtype=np.int8).reshape(-1, len(lon)), lon, axis=1)
+    out["resultats"] = [
+        {**{k: v for k, v in r.items() if k != "intervalles"},
+         "colonnes": etendre_intervalles(r["intervalles"], n)}
+        for r in rapport["resultats"]
+    ]
+    return out
+
+
+# ============================================================
+# LECTURE
+# ============================================================
+
+def _memmap_npz(chemin):
+    # Un .npz non compresse est une archive zip "stored" de fichiers .npy :
+    # chaque tableau peut etre projete directement depuis son decalage.
+    out = {}
+    with zipfile.ZipFile(chemin) as z, open(chemin, "rb") as f:
+        for info in z.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                return None
+            f.seek(info.header_offset + 26)
+            n_nom, n_extra = np.frombuffer(f.read(4), dtype="<u2")
+            debut = info.header_offset + 30 + int(n_nom) + int(n_extra)
+            f.seek(debut)
+            version = np.lib.format.read_magic(f)
+            lire    = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                       else np.lib.format.read_array_header_2_0)
+            forme, fortran, dtype = lire(f)
+            out[info.filename[:-4]] = np.memmap(chemin, dtype=dtype, mode="r", offset=f.tell(),
+                                                shape=forme, order="F" if fortran else "C")
+    return out
+
+
+def _depuis_npz(chemin):
+    tab = _memmap_npz(chemin)
+    if tab is None:
+        with np.load(chemin) as z:
+            tab = {k: z[k] for k in z.files}
+    rapport = json.loads(bytes(tab.pop("entete")).decode("utf-8"))
+    for k, p in enumerate(rapport["meteo"]["points"]):
+        p["precipitation"] = tab["precipitation"][k]
+        p["indice_alea"]   = tab["indice_alea"][k]
+    rapport["statuts"] = tab["statuts"]
+    for k, r in enumerate(rapport["resultats"]):
+        r["colonnes"] = {c: tab[c][k] for c in COLONNES_SITE}
+    return rapport
+
+
+def depuis_legacy(data):
+    # Structure v1 (un dict par heure) -> colonnes v2
+    meteo = data["meteo"]
+    if "points" in meteo:
+        points = meteo["points"]
+    else:
+        points = [{"lat": None, "lon": None, "precipitation": meteo["precipitation"],
+                   "indice_alea": data["indices_alea"]}]
+    resultats = data["resultats"]
+    routes    = list(resultats[0]["chronologie"][0]["statuts_routes"]) if resultats and resultats[0]["chronologie"] else []
+    code      = {s: k for k, s in enumerate(STATUTS)}
+    statuts   = [[code[h["statuts_routes"][rid]] for h in resultats[0]["chronologie"]] for rid in routes]
+
+    def point_site(r):
+        precip = [h["precipitation_mm"] for h in r["chronologie"]]
+        return next((k for k, p in enumerate(points) if p["precipitation"] == precip), 0)
+
+    sites = []
+    for r in resultats:
+        s = {k: v for k, v in r.items() if k != "chronologie"}
+        s["point"]    = point_site(r)
+        s["colonnes"] = {c: [h[c] for h in r["chronologie"]] for c in COLONNES_SITE}
+        sites.append(s)
+
+    out = {k: v for k, v in data.items() if k not in ("meteo", "indices_alea", "resultats")}
+    out.update({
+        "format":    FORMAT,
+        "version":   VERSION_HORAIRE,
+        "temps":     encoder_temps(meteo["times"]),
+        "meteo":     {"points": points},
+        "routes":    routes,
+        "statuts":   statuts,
+        "resultats": sites,
+    })
+    return out
+
+
+def charger_colonnes(chemin):
+    if chemin.endswith(".npz"):
+        return _depuis_npz(chemin)
+    with open(chemin, encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("format") != FORMAT:
+        return depuis_legacy(data)
+    if data.get("version", 0) > VERSION:
+        raise ValueError(f"{chemin} : format {FORMAT} v{data['version']} non supporte (max v{VERSION})")
+    return etendre(data)
+
+
+def _liste(v):
+    return v.tolist() if hasattr(v, "tolist") else list(v)
+
+
+# ============================================================
+# CHRONOLOGIE D'UN SITE (TABLEAUX, VUES PAR HEURE)
+# ============================================================
+
+class ChronologieSite(Sequence):
+    # Chronologie horaire d'un site en tableaux contigus : colonnes du site
+    # (float64, 24 o par heure), precipitations et indice de son point meteo,
+    # statuts des routes (int8, routes x heures) et heures de prevision
+    # (masque de bits) partages avec les autres sites. Se lit comme la liste
+    # historique de dicts (len, index, tranches, iteration) : chaque dict
+    # n'est construit qu'a la lecture de son heure.
+
+    __slots__ = ("times", "prevision", "routes", "statuts", "precipitation_mm", "indice_alea",
+                 "accessibilite", "taux_activite", "perte_eur")
+
+    def __init__(self, times, prevision, routes, statuts, precipitation_mm, indice_alea,
+                 accessibilite, taux_activite, perte_eur):
+        self.times            = times
+        self.prevision        = prevision
+        self.routes           = routes
+        self.statuts          = statuts
+        self.precipitation_mm = precipitation_mm
+        self.indice_alea      = indice_alea
+        self.accessibilite    = accessibilite
+        self.taux_activite    = taux_activite
+        self.perte_eur        = perte_eur
+
+    def __len__(self):
+        return len(self.times)
+
+    def est_prevision(self, i):
+        return bool(self.prevision[i >> 3] >> (7 - (i & 7)) & 1)
+
+    def heure(self, i):
+        # Vue de l'heure i au format historique
+        return {
+            "time":             self.times[i],
+            "is_forecast":      self.est_prevision(i),
+            "precipitation_mm": self.precipitation_mm[i].item(),
+            "indice_alea":      self.indice_alea[i].item(),
+            "accessibilite":    self.accessibilite[i].item(),
+            "taux_activite":    self.taux_activite[i].item(),
+            "perte_eur":        self.perte_eur[i].item(),
+            "statuts_routes":   {rid: STATUTS[c] for rid, c in zip(self.routes, self.statuts[:, i].tolist())},
+        }
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.heure(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("heure hors de la chronologie")
+        return self.heure(i)
+
+    def __iter__(self):
+        return (self.heure(i) for i in range(len(self)))
+
+    def __eq__(self, autre):
+        # Egalite heure par heure avec une autre chronologie ou une liste de dicts
+        if not isinstance(autre, (list, ChronologieSite)):
+            return NotImplemented
+        return len(self) == len(autre) and all(a == b for a, b in zip(self, autre))
+
+    __hash__ = None
+
+
+def vers_legacy(col):
+    # Colonnes v2 -> structure historique ; la chronologie de chaque site est
+    # une ChronologieSite (tableaux partages, dicts par heure a la demande)
+    times     = decoder_temps(col["temps"])
+    now_index = col["now_index"]
+    points    = [dict(p, precipitation=_liste(p["precipitation"]), indice_alea=_liste(p["indice_alea"]))
+                 for p in col["meteo"]["points"]]
+    series    = [(np.asarray(p["precipitation"], dtype=float), np.asarray(p["indice_alea"], dtype=float))
+                 for p in points]
+    statuts   = np.asarray(col["statuts"], dtype=np.int8).reshape(len(col["routes"]), len(times))
+    prevision = np.packbits(np.arange(len(times)) > now_index)
+    routes    = tuple(col["routes"])
+
+    resultats = []
+    for r in col["resultats"]:
+        p = series[r.get("point", 0)]
+        c = {k: np.asarray(v, dtype=float) for k, v in r["colonnes"].items()}
+        s = {k: v for k, v in r.items() if k not in ("colonnes", "point")}
+        s["chronologie"] = ChronologieSite(times, prevision, routes, statuts, p[0], p[1],
+                                           c["accessibilite"], c["taux_activite"], c["perte_eur"])
+        resultats.append(s)
+
+    out = {k: v for k, v in col.items()
+           if k not in ("format", "version", "temps", "meteo", "routes", "statuts", "statuts_codes", "resultats")}
+    out["meteo"] = {"times": times, "precipitation": points[0]["precipitation"], "now_index": now_index}
+    if len(points) > 1:
+        out["meteo"]["points"] = points
+    out["indices_alea"] = points[0]["indice_alea"]
+    out["resultats"]    = resultats
+    return out
+
+
+def charger(chemin):
+    return vers_legacy(charger_colonnes(chemin))
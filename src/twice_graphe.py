@@ -0,0 +1,264 @@
+"""
+TWICE — Accessibilite par graphe routier (extrait OpenStreetMap local)
+Le reseau est lu depuis un fichier .osm (XML, eventuellement .bz2 / .gz) sans
+acces reseau. Chaque troncon porte un temps de parcours libre (longueur /
+vitesse) ; les routes de RESEAU_ROUTIER qui le couvrent (selecteur de tags
+"osm") modulent sa vitesse selon leur statut (coupee = infranchissable).
+L'accessibilite d'un site est la moyenne, sur les trajets porte <-> echangeurs
+autoroutiers les plus proches, du rapport temps libre / temps actuel.
+Les plus courts chemins ne sont recalcules que si un troncon dont le statut a
+change invalide l'arbre courant ; les resultats sont memorises par etat du
+reseau (un statut par route).
+"""
+
+import bz2
+import gzip
+import heapq
+import math
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+import twice_engine as engine
+
+# ============================================================
+# PARAMETRES
+# ============================================================
+VITESSES_KMH = {
+    "motorway": 110, "motorway_link": 60, "trunk": 90, "trunk_link": 50,
+    "primary": 70, "primary_link": 50, "secondary": 50, "secondary_link": 40,
+    "tertiary": 50, "tertiary_link": 30, "unclassified": 40, "residential": 30,
+    "living_street": 10, "service": 20,
+}
+SENS_UNIQUE_DEFAUT = ("motorway", "motorway_link")
+N_JONCTIONS = 4      # echangeurs les plus proches retenus par site
+RAYON_TERRE_M = 6371000.0
+
+
+# ============================================================
+# LECTURE OSM
+# ============================================================
+
+def _ouvrir(chemin):
+    if chemin.endswith(".bz2"):
+        return bz2.open(chemin, "rb")
+    if chemin.endswith(".gz"):
+        return gzip.open(chemin, "rb")
+    return open(chemin, "rb")
+
+
+def lire_osm(chemin):
+    # Lecture en flux : noeuds (coordonnees), voies routieres (refs + tags),
+    # echangeurs (highway=motorway_junction). Les elements sont liberes au fil.
+    noeuds, voies, jonctions = {}, [], []
+    with _ouvrir(chemin) as f:
+        for _, el in ET.iterparse(f, events=("end",)):
+            if el.tag == "node":
+                nid = int(el.get("id"))
+                noeuds[nid] = (float(el.get("lat")), float(el.get("lon")))
+                if any(t.get("k") == "highway" and t.get("v") == "motorway_junction" for t in el.iter("tag")):
+                    jonctions.append(nid)
+                el.clear()
+            elif el.tag == "way":
+                tags = {t.get("k"): t.get("v") for t in el.iter("tag")}
+                if tags.get("highway") in VITESSES_KMH:
+                    voies.append(([int(n.get("ref")) for n in el.iter("nd")], tags))
+                el.clear()
+            elif el.tag == "relation":
+                el.clear()
+    return noeuds, voies, jonctions
+
+
+def _vitesse(tags):
+    v = tags.get("maxspeed", "").split(" ")[0]
+    return float(v) if v.replace(".", "", 1).isdigit() else float(VITESSES_KMH[tags["highway"]])
+
+
+def _distance_m(a, b):
+    lat = math.radians((a[0] + b[0]) / 2)
+    dx  = math.radians(b[1] - a[1]) * math.cos(lat)
+    dy  = math.radians(b[0] - a[0])
+    return RAYON_TERRE_M * math.hypot(dx, dy)
+
+
+def _correspond(tags, selecteur):
+    return bool(selecteur) and all(tags.get(k) == v for k, v in selecteur.items())
+
+
+# ============================================================
+# GRAPHE
+# ============================================================
+
+class Graphe:
+    # Troncons orientes : origine, destination, temps libre (s), route de
+    # RESEAU_ROUTIER qui le couvre (-1 si aucune). Listes d'adjacence dans
+    # les deux sens (arbres sortants et entrants).
+
+    def __init__(self, noeuds, voies, jonctions, reseau):
+        rang, self.coords = {}, []
+
+        def idx(nid):
+            if nid not in rang:
+                rang[nid] = len(self.coords)
+                self.coords.append(noeuds[nid])
+            return rang[nid]
+
+        origine, destination, libre, route = [], [], [], []
+        for refs, tags in voies:
+            refs = [n for n in refs if n in noeuds]
+            r    = next((k for k, rr in enumerate(reseau) if _correspond(tags, rr.get("osm"))), -1)
+            v    = _vitesse(tags) / 3.6
+            sens = tags.get("oneway", "yes" if tags["highway"] in SENS_UNIQUE_DEFAUT else "no")
+            for a, b in zip(refs, refs[1:]):
+                u, w = idx(a), idx(b)
+                t = _distance_m(noeuds[a], noeuds[b]) / v
+                if sens != "-1":
+                    origine.append(u); destination.append(w); libre.append(t); route.append(r)
+                if sens not in ("yes", "true", "1"):
+                    origine.append(w); destination.append(u); libre.append(t); route.append(r)
+
+        self.origine     = origine
+        self.destination = destination
+        self.libre       = libre
+        self.route       = np.array(route, dtype=np.intp)
+        self.jonctions   = [rang[j] for j in jonctions if j in rang]
+        self.sortants    = [[] for _ in self.coords]
+        self.entrants    = [[] for _ in self.coords]
+        for e, (u, w) in enumerate(zip(origine, destination)):
+            self.sortants[u].append((w, e))
+            self.entrants[w].append((u, e))
+        self.troncons_route = [np.flatnonzero(self.route == k).tolist() for k in range(len(reseau))]
+        self._lat = np.array([c[0] for c in self.coords])
+        self._lon = np.array([c[1] for c in self.coords])
+
+    def plus_proches(self, point, candidats=None, n=1):
+        cand = np.arange(len(self.coords)) if candidats is None else np.asarray(candidats, dtype=np.intp)
+        lat, lon = point
+        dx = (self._lon[cand] - lon) * math.cos(math.radians(lat))
+        dy = self._lat[cand] - lat
+        return cand[np.argsort(dx * dx + dy * dy, kind="stable")[:n]].tolist()
+
+    def temps(self, facteurs):
+        # facteurs : multiplicateur de vitesse par route (0 = coupee)
+        f = np.append(np.asarray(facteurs, dtype=float), 1.0)[self.route]
+        with np.errstate(divide="ignore"):
+            return np.where(f > 0, np.asarray(self.libre) / np.where(f > 0, f, 1.0), np.inf).tolist()
+
+
+def charger(chemin, reseau):
+    return Graphe(*lire_osm(chemin), reseau)
+
+
+# ============================================================
+# PLUS COURTS CHEMINS
+# ============================================================
+
+def dijkstra(adjacence, source, poids):
+    # Arbre complet : distances et troncon predecesseur de chaque noeud
+    dist = [math.inf] * len(adjacence)
+    pred = [-1] * len(adjacence)
+    dist[source] = 0.0
+    tas = [(0.0, source)]
+    while tas:
+        d, u = heapq.heappop(tas)
+        if d > dist[u]:
+            continue
+        for v, e in adjacence[u]:
+            nd = d + poids[e]
+            if nd < dist[v]:
+                dist[v] = nd
+                pred[v] = e
+                heapq.heappush(tas, (nd, v))
+    return dist, pred
+
+
+def arbre_valide(arbre, extremites, troncons, ancien, nouveau):
+    # L'arbre reste optimal si aucun troncon ralenti n'y figure et si aucun
+    # troncon accelere ne raccourcit un chemin (d[u] + w < d[v]).
+    dist, pred = arbre
+    for e in troncons:
+        u, v = extremites(e)
+        if nouveau[e] > ancien[e]:
+            if pred[v] == e:
+                return False
+        elif nouveau[e] < ancien[e] and dist[u] + nouveau[e] < dist[v]:
+            return False
+    return True
+
+
+class Accessibilite:
+    # Evaluateur acc(codes) pour engine.evaluer : codes (..., routes, heures)
+    # -> (..., sites, heures), memorise par etat du reseau.
+
+    def __init__(self, graphe, portes, vitesse_statut, n_jonctions=N_JONCTIONS):
+        self.graphe   = graphe
+        self.facteurs = np.array([vitesse_statut[s] for s in engine.STATUTS], dtype=float)
+        self.paires   = []   # par site : noeud porte, echangeurs retenus
+        for p in portes:
+            porte = graphe.plus_proches(p)[0]
+            jonc  = [j for j in graphe.plus_proches(p, graphe.jonctions, n_jonctions) if j != porte]
+            self.paires.append((porte, jonc))
+
+        # Sources : (adjacence, noeud) sortant puis entrant pour chaque porte
+        self.sources = []
+        for porte, _ in self.paires:
+            self.sources.append(("sortants", porte))
+            self.sources.append(("entrants", porte))
+
+        n_routes     = len(graphe.troncons_route)
+        self._etat   = (engine.CODE_STATUT["normal"],) * n_routes
+        self._poids  = graphe.temps(self.facteurs[list(self._etat)])
+        self._arbres = [dijkstra(getattr(graphe, a), s, self._poids) for a, s in self.sources]
+        self._libre  = self._temps_paires()
+        self.memo    = {self._etat: self._ratios()}
+        self.dijkstras = len(self._arbres)
+
+    def _temps_paires(self):
+        out = []
+        for k, (_, jonc) in enumerate(self.paires):
+            sortant, entrant = self._arbres[2 * k][0], self._arbres[2 * k + 1][0]
+            out.append([sortant[j] for j in jonc] + [entrant[j] for j in jonc])
+        return out
+
+    def _ratios(self):
+        acc = []
+        for libre, actuel in zip(self._libre, self._temps_paires()):
+            r = [(l / t if t < math.inf else 0.0) for l, t in zip(libre, actuel) if l < math.inf]
+            acc.append(sum(r) / len(r) if r else 1.0)
+        return engine.arrondi(np.array(acc), 3)
+
+    def _passer_a(self, etat):
+        g       = self.graphe
+        change  = [k for k, (a, b) in enumerate(zip(self._etat, etat)) if a != b]
+        troncons = [e for k in change for e in g.troncons_route[k]]
+        nouveau = g.temps(self.facteurs[list(etat)])
+        for i, (adj, s) in enumerate(self.sources):
+            if adj == "sortants":
+                ext = lambda e: (g.origine[e], g.destination[e])
+            else:
+                ext = lambda e: (g.destination[e], g.origine[e])
+            if not arbre_valide(self._arbres[i], ext, troncons, self._poids, nouveau):
+                self._arbres[i] = dijkstra(getattr(g, adj), s, nouveau)
+                self.dijkstras += 1
+        self._etat, self._poids = etat, nouveau
+
+    def etat(self, etat):
+        etat = tuple(int(c) for c in etat)
+        if etat not in self.memo:
+            self._passer_a(etat)
+            self.memo[etat] = self._ratios()
+        return self.memo[etat]
+
+    def __call__(self, codes):
+        codes = np.asarray(codes)
+        r, h  = codes.shape[-2:]
+        plat  = np.moveaxis(codes.reshape(-1, r, h), 1, 0).reshape(r, -1)
+        if plat.shape[1] == 0:
+            return np.ones(codes.shape[:-2] + (len(self.paires), h))
+        # Un calcul par etat distinct, dans l'ordre d'apparition (etats voisins)
+        etats, premier, inv = np.unique(plat, axis=1, return_index=True, return_inverse=True)
+        valeurs = np.empty((etats.shape[1], len(self.paires)))
+        for k in np.argsort(premier, kind="stable"):
+            valeurs[k] = self.etat(etats[:, k])
+        acc = valeurs[inv.reshape(-1)].T.reshape(len(self.paires), -1, h)
+        return np.moveaxis(acc, 0, 1).reshape(codes.shape[:-2] + (len(self.paires), h))
@@ -0,0 +1,88 @@
+"""
+TWICE — Recalcul incremental
+Realigne le resultats_latest.json precedent sur les heures de meteo.times et
+ne recalcule que les heures dont une entree a change, ou dont la fenetre
+glissante (FENETRE_GLISSANTE_H) touche une heure changee. Les autres heures
+sont reprises telles quelles. Repli sur un calcul complet (None) si la
+configuration ou les hypotheses different.
+"""
+
+import numpy as np
+
+import twice_engine as engine
+import twice_format as fmt
+
+
+def charger_etat(chemin, modele):
+    # Etat du run precedent sous forme de tableaux, ou None s'il est inutilisable
+    try:
+        prec = fmt.charger_colonnes(chemin)
+    except (OSError, ValueError, KeyError):
+        return None
+
+    resultats = prec.get("resultats", [])
+    if [r["site_id"] for r in resultats] != modele.site_ids or prec["routes"] != modele.route_ids:
+        return None
+
+    points = prec["meteo"]["points"]
+    times  = fmt.decoder_temps(prec["temps"])
+    return {
+        "prec":          prec,
+        "times":         times,
+        "precip":        np.array([p["precipitation"] for p in points], dtype=float),
+        "indices":       np.array([p["indice_alea"] for p in points], dtype=float),
+        "statuts":       np.array(prec["statuts"], dtype=np.int8).reshape(len(modele.route_ids), len(times)),
+        **{c: np.array([r["colonnes"][c] for r in resultats], dtype=float) for c in fmt.COLONNES_SITE},
+    }
+
+
+def heures_a_recalculer(times, precip, etat, fenetre):
+    # Heure i propre si elle existait deja avec la meme pluie sur chaque point,
+    # et si sa fenetre couvre les memes heures (memes valeurs, meme ordre,
+    # meme troncature en debut de serie) qu'au run precedent.
+    n    = len(times)
+    pos  = {t: j for j, t in enumerate(etat["times"])}
+    jmap = np.array([pos.get(t, -1) for t in times], dtype=np.intp)
+
+    present = jmap >= 0
+    change  = ~present
+    if etat["precip"].shape[0] != precip.shape[0]:
+        return jmap, np.ones(n, dtype=bool)
+    change[present] |= (etat["precip"][:, jmap[present]] != precip[:, present]).any(axis=0)
+
+    sale = change.copy()
+    for k in range(1, fenetre):
+        ok = jmap - k < 0                  # fenetre tronquee des deux cotes
+        if k < n:
+            ok[k:] = ~change[:-k] & (jmap[:-k] == jmap[k:] - k)
+        sale |= ~ok
+    return jmap, sale
+
+
+def recalculer(chemin, config_hash, hypotheses, times, precip, modele, params):
+    etat = charger_etat(chemin, modele)
+    if etat is None:
+        print("  incremental : pas de run precedent exploitable, calcul complet")
+        return None
+    prec = etat["prec"]
+    if prec.get("config_hash") != config_hash or prec.get("hypotheses") != hypotheses:
+        print("  incremental : configuration ou hypotheses modifiees, calcul complet")
+        return None
+
+    jmap, sale = heures_a_recalculer(times, precip, etat, params["fenetre"])
+    heures = np.flatnonzero(sale)
+
+    # Heures propres : reprises du run precedent (toujours presentes)
+    src = np.where(jmap >= 0, jmap, 0)
+    sim = {k: etat[k][:, src] for k in ("indices", "statuts", "accessibilite", "taux_activite", "perte_eur")}
+
+    if heures.size:
+        idx = engine.indice_alea_heures(precip, heures, params["fenetre"], params["seuil_max"])
+        ev  = engine.evaluer(modele, idx, params["seuil_normal"], params["seuil_arret"], params["point_routes"],
+                             params.get("acces"))
+        sim["indices"][:, heures] = idx
+        for k, v in ev.items():
+            sim[k][:, heures] = v
+
+    print(f"  incremental : {heures.size}/{len(times)} heures recalculees")
+    return sim
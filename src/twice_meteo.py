@@ -0,0 +1,90 @@
+"""
+TWICE — Acquisition meteo multi-points (Open-Meteo)
+Les points sont regroupes par maille de la grille de prevision, envoyes par
+lots (requetes multi-localisations) et les lots sont recuperes en parallele
+sur une session HTTP partagee (keep-alive, reprises avec backoff), a travers
+le cache disque de twice_cache.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import twice_cache as cache
+
+# ============================================================
+# PARAMETRES
+# ============================================================
+URL                = os.environ.get("TWICE_OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+GRILLE_DEG         = 0.02   # maille du modele de prevision (ICON-D2 ~ 2 km)
+POINTS_PAR_REQUETE = 50     # latitude=..,..&longitude=..,.. (longueur d'URL)
+CONCURRENCE        = 4      # requetes simultanees au plus
+TENTATIVES         = 3
+BACKOFF_S          = 0.5
+TIMEOUT_S          = 15
+
+_session = None
+
+
+def session():
+    global _session
+    if _session is None:
+        # requests importe a la premiere requete reseau seulement
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        retry = Retry(total=TENTATIVES, backoff_factor=BACKOFF_S,
+                      status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=CONCURRENCE, pool_maxsize=CONCURRENCE, max_retries=retry)
+        s = requests.Session()
+        s.mount("https://", adapter)
+        s.mount("http://", adapter)
+        _session = s
+    return _session
+
+
+def maille(point):
+    lat, lon = point
+    return (round(lat / GRILLE_DEG), round(lon / GRILLE_DEG))
+
+
+def _fetch_lot(lot, params, url):
+    q = dict(params,
+             latitude=",".join(str(lat) for lat, _ in lot),
+             longitude=",".join(str(lon) for _, lon in lot))
+    data = cache.get_json(session, url, q, TIMEOUT_S)
+    # Une seule localisation : objet ; plusieurs : liste dans l'ordre demande
+    return data if isinstance(data, list) else [data]
+
+
+def fetch_horaire(points, params, url=None):
+    # points : liste de (lat, lon). Renvoie times et {point: bloc "hourly"}.
+    # Chaque maille n'est demandee qu'une fois, avec le premier point qui y tombe.
+    representants = {}
+    for p in points:
+        representants.setdefault(maille(p), p)
+    reps = list(representants.values())
+    lots = [reps[i:i + POINTS_PAR_REQUETE] for i in range(0, len(reps), POINTS_PAR_REQUETE)]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(CONCURRENCE, len(lots)))) as pool:
+        reponses = list(pool.map(lambda lot: _fetch_lot(lot, params, url or URL), lots))
+
+    times  = None
+    par_maille = {}
+    for lot, rep in zip(lots, reponses):
+        for p, data in zip(lot, rep):
+            if times is None:
+                times = data["hourly"]["time"]
+            par_maille[maille(p)] = data["hourly"]
+    return times, {p: par_maille[maille(p)] for p in points}
+
+
+def fetch_points(points, past_days, forecast_days):
+    # points : liste de (lat, lon). Renvoie times et {point: precipitation}.
+    params = {
+        "hourly":        "precipitation",
+        "past_days":     past_days,
+        "forecast_days": forecast_days,
+        "timezone":      "Europe/Luxembourg",
+    }
+    times, horaire = fetch_horaire(points, params)
+    return times, {p: h["precipitation"] for p, h in horaire.items()}
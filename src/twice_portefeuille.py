@@ -0,0 +1,224 @@
+"""
+TWICE — Portefeuille de sites (fichier externe, representation compacte)
+Un portefeuille de milliers de sites se lit depuis un CSV ou un JSON au lieu
+de la liste SITES. Les attributs sont ranges en colonnes (un tableau par
+champ) et les routes critiques en matrice creuse sites x routes au format CSR
+(indptr / colonnes / poids, dans l'ordre de routes_critiques) : le moteur en
+tire ses tableaux par site sans parcourir un dict par site.
+La lecture est mise en cache disque (instantane .npz, cle = contenu du
+fichier) : les runs suivants ne font plus que des lectures de tableaux.
+
+CSV : une ligne par site, colonnes id, nom, type, ca_journalier,
+routes_critiques ("A3_bettembourg:3;N31_bettembourg:2"), et facultativement
+lat, lon, porte_lat, porte_lon.
+JSON : liste de sites au format de SITES, ou {"sites": [...]}.
+"""
+
+import csv
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+
+REPERTOIRE = os.environ.get("TWICE_PORTEFEUILLE_DIR", ".cache/portefeuille")
+VERSION    = 2     # format de l'instantane (invalide les anciens ; 2 : CA valides)
+
+CHAMPS_TEXTE   = ("ids", "noms", "types", "route_ids")
+CHAMPS_TABLEAU = ("ca_journalier", "lat", "lon", "porte_lat", "porte_lon",
+                  "indptr", "colonnes", "poids", "poids_tot")
+
+
+# ============================================================
+# REPRESENTATION
+# ============================================================
+
+class Portefeuille:
+    # Colonnes par site (S sites) ; coordonnees absentes = NaN.
+    # Matrice creuse : les poids du site i sont poids[indptr[i]:indptr[i+1]],
+    # sur les routes route_ids[colonnes[...]] ; poids_tot = somme sequentielle
+    # (meme ordre que twice_run.accessibilite).
+
+    __slots__ = CHAMPS_TEXTE + CHAMPS_TABLEAU
+
+    def __init__(self, **champs):
+        for k in self.__slots__:
+            setattr(self, k, champs[k])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def longueurs(self):
+        return np.diff(self.indptr)
+
+    def coordonnees(self, defaut):
+        # Point meteo de chaque site : (lat, lon) propres ou defaut
+        return [(defaut[0] if np.isnan(a) else a, defaut[1] if np.isnan(b) else b)
+                for a, b in zip(self.lat.tolist(), self.lon.tolist())]
+
+    def portes(self, defaut):
+        # Porte d'acces de chaque site : porte renseignee, sinon le site
+        return [(c[0] if np.isnan(a) else a, c[1] if np.isnan(b) else b)
+                for c, a, b in zip(self.coordonnees(defaut), self.porte_lat.tolist(), self.porte_lon.tolist())]
+
+    def lot(self, tranche):
+        # Sous-portefeuille des sites d'une tranche (evaluation par lots) ;
+        # memes routes, lignes de la matrice creuse recadrees
+        d, f   = self.indptr[tranche.start], self.indptr[tranche.stop]
+        champs = {k: getattr(self, k)[tranche] for k in CHAMPS_TEXTE + CHAMPS_TABLEAU if k not in ("route_ids", "indptr")}
+        champs.update(route_ids=self.route_ids, indptr=self.indptr[tranche.start:tranche.stop + 1] - d,
+                      colonnes=self.colonnes[d:f], poids=self.poids[d:f])
+        return Portefeuille(**champs)
+
+    def matrice(self, route_ids):
+        # (indptr, colonnes, poids) reindexes sur un reseau ; une route absente
+        # pointe sur len(route_ids) (ligne "toujours normal" du moteur)
+        pos  = {rid: k for k, rid in enumerate(route_ids)}
+        vers = np.array([pos.get(rid, len(route_ids)) for rid in self.route_ids], dtype=np.intp)
+        return self.indptr, vers[self.colonnes], self.poids
+
+
+def _assembler(ids, noms, types, ca, lat, lon, porte_lat, porte_lon, routes):
+    # routes : une liste [(route_id, poids), ...] par site
+    route_ids, pos, colonnes, poids = [], {}, [], []
+    indptr = np.zeros(len(ids) + 1, dtype=np.intp)
+    for i, rc in enumerate(routes):
+        for rid, p in rc:
+            if rid not in pos:
+                pos[rid] = len(route_ids)
+                route_ids.append(rid)
+            colonnes.append(pos[rid])
+            poids.append(float(p))
+        indptr[i + 1] = len(poids)
+    poids = np.array(poids, dtype=float)
+
+    # tot += p site par site, vectorise sur la position dans la ligne
+    longueurs = np.diff(indptr)
+    poids_tot = np.zeros(len(ids))
+    for k in range(int(longueurs.max(initial=0))):
+        lignes = np.flatnonzero(longueurs > k)
+        poids_tot[lignes] += poids[indptr[lignes] + k]
+
+    def reels(v):
+        return np.array([np.nan if x is None or x == "" else float(x) for x in v], dtype=float)
+
+    return Portefeuille(
+        ids           = [str(x) for x in ids],
+        noms          = list(noms),
+        types         = list(types),
+        route_ids     = route_ids,
+        ca_journalier = reels(ca),
+        lat           = reels(lat),
+        lon           = reels(lon),
+        porte_lat     = reels(porte_lat),
+        porte_lon     = reels(porte_lon),
+        indptr        = indptr,
+        colonnes      = np.array(colonnes, dtype=np.intp),
+        poids         = poids,
+        poids_tot     = poids_tot,
+    )
+
+
+def depuis_sites(sites):
+    # Liste de dicts au format de SITES -> Portefeuille
+    portes = [s.get("porte", {}) for s in sites]
+    return _assembler(
+        [s["id"] for s in sites], [s.get("nom", s["id"]) for s in sites],
+        [s.get("type", "") for s in sites], [s["ca_journalier"] for s in sites],
+        [s.get("lat") for s in sites], [s.get("lon") for s in sites],
+        [p.get("lat") for p in portes], [p.get("lon") for p in portes],
+        [list(s["routes_critiques"].items()) for s in sites],
+    )
+
+
+# ============================================================
+# LECTURE
+# ============================================================
+
+def _ca(v, ou):
+    # CA journalier : nombre fini >= 0 (il entre dans toutes les pertes)
+    try:
+        ca = float(v)
+    except (TypeError, ValueError):
+        ca = math.nan
+    if not math.isfinite(ca) or ca < 0:
+        raise ValueError(f"{ou} : ca_journalier attendu nombre >= 0, lu {v!r}")
+    return ca
+
+
+def _routes_csv(texte, chemin, ligne):
+    out = []
+    for morceau in filter(None, (m.strip() for m in texte.split(";"))):
+        rid, sep, p = morceau.rpartition(":")
+        if not sep or not rid:
+            raise ValueError(f"{chemin}:{ligne} : routes_critiques attendu 'route:poids;...', lu {texte!r}")
+        out.append((rid.strip(), float(p)))
+    return out
+
+
+def lire_csv(chemin):
+    with open(chemin, newline="", encoding="utf-8") as f:
+        lignes = list(csv.DictReader(f))
+    manquantes = {"id", "ca_journalier", "routes_critiques"} - set(lignes[0] if lignes else ())
+    if lignes and manquantes:
+        raise ValueError(f"{chemin} : colonne(s) manquante(s) {sorted(manquantes)}")
+    # Ligne k + 2 du fichier (en-tete en ligne 1)
+    return _assembler(
+        [l["id"] for l in lignes], [l.get("nom") or l["id"] for l in lignes],
+        [l.get("type") or "" for l in lignes],
+        [_ca(l["ca_journalier"], f"{chemin}:{k + 2}") for k, l in enumerate(lignes)],
+        [l.get("lat") for l in lignes], [l.get("lon") for l in lignes],
+        [l.get("porte_lat") for l in lignes], [l.get("porte_lon") for l in lignes],
+        [_routes_csv(l["routes_critiques"], chemin, k + 2) for k, l in enumerate(lignes)],
+    )
+
+
+def lire(chemin):
+    if chemin.endswith(".csv"):
+        return lire_csv(chemin)
+    with open(chemin, encoding="utf-8") as f:
+        data = json.load(f)
+    sites = data["sites"] if isinstance(data, dict) else data
+    for k, s in enumerate(sites):
+        _ca(s.get("ca_journalier"), f"{chemin} : site {k + 1} ({s.get('id')!r})")
+    return depuis_sites(sites)
+
+
+# ============================================================
+# INSTANTANE COMPILE (CACHE DISQUE)
+# ============================================================
+
+def cle(chemin):
+    h = hashlib.sha256(f"portefeuille-v{VERSION}:".encode("utf-8"))
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloc)
+    return h.hexdigest()
+
+
+def _ecrire_instantane(pf, chemin):
+    textes = json.dumps({k: getattr(pf, k) for k in CHAMPS_TEXTE}, ensure_ascii=False).encode("utf-8")
+    os.makedirs(os.path.dirname(chemin) or ".", exist_ok=True)
+    tmp = f"{chemin}.{os.getpid()}.tmp.npz"
+    np.savez(tmp, textes=np.frombuffer(textes, dtype=np.uint8), **{k: getattr(pf, k) for k in CHAMPS_TABLEAU})
+    os.replace(tmp, chemin)
+
+
+def _lire_instantane(chemin):
+    with np.load(chemin) as z:
+        champs = {k: z[k] for k in CHAMPS_TABLEAU}
+        champs.update(json.loads(bytes(z["textes"]).decode("utf-8")))
+    return Portefeuille(**champs)
+
+
+def charger(chemin):
+    # Portefeuille d'un fichier, depuis l'instantane si le contenu n'a pas change
+    instantane = os.path.join(REPERTOIRE, cle(chemin) + ".npz")
+    try:
+        return _lire_instantane(instantane)
+    except (OSError, ValueError, KeyError):
+        pass
+    pf = lire(chemin)
+    _ecrire_instantane(pf, instantane)
+    return pf
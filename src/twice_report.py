@@ -3,113 +3,38 @@ TWICE — Generateur de rapport HTML
 Version epuree : Chart.js standard, aucun plugin custom
 """
 
+import argparse
+import hashlib
+import html
+import io
 import json
-from pathlib import Path
+import os
+import re
 
+import numpy as np
 
-def fmt_date(iso):
-    if len(iso) >= 16:
-        return f"{iso[8:10]}/{iso[5:7]} {iso[11:16]}"
-    return iso
+import twice_evenements as evenements
+import twice_format as fmt
+import twice_telemetrie as tel
 
+POINTS_MAX       = 1500   # points par serie de graphique au-dela desquels on reduit (LTTB)
+PAGE_H           = 48     # lignes (heures) par page de la chronologie
+SPARK_POINTS     = 48     # points des courbes de taux du portefeuille
+SITES_SEQUENTIEL = 16     # en deca, pages de site rendues sans pool de processus
+DOSSIERS         = ("outputs", "docs")
 
-def fmt_eur(v):
-    return f"{int(v):,} EUR".replace(",", " ")
+_HORODATAGE = re.compile(r"Genere le [^<]* UTC")
 
 
-def badge(statut):
-    c = {"normal": ("#d1fae5","#065f46"), "impacte": ("#fef3c7","#92400e"), "coupe": ("#fee2e2","#991b1b")}
-    bg, fg = c.get(statut, ("#f3f4f6","#374151"))
-    label  = {"normal":"normal","impacte":"impacte","coupe":"coupe"}.get(statut, statut)
-    return f'<span style="background:{bg};color:{fg};padding:1px 7px;border-radius:3px;font-size:11px;font-weight:600">{label}</span>'
-
-
-def generate(data):
-    times      = data["meteo"]["times"]
-    precip     = data["meteo"]["precipitation"]
-    indices    = data["indices_alea"]
-    resultats  = data["resultats"]
-    now_index  = data["now_index"]
-    gen_at     = data["generated_at"][:16].replace("T", " ")
-    hypotheses = data["hypotheses"]
-
-    n = len(times)
-
-    # Labels JJ/MM HH:MM
-    labels     = [fmt_date(t) for t in times]
-    labels_js  = json.dumps(labels)
-    precip_js  = json.dumps(precip)
-    indices_js = json.dumps(indices)
-    now_js     = now_index
-
-    # Taux et pertes site 0
-    taux0   = [h["taux_activite"] * 100 for h in resultats[0]["chronologie"]]
-    pertes0 = []
-    cumul   = 0
-    for h in resultats[0]["chronologie"]:
-        cumul += h["perte_eur"]
-        pertes0.append(round(cumul))
-    taux0_js   = json.dumps(taux0)
-    pertes0_js = json.dumps(pertes0)
-
-    # Routes
-    route_ids = list(resultats[0]["chronologie"][0]["statuts_routes"].keys())
-    STATUT_VAL = {"normal": 1.0, "impacte": 0.5, "coupe": 0.0}
-    routes_data = {}
-    for rid in route_ids:
-        routes_data[rid] = [STATUT_VAL.get(h["statuts_routes"][rid], 1.0)
-                            for h in resultats[0]["chronologie"]]
-    routes_js = json.dumps(routes_data)
-    route_ids_js = json.dumps(route_ids)
-
-    # Cartes KPI
-    cards_html = ""
-    for s in resultats:
-        cards_html += f"""
-        <div class="card">
-          <div class="card-title">{s['site_nom']}</div>
-          <div class="card-sub">{s['type']}</div>
-          <div class="kpis">
-            <div class="kpi"><div class="kv red">{fmt_eur(s['perte_totale_eur'])}</div><div class="kl">Perte totale</div></div>
-            <div class="kpi"><div class="kv">{s['heures_arret']}h</div><div class="kl">A l arret</div></div>
-            <div class="kpi"><div class="kv">{s['heures_degradees']}h</div><div class="kl">Degradees</div></div>
-            <div class="kpi"><div class="kv">{s['accessibilite_min']:.0%}</div><div class="kl">Access. min</div></div>
-          </div>
-        </div>"""
-
-    # Tableau chronologique
-    rows_html = ""
-    for h in resultats[0]["chronologie"]:
-        td     = fmt_date(h["time"])
-        p      = f"{h['precipitation_mm']:.1f} mm"
-        ia     = f"{h['indice_alea']:.2f}"
-        acc    = f"{h['accessibilite']:.0%}"
-        taux   = f"{h['taux_activite']:.0%}"
-        perte  = fmt_eur(h["perte_eur"])
-        badges = " ".join(badge(v) for v in h["statuts_routes"].values())
-        fc     = ' <small style="color:#2563eb;font-weight:600">PREVIS.</small>' if h["is_forecast"] else ""
-
-        if h["taux_activite"] == 0:
-            bg = 'style="background:#fff5f5"'
-        elif h["taux_activite"] < 1:
-            bg = 'style="background:#fffbeb"'
-        elif h["is_forecast"]:
-            bg = 'style="background:#f0f9ff"'
-        else:
-            bg = ""
+def fmt_eur(v):
+    return f"{int(v):,} EUR".replace(",", " ")
 
-        rows_html += f"""<tr {bg}>
-          <td>{td}{fc}</td><td>{p}</td><td>{ia}</td>
-          <td>{badges}</td><td>{acc}</td><td>{taux}</td>
-          <td style="text-align:right;font-weight:600">{perte}</td>
-        </tr>"""
 
-    # Hypotheses
-    hyp_html = ""
-    for k, v in hypotheses.items():
-        hyp_html += f"<tr><td><b>{k}</b></td><td>{v}</td></tr>"
+# ============================================================
+# GABARITS (str.format : accolades CSS / JS doublees)
+# ============================================================
 
-    return f"""<!DOCTYPE html>
+_PAGE_DEBUT = """<!DOCTYPE html>
 <html lang="fr">
 <head>
 <meta charset="UTF-8">
@@ -163,6 +88,35 @@ tbody td {{ padding:7px 12px; vertical-align:middle }}
 .hyp-tbl td {{ padding:7px 12px; border-bottom:1px solid #f0f1f3 }}
 .hyp-tbl tr:last-child td {{ border-bottom:none }}
 
+.b {{ padding:1px 7px; border-radius:3px; font-size:11px; font-weight:600 }}
+.b-normal {{ background:#d1fae5; color:#065f46 }}
+.b-impacte {{ background:#fef3c7; color:#92400e }}
+.b-coupe {{ background:#fee2e2; color:#991b1b }}
+tr.arret {{ background:#fff5f5 }}
+tr.degrade {{ background:#fffbeb }}
+tr.prev {{ background:#f0f9ff }}
+tr.rapport {{ background:#f0f9ff }}
+.tag-prev {{ color:#2563eb; font-weight:600 }}
+th.num, td.num {{ text-align:right }}
+td.eur {{ text-align:right; font-weight:600 }}
+.pager {{ display:flex; align-items:center; gap:10px; margin-top:10px; font-size:12px; color:#6b7280 }}
+.pager button {{ font:inherit; font-size:12px; padding:4px 10px; border:1px solid #e4e6ea; border-radius:4px; background:#fff; cursor:pointer }}
+.pager button:disabled {{ opacity:.4; cursor:default }}
+h2 .retour {{ margin-left:auto; font-size:12px; font-weight:500; color:#2563eb; text-decoration:none }}
+#tSites th {{ cursor:pointer }}
+#tSites a {{ color:#1e2433; font-weight:600; text-decoration:none }}
+.spark {{ display:block }}
+.sim {{ background:#fff; border:1px solid #e4e6ea; border-radius:8px; padding:16px 20px; margin-bottom:16px }}
+.sim h3 {{ font-size:11px; font-weight:600; color:#6b7280; text-transform:uppercase; letter-spacing:.7px; margin-bottom:12px }}
+.sim-champs {{ display:flex; flex-wrap:wrap; gap:16px; margin-bottom:12px }}
+.sim label {{ display:flex; flex-direction:column; gap:4px; font-size:11px; color:#6b7280 }}
+.sim input {{ font:inherit; font-size:13px; width:120px; padding:4px 8px; border:1px solid #e4e6ea; border-radius:4px }}
+.sim input.invalide {{ border-color:#dc2626 }}
+.sim input:disabled {{ background:#f4f5f7 }}
+.sim table {{ width:auto; margin-bottom:12px }}
+.sim-pied {{ display:flex; align-items:center; gap:12px; font-size:12px; color:#6b7280 }}
+.sim-pied button {{ font:inherit; font-size:12px; padding:4px 10px; border:1px solid #e4e6ea; border-radius:4px; background:#fff; cursor:pointer }}
+
 footer {{ text-align:center; padding:20px; font-size:11px; color:#9ca3af; border-top:1px solid #e4e6ea; margin-top:20px }}
 </style>
 </head>
@@ -188,10 +142,26 @@ footer {{ text-align:center; padding:20px; font-size:11px; color:#9ca3af; border
 </div>
 
 <main>
+"""
 
+_PAGE_SYNTHESE = """
 <section>
-  <h2><span class="sec-num">01</span> Synthese par site</h2>
-  <div class="cards">{cards_html}</div>
+  <h2><span class="sec-num">01</span> Synthese &mdash; {nom}<a class="retour" href="../rapport.html">&#8592; Portefeuille</a></h2>
+  <div class="cards">"""
+
+_CARTE = """
+        <div class="card">
+          <div class="card-title">{nom}</div>
+          <div class="card-sub">{type}</div>
+          <div class="kpis">
+            <div class="kpi"><div class="kv red" id="kPerte">{perte}</div><div class="kl">Perte totale</div></div>
+            <div class="kpi"><div class="kv" id="kArret">{arret}h</div><div class="kl">A l arret</div></div>
+            <div class="kpi"><div class="kv" id="kDegradees">{degradees}h</div><div class="kl">Degradees</div></div>
+            <div class="kpi"><div class="kv" id="kAcc">{acc_min:.0%}</div><div class="kl">Access. min</div></div>
+          </div>
+        </div>"""
+
+_PAGE_TABLEAU = """</div>
 </section>
 
 <section>
@@ -200,50 +170,297 @@ footer {{ text-align:center; padding:20px; font-size:11px; color:#9ca3af; border
     <span><span style="color:#dc2626;font-weight:700">|</span> = maintenant (separation historique / previsions)</span>
     <span><span class="dot" style="background:rgba(59,130,246,.6)"></span> Historique</span>
     <span><span class="dot" style="background:rgba(59,130,246,.2);border:1px dashed #93c5fd"></span> Previsions</span>
-  </div>
+  </div>{simulation}
   <div class="charts">
     <div class="chart-box"><h3>Precipitations (mm/h) &amp; indice d'alea</h3><canvas id="cAlea" height="200"></canvas></div>
     <div class="chart-box"><h3>Statut des routes</h3><canvas id="cRoutes" height="200"></canvas></div>
-    <div class="chart-box"><h3>Taux d'activite — Eurohub Sud</h3><canvas id="cTaux" height="200"></canvas></div>
-    <div class="chart-box"><h3>Pertes cumulees — Eurohub Sud</h3><canvas id="cPertes" height="200"></canvas></div>
+    <div class="chart-box"><h3>Taux d'activite — {nom}</h3><canvas id="cTaux" height="200"></canvas></div>
+    <div class="chart-box"><h3>Pertes cumulees — {nom}</h3><canvas id="cPertes" height="200"></canvas></div>
   </div>
 </section>
 
 <section>
-  <h2><span class="sec-num">03</span> Chronologie detaillee — Terminal Eurohub Sud</h2>
+  <h2><span class="sec-num">03</span> Chronologie detaillee — {nom}</h2>
   <div class="tbl-wrap">
     <table>
       <thead><tr>
         <th>Date/Heure</th><th>Precip.</th><th>Indice</th>
         <th>Routes</th><th>Accessib.</th><th>Taux act.</th>
-        <th style="text-align:right">Perte</th>
+        <th class="num">Perte</th>
       </tr></thead>
-      <tbody>{rows_html}</tbody>
+      <tbody id="tChrono"></tbody>
+    </table>
+  </div>
+  <div class="pager">
+    <button id="pPrec">&#8592; Prec.</button>
+    <span id="pInfo"></span>
+    <button id="pSuiv">Suiv. &#8594;</button>
+    <button id="pNow">Maintenant</button>
+  </div>
+</section>
+"""
+
+_SIMULATION = """
+  <div class="sim">
+    <h3>Simulation &laquo; et si &raquo; &mdash; chaine recalculee dans le navigateur</h3>
+    <div class="sim-champs">
+      <label>CA journalier (EUR)<input id="sCa" type="number" step="any" min="0"></label>
+      <label>Activite pleine si access. &ge;<input id="sNormal" type="number" step="0.01"></label>
+      <label>Arret si access. &le;<input id="sArret" type="number" step="0.01"></label>
+    </div>
+    <table>
+      <thead><tr><th>Route</th><th>Seuil impact</th><th>Seuil coupure</th></tr></thead>
+      <tbody id="sRoutes"></tbody>
     </table>
+    <div class="sim-pied"><button id="sRun">Hypotheses du run</button><span id="sResume"></span></div>
+  </div>"""
+
+_PAGE_HYPOTHESES = """
+<section>
+  <h2><span class="sec-num">{num}</span> Hypotheses</h2>
+  <div class="tbl-wrap">
+    <table class="hyp-tbl">"""
+
+_PAGE_FIN_SECTION = """</table>
   </div>
 </section>
+"""
 
+_PAGE_DIAGNOSTICS = """
 <section>
-  <h2><span class="sec-num">04</span> Hypotheses</h2>
+  <h2><span class="sec-num">{num}</span> Diagnostics du run</h2>
   <div class="tbl-wrap">
-    <table class="hyp-tbl">{hyp_html}</table>
+    <table>
+      <thead><tr>
+        <th>Etape</th><th class="num">Mur (s)</th><th class="num">CPU (s)</th>
+        <th class="num">RSS processus, pic cumule (Mo)</th><th class="num">Elements</th>
+      </tr></thead>
+      <tbody>"""
+
+_LIGNE_DIAG = """<tr{cls}>
+          <td>{etape}</td><td class="num">{mur:.3f}</td><td class="num">{cpu:.3f}</td>
+          <td class="num">{rss}</td><td class="num">{elements}</td>
+        </tr>"""
+
+_PAGE_DIAG_PIED = """</tbody>
+    </table>
   </div>
+  <div class="now-label" style="margin-top:10px;margin-bottom:0">{pied}</div>
 </section>
+"""
 
+_PAGE_PIED = """
 </main>
 
 <footer>TWICE Prototype &middot; Meteo : Open-Meteo &middot; Reseau : OpenStreetMap</footer>
+"""
 
+_PAGE_INDEX = """
+<section>
+  <h2><span class="sec-num">01</span> Portefeuille</h2>
+  <div class="now-label">{resume}</div>
+  <div class="tbl-wrap" style="max-height:none">
+    <table id="tSites">
+      <thead><tr>
+        <th>Site</th><th>Type</th><th class="num">Perte totale</th><th class="num">Arret (h)</th>
+        <th class="num">Degradees (h)</th><th class="num">Access. min</th><th>Taux d'activite</th>
+      </tr></thead>
+      <tbody>"""
+
+_LIGNE_SITE = """<tr>
+          <td data-v="{nom}"><a href="{lien}">{nom}</a></td><td data-v="{type}">{type}</td>
+          <td class="eur" data-v="{perte_v}">{perte}</td><td class="num" data-v="{arret}">{arret}</td>
+          <td class="num" data-v="{degradees}">{degradees}</td><td class="num" data-v="{acc_min}">{acc_min:.0%}</td>
+          <td>{spark}</td>
+        </tr>"""
+
+_PAGE_INDEX_FIN = """</tbody>
+    </table>
+  </div>
+</section>
+"""
+
+_SCRIPT_INDEX = """
+<script>
+// Tri du portefeuille au clic sur un en-tete (numerique si possible)
+var tb = document.querySelector('#tSites tbody');
+document.querySelectorAll('#tSites th').forEach(function(th, c) {{
+  th.onclick = function() {{
+    var sens = th.dataset.sens === 'desc' ? 1 : -1;
+    th.dataset.sens = sens < 0 ? 'desc' : 'asc';
+    var lignes = Array.prototype.slice.call(tb.rows);
+    lignes.sort(function(a, b) {{
+      var x = a.cells[c].dataset.v, y = b.cells[c].dataset.v;
+      var d = (isNaN(x) || isNaN(y)) ? x.localeCompare(y, 'fr') : x - y;
+      return sens * d;
+    }});
+    lignes.forEach(function(l) {{ tb.appendChild(l); }});
+  }};
+}});
+</script>
+</body>
+</html>"""
+
+_PAGE_SCRIPT = """
 <script>
-var LABELS    = {labels_js};
-var PRECIP    = {precip_js};
-var INDICES   = {indices_js};
-var TAUX0     = {taux0_js};
-var PERTES0   = {pertes0_js};
-var ROUTES    = {routes_js};
-var ROUTE_IDS = {route_ids_js};
-var NOW       = {now_js};
-var N         = LABELS.length;
+"""
+
+# Noyau de la simulation "et si" : JS pur (aucun acces au DOM), ecrit dans
+# chaque page de site et execute tel quel par node pour verifier_simulation
+_NOYAU_SIMULATION = """// ── Chaine statuts -> accessibilite -> activite -> pertes (twice_run) ──
+// Meme texte que le format Python f"{{v:.{{d}}f}}" : egalite exacte -> chiffre
+// pair (toFixed arrondit l'egalite vers le haut)
+function fixe(v, d) {{
+  var s = v.toFixed(d);
+  var e = Math.abs(v).toFixed(100), k = e.indexOf('.') + 1 + d;
+  if (/^50*$/.test(e.slice(k))) {{
+    var bas = e.slice(0, k).replace(/\\.$/, '');
+    if (+bas.slice(-1) % 2 === 0) s = (v < 0 ? '-' : '') + bas;
+  }}
+  return s;
+}}
+// round(v, d) de Python arrondit la valeur exacte comme le format ci-dessus
+function arrondi(v, d) {{ return +fixe(v, d); }}
+
+function statutRoute(seuilImpact, seuilCoupure, idx) {{
+  if (idx >= seuilCoupure) return 2;
+  if (idx >= seuilImpact)  return 1;
+  return 0;
+}}
+function accessibiliteSite(poids, scores, codes) {{
+  // poids : [[ligne de la route, ou -1 si absente du reseau (normal), poids], ...]
+  var score = 0.0, tot = 0.0;
+  for (var k = 0; k < poids.length; k++) {{
+    var r = poids[k][0];
+    score += poids[k][1] * scores[r < 0 ? 0 : codes[r]];
+    tot   += poids[k][1];
+  }}
+  return tot ? arrondi(score / tot, 3) : 1.0;
+}}
+function tauxActivite(acc, seuilNormal, seuilArret) {{
+  if (acc >= seuilNormal) return 1.0;
+  if (acc <= seuilArret)  return 0.0;
+  return arrondi((acc - seuilArret) / (seuilNormal - seuilArret), 3);
+}}
+function perteHoraire(ca, taux) {{ return arrondi((ca / 24.0) * (1.0 - taux), 2); }}
+
+// Series d'indice par route : milliemes entiers, valeurs brutes ou indice
+// de la zone (zone, fourni a part)
+function indicesRoutes(M, zone) {{
+  var series = M.indices.map(function(s) {{
+    return s.zone ? zone : s.valeurs.map(function(v) {{ return v / s.echelle; }});
+  }});
+  return M.serie_route.map(function(k) {{ return series[k]; }});
+}}
+
+// Chaine heure par heure du site pour les hypotheses H (ca, seuil_normal,
+// seuil_arret, seuils_impact, seuils_coupure) -> intervalles (debut, acc,
+// taux, perte, statuts) et agregats du rapport. fixes(i) -> {{acc, statuts}}
+// remplace statuts et accessibilite (reseau OSM : graphe non embarque).
+function simuler(M, H, n, zone, fixes) {{
+  var idx = fixes ? null : indicesRoutes(M, zone), R = M.serie_route.length;
+  var iv  = {{debut: [], acc: [], taux: [], perte: [], statuts: []}};
+  var agg = {{perte_totale_eur: 0, heures_normales: 0, heures_degradees: 0, heures_arret: 0,
+             accessibilite_min: Infinity}};
+  var cumul = 0.0, prec = null;
+  for (var i = 0; i < n; i++) {{
+    var codes, acc;
+    if (fixes) {{
+      var e = fixes(i);
+      codes = e.statuts;
+      acc   = e.acc;
+    }} else {{
+      codes = [];
+      for (var r = 0; r < R; r++) codes.push(statutRoute(H.seuils_impact[r], H.seuils_coupure[r], idx[r][i]));
+      acc = accessibiliteSite(M.poids, M.scores, codes);
+    }}
+    var taux  = tauxActivite(acc, H.seuil_normal, H.seuil_arret);
+    var perte = perteHoraire(H.ca, taux);
+    cumul += perte;
+    if (taux === 1.0) agg.heures_normales++;
+    else if (taux === 0.0) agg.heures_arret++;
+    else agg.heures_degradees++;
+    if (acc < agg.accessibilite_min) agg.accessibilite_min = acc;
+    var cle = acc + '|' + taux + '|' + perte + '|' + codes.join(',');
+    if (cle !== prec) {{
+      iv.debut.push(i); iv.acc.push(acc); iv.taux.push(taux); iv.perte.push(perte); iv.statuts.push(codes);
+      prec = cle;
+    }}
+  }}
+  agg.perte_totale_eur = arrondi(cumul, 2);
+  return {{intervalles: iv, agregats: agg}};
+}}
+"""
+
+_PAGE_DONNEES = """
+var D = """
+
+_PAGE_FIN = """;
+
+// ── Donnees : temps, series completes, intervalles du site affiche ──
+function heures(enc) {{
+  if (enc.liste) return enc.liste;
+  var p = enc.debut.split(/[-T:]/).map(Number);
+  var t0 = Date.UTC(p[0], p[1] - 1, p[2], p[3], p[4]);
+  var out = [];
+  for (var i = 0; i < enc.n; i++) out.push(new Date(t0 + i * enc.pas_h * 3600000).toISOString().slice(0, 16));
+  return out;
+}}
+function fmtDate(iso) {{
+  return iso.length >= 16 ? iso.slice(8, 10) + '/' + iso.slice(5, 7) + ' ' + iso.slice(11, 16) : iso;
+}}
+
+var T      = heures(D.temps);
+var LABELS = T.map(fmtDate);
+var N      = T.length;
+var NOW    = D.now;
+var S      = D.site;
+var SC     = D.statuts_codes;
+var VAL    = SC.map(function(c) {{ return c === 'normal' ? 1.0 : c === 'impacte' ? 0.5 : 0.0; }});
+var P_SITE = S.precip || D.meteo.precip;
+var I_SITE = S.indice || D.meteo.indice;
+
+function pct(v) {{ return fixe(v * 100, 0) + '%'; }}
+function eur(v) {{ return String(Math.trunc(v)).replace(/\\B(?=(\\d{{3}})+(?!\\d))/g, ' ') + ' EUR'; }}
+
+// Intervalle de iv (S par defaut) contenant l'heure i (recherche dichotomique)
+function intervalle(i, iv) {{
+  var debut = (iv || S).debut, lo = 0, hi = debut.length - 1;
+  while (lo < hi) {{
+    var m = (lo + hi + 1) >> 1;
+    if (debut[m] <= i) lo = m; else hi = m - 1;
+  }}
+  return lo;
+}}
+
+// ── Series des graphiques : points reduits (si fournis) ou series completes ──
+function points(xs, ys) {{
+  return ys.map(function(y, k) {{ return {{x: xs ? xs[k] : k, y: y}}; }});
+}}
+function paliers(valeur) {{
+  // Series en escalier : un point par debut d'intervalle, plus la derniere heure
+  var out = S.debut.map(function(d, j) {{ return {{x: d, y: valeur(j)}}; }});
+  if (N > 1) out.push({{x: N - 1, y: valeur(S.debut.length - 1)}});
+  return out;
+}}
+function pertesCumulees() {{
+  var out = [], cumul = 0, j = 0;
+  for (var i = 0; i < N; i++) {{
+    while (j + 1 < S.debut.length && S.debut[j + 1] <= i) j++;
+    cumul += S.perte[j];
+    out.push({{x: i, y: +fixe(cumul, 0)}});
+  }}
+  return out;
+}}
+
+var G       = D.graphiques;
+var PRECIP  = G ? points(G.precip.x, G.precip.y) : points(null, D.meteo.precip);
+var INDICES = G ? points(G.indice.x, G.indice.y) : points(null, D.meteo.indice);
+var PERTES0 = G ? points(G.pertes.x, G.pertes.y) : pertesCumulees();
+var TAUX0   = paliers(function(j) {{ return S.taux[j] * 100; }});
+var ROUTES  = D.routes.map(function(rid, r) {{
+  return paliers(function(j) {{ return VAL[S.statuts[j][r]]; }});
+}});
 
 var GRID  = '#e9eaec';
 var TFONT = {{family:'Inter',size:10}};
@@ -269,16 +486,22 @@ var nowPlugin = {{
   }}
 }};
 
+// Axe x numerique (heure 0..N-1) : graduations toutes les 12 h ou multiple
 var xCfg = {{
+  type: 'linear', min: 0, max: Math.max(N - 1, 1),
   ticks: {{
-    font: TFONT, maxRotation: 45,
-    callback: function(v,i) {{ return i % 12 === 0 ? LABELS[i] : ''; }}
+    font: TFONT, maxRotation: 45, stepSize: 12 * Math.max(1, Math.ceil(N / 12 / 18)),
+    callback: function(v) {{ return LABELS[v] || ''; }}
   }},
   grid: {{color: GRID}}
 }};
+var PLUGINS = {{
+  legend: {{labels: {{font: TFONT, boxWidth:12}}}},
+  tooltip: {{callbacks: {{title: function(items) {{ return items.length ? LABELS[items[0].parsed.x] : ''; }}}}}}
+}};
 
-var bgPrecip = PRECIP.map(function(_,i){{
-  return i <= NOW ? 'rgba(59,130,246,.65)' : 'rgba(59,130,246,.18)';
+var bgPrecip = PRECIP.map(function(p){{
+  return p.x <= NOW ? 'rgba(59,130,246,.65)' : 'rgba(59,130,246,.18)';
 }});
 
 // ── Graphique 1 : Precip + indice ──
@@ -286,11 +509,11 @@ new Chart(document.getElementById('cAlea'), {{
   type: 'bar',
   plugins: [nowPlugin],
   data: {{
-    labels: LABELS,
     datasets: [
       {{
         type: 'bar', label: 'Precip (mm/h)', data: PRECIP,
-        backgroundColor: bgPrecip, yAxisID: 'yP', order: 2
+        backgroundColor: bgPrecip, yAxisID: 'yP', order: 2,
+        barPercentage: 1, categoryPercentage: 1
       }},
       {{
         type: 'line', label: 'Indice alea', data: INDICES,
@@ -301,8 +524,8 @@ new Chart(document.getElementById('cAlea'), {{
     ]
   }},
   options: {{
-    responsive: true, maintainAspectRatio: true, animation: false,
-    plugins: {{legend: {{labels: {{font: TFONT, boxWidth:12}}}}}},
+    responsive: true, maintainAspectRatio: true, animation: false, parsing: false,
+    plugins: PLUGINS,
     scales: {{
       x:  xCfg,
       yP: {{type:'linear',position:'left', grid:{{color:GRID}},ticks:{{font:TFONT}},title:{{display:true,text:'mm/h',font:{{size:9}}}}}},
@@ -313,23 +536,23 @@ new Chart(document.getElementById('cAlea'), {{
 
 // ── Graphique 2 : Routes ──
 var RCOLS = ['#2563eb','#059669','#d97706','#7c3aed'];
-var rDatasets = ROUTE_IDS.map(function(rid, i) {{
+var rDatasets = D.routes.map(function(rid, i) {{
   return {{
     label: rid.replace(/_/g,' '),
-    data:  ROUTES[rid],
+    data:  ROUTES[i],
     borderColor: RCOLS[i % RCOLS.length],
     backgroundColor: 'transparent',
     borderWidth: 2, pointRadius: 0, stepped: true, tension: 0
   }};
 }});
 
-new Chart(document.getElementById('cRoutes'), {{
+var chRoutes = new Chart(document.getElementById('cRoutes'), {{
   type: 'line',
   plugins: [nowPlugin],
-  data: {{labels: LABELS, datasets: rDatasets}},
+  data: {{datasets: rDatasets}},
   options: {{
-    responsive: true, maintainAspectRatio: true, animation: false,
-    plugins: {{legend: {{labels: {{font: TFONT, boxWidth:12}}}}}},
+    responsive: true, maintainAspectRatio: true, animation: false, parsing: false,
+    plugins: PLUGINS,
     scales: {{
       x: xCfg,
       y: {{
@@ -343,11 +566,10 @@ new Chart(document.getElementById('cRoutes'), {{
 }});
 
 // ── Graphique 3 : Taux activite ──
-new Chart(document.getElementById('cTaux'), {{
+var chTaux = new Chart(document.getElementById('cTaux'), {{
   type: 'line',
   plugins: [nowPlugin],
   data: {{
-    labels: LABELS,
     datasets: [{{
       label: 'Taux activite (%)',
       data: TAUX0,
@@ -356,8 +578,8 @@ new Chart(document.getElementById('cTaux'), {{
     }}]
   }},
   options: {{
-    responsive: true, maintainAspectRatio: true, animation: false,
-    plugins: {{legend: {{labels: {{font: TFONT, boxWidth:12}}}}}},
+    responsive: true, maintainAspectRatio: true, animation: false, parsing: false,
+    plugins: PLUGINS,
     scales: {{
       x: xCfg,
       y: {{min:0,max:105,grid:{{color:GRID}},ticks:{{font:TFONT,callback:function(v){{return v+'%';}}}}}}
@@ -366,11 +588,10 @@ new Chart(document.getElementById('cTaux'), {{
 }});
 
 // ── Graphique 4 : Pertes cumulees ──
-new Chart(document.getElementById('cPertes'), {{
+var chPertes = new Chart(document.getElementById('cPertes'), {{
   type: 'line',
   plugins: [nowPlugin],
   data: {{
-    labels: LABELS,
     datasets: [{{
       label: 'Pertes cumulees',
       data: PERTES0,
@@ -379,30 +600,621 @@ new Chart(document.getElementById('cPertes'), {{
     }}]
   }},
   options: {{
-    responsive: true, maintainAspectRatio: true, animation: false,
-    plugins: {{legend: {{labels: {{font: TFONT, boxWidth:12}}}}}},
+    responsive: true, maintainAspectRatio: true, animation: false, parsing: false,
+    plugins: PLUGINS,
     scales: {{
       x: xCfg,
       y: {{grid:{{color:GRID}},ticks:{{font:TFONT,callback:function(v){{return v.toLocaleString('fr-FR')+' EUR';}}}}}}
     }}
   }}
 }});
+
+// ── Chronologie : pages de PAGE_H heures construites a la demande ──
+var PAGE_H = {page_h};
+var PAGES  = Math.max(1, Math.ceil(N / PAGE_H));
+var page   = 0;
+
+function ligne(i, j) {{
+  var taux = S.taux[j], prev = i > NOW;
+  var cls  = taux === 0 ? 'arret' : taux < 1 ? 'degrade' : prev ? 'prev' : '';
+  var badges = S.statuts[j].map(function(c) {{ return '<span class="b b-' + SC[c] + '">' + SC[c] + '</span>'; }}).join(' ');
+  return '<tr' + (cls ? ' class="' + cls + '"' : '') + '>'
+    + '<td>' + LABELS[i] + (prev ? ' <small class="tag-prev">PREVIS.</small>' : '') + '</td>'
+    + '<td>' + fixe(P_SITE[i], 1) + ' mm</td><td>' + fixe(I_SITE[i], 2) + '</td>'
+    + '<td>' + badges + '</td><td>' + pct(S.acc[j]) + '</td><td>' + pct(taux) + '</td>'
+    + '<td class="eur">' + eur(S.perte[j]) + '</td></tr>';
+}}
+
+function afficher(p) {{
+  page = Math.min(Math.max(p, 0), PAGES - 1);
+  var debut = page * PAGE_H, fin = Math.min(N, debut + PAGE_H), j = intervalle(debut), html = [];
+  for (var i = debut; i < fin; i++) {{
+    while (j + 1 < S.debut.length && S.debut[j + 1] <= i) j++;
+    html.push(ligne(i, j));
+  }}
+  document.getElementById('tChrono').innerHTML = html.join('');
+  document.getElementById('pInfo').textContent = N
+    ? LABELS[debut] + ' – ' + LABELS[fin - 1] + ' (page ' + (page + 1) + ' / ' + PAGES + ')' : '';
+  document.getElementById('pPrec').disabled = page === 0;
+  document.getElementById('pSuiv').disabled = page === PAGES - 1;
+}}
+
+document.getElementById('pPrec').onclick = function() {{ afficher(page - 1); }};
+document.getElementById('pSuiv').onclick = function() {{ afficher(page + 1); }};
+document.getElementById('pNow').onclick  = function() {{ afficher(Math.floor(NOW / PAGE_H)); }};
+afficher(0);
+
+// ── Simulation "et si" : hypotheses modifiees -> intervalles du site recalcules ──
+var M = D.simulation;
+if (M) {{
+  var S0   = {{debut: S.debut, acc: S.acc, taux: S.taux, perte: S.perte, statuts: S.statuts}};
+  var OSM  = M.accessibilite === 'osm';
+  var RUN  = {{ca: M.ca, seuil_normal: M.seuil_normal, seuil_arret: M.seuil_arret,
+              seuils_impact: M.seuils_impact, seuils_coupure: M.seuils_coupure}};
+  var KPI0 = ['kPerte', 'kArret', 'kDegradees', 'kAcc'].map(function(id) {{
+    return document.getElementById(id).textContent;
+  }});
+  var PERTE0 = M.perte_totale_eur;
+
+  // Reseau OSM : statuts et accessibilite du run, heure par heure
+  var fixes = OSM ? function(i) {{ var j = intervalle(i, S0); return {{acc: S0.acc[j], statuts: S0.statuts[j]}}; }} : null;
+
+  var champs = [['sCa', 'ca'], ['sNormal', 'seuil_normal'], ['sArret', 'seuil_arret']];
+  document.getElementById('sRoutes').innerHTML = D.routes.map(function(rid, r) {{
+    return '<tr><td>' + rid.replace(/_/g, ' ') + '</td>'
+      + '<td><input id="sImp' + r + '" type="number" step="0.01"' + (OSM ? ' disabled' : '') + '></td>'
+      + '<td><input id="sCoup' + r + '" type="number" step="0.01"' + (OSM ? ' disabled' : '') + '></td></tr>';
+  }}).join('');
+  D.routes.forEach(function(rid, r) {{ champs.push(['sImp' + r, 'seuils_impact', r], ['sCoup' + r, 'seuils_coupure', r]); }});
+  var entrees = champs.map(function(c) {{ return document.getElementById(c[0]); }});
+
+  function remplir(H) {{
+    champs.forEach(function(c, k) {{
+      entrees[k].value = String(c.length > 2 ? H[c[1]][c[2]] : H[c[1]]);
+      entrees[k].classList.remove('invalide');
+    }});
+  }}
+  function lire() {{
+    // Hypotheses saisies, ou null si un champ n'est pas un nombre
+    var H = {{seuils_impact: RUN.seuils_impact.slice(), seuils_coupure: RUN.seuils_coupure.slice()}}, ok = true;
+    champs.forEach(function(c, k) {{
+      var v = entrees[k].value.trim() === '' ? NaN : Number(entrees[k].value);
+      entrees[k].classList.toggle('invalide', !isFinite(v));
+      ok = ok && isFinite(v);
+      if (c.length > 2) H[c[1]][c[2]] = v; else H[c[1]] = v;
+    }});
+    return ok ? H : null;
+  }}
+
+  function redessiner(iv, agg, run) {{
+    S.debut = iv.debut; S.acc = iv.acc; S.taux = iv.taux; S.perte = iv.perte; S.statuts = iv.statuts;
+    chTaux.data.datasets[0].data   = paliers(function(j) {{ return S.taux[j] * 100; }});
+    chPertes.data.datasets[0].data = run ? PERTES0 : pertesCumulees();
+    chRoutes.data.datasets.forEach(function(ds, r) {{
+      ds.data = paliers(function(j) {{ return VAL[S.statuts[j][r]]; }});
+    }});
+    [chTaux, chPertes, chRoutes].forEach(function(c) {{ c.update('none'); }});
+    var kpi = run ? KPI0 : [eur(agg.perte_totale_eur), agg.heures_arret + 'h', agg.heures_degradees + 'h',
+                           pct(agg.accessibilite_min)];
+    ['kPerte', 'kArret', 'kDegradees', 'kAcc'].forEach(function(id, k) {{
+      document.getElementById(id).textContent = kpi[k];
+    }});
+    var delta = agg ? agg.perte_totale_eur - PERTE0 : 0;
+    document.getElementById('sResume').textContent = run ? 'Hypotheses du run' :
+      'Perte simulee ' + eur(agg.perte_totale_eur) + ' (run ' + eur(PERTE0) + ', ecart '
+      + (delta < 0 ? '-' : '+') + eur(Math.abs(delta)) + ')';
+    afficher(page);
+  }}
+
+  function recalculer() {{
+    var H = lire();
+    if (!H) return;
+    var r = simuler(M, H, N, D.meteo.indice, fixes);
+    redessiner(r.intervalles, r.agregats, false);
+  }}
+
+  entrees.forEach(function(e) {{ e.oninput = recalculer; }});
+  document.getElementById('sRun').onclick = function() {{ remplir(RUN); redessiner(S0, null, true); }};
+  remplir(RUN);
+  redessiner(S0, null, true);
+}}
 </script>
 </body>
 </html>"""
 
 
-def main():
-    print("Chargement resultats...")
-    with open("outputs/resultats_latest.json", encoding="utf-8") as f:
-        data = json.load(f)
+# ============================================================
+# DIAGNOSTICS
+# ============================================================
+
+def _rss(e):
+    # Pic RSS du processus a la sortie de l'etape (rss_max_mo avant renommage)
+    return e.get("rss_processus_mo", e.get("rss_max_mo"))
+
+
+def ligne_diagnostic(e, cls=""):
+    return _LIGNE_DIAG.format(
+        cls      = f' class="{cls}"' if cls else "",
+        etape    = e["etape"],
+        mur      = e["mur_s"],
+        cpu      = e["cpu_s"],
+        rss      = "—" if _rss(e) is None else f"{_rss(e):.1f}",
+        elements = "—" if e.get("elements") is None else f"{e['elements']:,}".replace(",", " "),
+    )
+
+
+def ecrire_diagnostics(telemetrie, etapes_rapport, num, out):
+    # Etapes du run (bloc "telemetry") puis celles du rapport deja terminees
+    out.write(_PAGE_DIAGNOSTICS.format(num=num))
+    for e in telemetrie["etapes"]:
+        out.write(ligne_diagnostic(e))
+    for e in etapes_rapport:
+        out.write(ligne_diagnostic(dict(e, etape=f"rapport : {e['etape']}"), "rapport"))
+    rss = _rss(telemetrie)
+    out.write(_PAGE_DIAG_PIED.format(pied=(
+        f"Run : {telemetrie['mur_s']:.3f} s mur, {telemetrie['cpu_s']:.3f} s CPU"
+        + ("" if rss is None else f", pic RSS du processus {rss:.1f} Mo")
+        + f" &middot; Python {telemetrie.get('python', '?')} &middot; {telemetrie.get('plateforme', '?')}")))
+
+
+# ============================================================
+# CHARGE UTILE DES GRAPHIQUES ET DU TABLEAU
+# ============================================================
+
+def lttb(y, budget, garder=()):
+    # Indices retenus par Largest-Triangle-Three-Buckets sur x = 0..n-1 (forme
+    # de la courbe, pics compris), plus les indices imposes de garder
+    # (franchissements de seuil)
+    n = len(y)
+    if n <= budget or budget < 3:
+        return np.arange(n)
+    y     = np.asarray(y, dtype=float)
+    bords = np.linspace(1, n - 1, budget - 1).astype(np.intp)   # budget - 2 seaux
+    a, choisis = 0, [0]
+    for k in range(budget - 2):
+        lo, hi = bords[k], bords[k + 1]
+        nlo, nhi = (bords[k + 1], bords[k + 2]) if k + 2 < len(bords) else (n - 1, n)
+        cx, cy = (nlo + nhi - 1) / 2, y[nlo:nhi].mean()
+        x    = np.arange(lo, hi)
+        aire = np.abs((a - cx) * (y[lo:hi] - y[a]) - (a - x) * (cy - y[a]))
+        a    = lo + int(np.argmax(aire))
+        choisis.append(a)
+    choisis.append(n - 1)
+    return np.union1d(choisis, np.asarray(garder, dtype=np.intp))
+
+
+def _pertes_cumulees(chrono):
+    # round(cumul) heure par heure : cumsum accumule dans l'ordre de sum(),
+    # rint arrondit l'egalite au pair comme round()
+    return np.rint(np.cumsum(chrono.perte_eur)).astype(np.int64).tolist()
+
+
+def charge_utile(data, k=0, points_max=POINTS_MAX):
+    # Donnees partagees par les graphiques et le tableau : temps encodes,
+    # series meteo de la zone, intervalles du site (colonnes et statuts
+    # constants) ; au-dela de points_max heures, series des graphiques
+    # reduites (LTTB, changements d'etat conserves de part et d'autre)
+    chrono0   = data["resultats"][k]["chronologie"]
+    times     = data["meteo"]["times"]
+    n         = len(times)
+    route_ids = list(chrono0.routes) if n else []
+
+    # Heures ou l'une des colonnes du site ou un statut de route change
+    debut = evenements.changements(chrono0.statuts, chrono0.accessibilite, chrono0.taux_activite,
+                                   chrono0.perte_eur)
+    site  = {
+        "debut":   debut.tolist(),
+        "acc":     chrono0.accessibilite[debut].tolist(),
+        "taux":    chrono0.taux_activite[debut].tolist(),
+        "perte":   chrono0.perte_eur[debut].tolist(),
+        "statuts": chrono0.statuts[:, debut].T.tolist(),
+    }
+    precip_zone, indice_zone = data["meteo"]["precipitation"], data["indices_alea"]
+    precip_site = chrono0.precipitation_mm.tolist()
+    indice_site = chrono0.indice_alea.tolist()
+    site["precip"] = None if precip_site == precip_zone else precip_site
+    site["indice"] = None if indice_site == indice_zone else indice_site
+
+    graphiques = None
+    if n > points_max:
+        changes = [d + k for d in site["debut"][1:] for k in (-1, 0)]
+        pertes  = _pertes_cumulees(chrono0)
+        graphiques = {}
+        for nom, serie, garder in (("precip", precip_zone, ()), ("indice", indice_zone, changes),
+                                   ("pertes", pertes, changes)):
+            idx = lttb(serie, points_max, garder).tolist()
+            graphiques[nom] = {"x": idx, "y": [serie[i] for i in idx]}
+
+    return {
+        "temps":         fmt.encoder_temps(times),
+        "now":           data["now_index"],
+        "statuts_codes": list(fmt.STATUTS),
+        "routes":        route_ids,
+        "meteo":         {"precip": precip_zone, "indice": indice_zone},
+        "site":          site,
+        "graphiques":    graphiques,
+        "simulation":    modele_site(data, k, route_ids),
+    }
+
+
+def modele_site(data, k, route_ids):
+    # Modele de la simulation "et si" du site k : bloc "modele" du run
+    # (indices par route, seuils, scores) et routes critiques du site en
+    # lignes de route_ids ; None pour un fichier anterieur sans ce bloc
+    m, s = data.get("modele"), data["resultats"][k]
+    if not m or "routes_critiques" not in s:
+        return None
+    ligne = {rid: r for r, rid in enumerate(route_ids)}
+    return dict(m, ca=s["ca_journalier_eur"], perte_totale_eur=s["perte_totale_eur"],
+                poids=[[ligne.get(rid, -1), p] for rid, p in s["routes_critiques"]])
+
+
+def sparkline(taux, points=SPARK_POINTS, largeur=96, hauteur=20):
+    # SVG du taux d'activite : minimum par seau d'heures (un arret reste visible)
+    if len(taux) == 0:
+        return ""
+    seaux = np.array_split(np.asarray(taux, dtype=float), min(points, len(taux)))
+    v     = [float(s.min()) for s in seaux]
+    pas   = largeur / max(len(v) - 1, 1)
+    # Seuls les sommets utiles : extremites des paliers
+    garde = [k for k in range(len(v)) if k in (0, len(v) - 1) or v[k] != v[k - 1] or v[k] != v[k + 1]]
+    pts   = " ".join(f"{round(k * pas)},{round((1 - v[k]) * (hauteur - 2)) + 1}" for k in garde)
+    coul  = "#dc2626" if min(v) == 0 else "#d97706" if min(v) < 1 else "#059669"
+    return (f'<svg class="spark" width="{largeur}" height="{hauteur}" viewBox="0 0 {largeur} {hauteur}">'
+            f'<polyline fill="none" stroke="{coul}" stroke-width="1.5" points="{pts}"/></svg>')
+
+
+# ============================================================
+# PARITE DE LA SIMULATION (NOYAU JS <-> PYTHON)
+# ============================================================
+
+_PARITE_NODE = """
+var entree = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+process.stdout.write(JSON.stringify(entree.map(function(c) {{
+  var S = c.site, fixes = null;
+  if (c.modele.accessibilite === 'osm') fixes = function(i) {{
+    var j = 0;
+    while (j + 1 < S.debut.length && S.debut[j + 1] <= i) j++;
+    return {{acc: S.acc[j], statuts: S.statuts[j]}};
+  }};
+  return simuler(c.modele, c.hypotheses, c.n, c.zone, fixes);
+}})));
+"""
+
+
+def _reference(m, h, n, site, zone):
+    # Chaine scalaire de twice_run (statut_route ; accessibilite /
+    # taux_activite via engine.combinaison), meme sortie que simuler() en JS.
+    # site : intervalles du run (statuts et accessibilite du reseau OSM)
+    import twice_engine as engine
+    import twice_run
+
+    series = [zone if s.get("zone") else [v / s["echelle"] for v in s["valeurs"]] for s in m["indices"]]
+    idx    = [series[k] for k in m["serie_route"]]
+    code   = {st: c for c, st in enumerate(fmt.STATUTS)}
+    poids  = [p for _, p in m["poids"]]
+    iv     = {"debut": [], "acc": [], "taux": [], "perte": [], "statuts": []}
+    heures = {"normales": 0, "degradees": 0, "arret": 0}
+    cumul, acc_min, prec, j = 0.0, float("inf"), None, 0
+    for i in range(n):
+        if m["accessibilite"] == "osm":
+            while j + 1 < len(site["debut"]) and site["debut"][j + 1] <= i:
+                j += 1
+            codes, acc  = site["statuts"][j], site["acc"][j]
+            taux, perte = engine.activite(acc, h["ca"], h["seuil_normal"], h["seuil_arret"])
+        else:
+            codes = [code[twice_run.statut_route(si, sc, x[i])]
+                     for si, sc, x in zip(h["seuils_impact"], h["seuils_coupure"], idx)]
+            acc, taux, perte = engine.combinaison(poids, m["scores"], [0 if r < 0 else codes[r] for r, _ in m["poids"]],
+                                                  h["ca"], h["seuil_normal"], h["seuil_arret"])
+        cumul  += perte
+        acc_min = min(acc_min, acc)
+        heures["normales" if taux == 1.0 else "arret" if taux == 0.0 else "degradees"] += 1
+        cle = (acc, taux, perte, tuple(codes))
+        if cle != prec:
+            for c, v in zip(iv, (i, acc, taux, perte, list(codes))):
+                iv[c].append(v)
+            prec = cle
+    return {"intervalles": iv, "agregats": {
+        "perte_totale_eur":  round(cumul, 2),
+        "heures_normales":   heures["normales"],
+        "heures_degradees":  heures["degradees"],
+        "heures_arret":      heures["arret"],
+        "accessibilite_min": acc_min,
+    }}
+
+
+def _hypotheses_tirees(m, rng):
+    # Hypotheses perturbees : valeurs "saisies" (2 decimales) ou quelconques
+    saisie = rng.random() < 0.5
+
+    def tirer(a, b):
+        v = rng.uniform(a, b)
+        return round(v, 2) if saisie else v
+
+    ca = m["ca"] * rng.uniform(0.0, 3.0)
+    sa = tirer(0.0, 0.9)
+    return {
+        "ca":             round(ca) if saisie else ca,
+        "seuil_arret":    sa,
+        "seuil_normal":   tirer(sa, 1.0),
+        "seuils_impact":  [tirer(0.0, 0.8) for _ in m["seuils_impact"]],
+        "seuils_coupure": [tirer(0.3, 1.2) for _ in m["seuils_coupure"]],
+    }
+
+
+def verifier_simulation(data, cas=20, graine=0):
+    # Parite de la simulation "et si" : noyau JS des pages (execute par node)
+    # contre la chaine scalaire Python, pour chaque site, sur les hypotheses
+    # du run (qui doivent redonner ses intervalles et agregats) puis sur cas
+    # tirages perturbes. Renvoie le nombre d'ecarts.
+    import random
+    import shutil
+    import subprocess
+
+    node = shutil.which("node")
+    if node is None:
+        raise RuntimeError("parite de la simulation : node (Node.js) introuvable")
+    rng = random.Random(graine)
+    entrees, attendus = [], []
+    for k, s in enumerate(data["resultats"]):
+        charge = charge_utile(data, k, points_max=float("inf"))
+        m, iv  = charge["simulation"], charge["site"]
+        zone   = charge["meteo"]["indice"]
+        if m is None:
+            raise ValueError("parite de la simulation : resultats sans bloc \"modele\" (run anterieur)")
+        n   = len(s["chronologie"])
+        run = {c: m[c] for c in ("ca", "seuil_normal", "seuil_arret", "seuils_impact", "seuils_coupure")}
+        attendus.append((s["site_id"], "run", {
+            "intervalles": {c: iv[c] for c in ("debut", "acc", "taux", "perte", "statuts")},
+            "agregats":    {c: s[c] for c in ("perte_totale_eur", "heures_normales", "heures_degradees",
+                                               "heures_arret", "accessibilite_min")},
+        }))
+        entrees.append({"modele": m, "hypotheses": run, "n": n, "site": iv, "zone": zone})
+        for c in range(cas):
+            h = _hypotheses_tirees(m, rng)
+            attendus.append((s["site_id"], f"tirage {c}", _reference(m, h, n, iv, zone)))
+            entrees.append({"modele": m, "hypotheses": h, "n": n, "site": iv, "zone": zone})
+
+    js = subprocess.run([node, "-e", _NOYAU_SIMULATION.format() + _PARITE_NODE.format()],
+                        input=json.dumps(entrees), capture_output=True, text=True, check=True)
+    ecarts = 0
+    for (site_id, nom, attendu), obtenu in zip(attendus, json.loads(js.stdout)):
+        if obtenu != attendu:
+            ecarts += 1
+            champ = "agregats" if obtenu["agregats"] != attendu["agregats"] else "intervalles"
+            print(f"  [{site_id}] {nom} : {champ} differents\n    JS     {str(obtenu[champ])[:160]}\n"
+                  f"    Python {str(attendu[champ])[:160]}")
+    print(f"Parite simulation : {len(attendus) - ecarts}/{len(attendus)} cas identiques "
+          f"({len(data['resultats'])} site(s), hypotheses du run + {cas} tirage(s) par site)")
+    return ecarts
+
+
+# ============================================================
+# ECRITURE EN FLUX
+# ============================================================
+
+def _texte(v):
+    # Texte venu du portefeuille (nom, type) : echappe pour le HTML
+    return html.escape(str(v))
+
+
+def _debut_page(data, out):
+    out.write(_PAGE_DEBUT.format(gen_at=data["generated_at"][:16].replace("T", " ")))
+
+
+def _hypotheses(data, num, out):
+    out.write(_PAGE_HYPOTHESES.format(num=num))
+    for k, v in data["hypotheses"].items():
+        out.write(f"<tr><td><b>{k}</b></td><td>{v}</td></tr>")
+    out.write(_PAGE_FIN_SECTION.format())
+
+
+def ecrire_site(data, site, out):
+    # Page de detail d'un site. Graphiques et tableau (pagine) construits par
+    # le navigateur a partir d'une seule charge utile. Son poids croit
+    # lineairement avec l'horizon : les series meteo horaires de la zone
+    # (pluie, indice ; ~9 o/heure) servent au tableau heure par heure. Les
+    # intervalles du site croissent avec les changements d'etat, et les
+    # series des graphiques sont plafonnees a POINTS_MAX points.
+    s   = data["resultats"][site]
+    nom = _texte(s["site_nom"])
+    _debut_page(data, out)
+    out.write(_PAGE_SYNTHESE.format(nom=nom))
+    out.write(_CARTE.format(
+        nom       = nom,
+        type      = _texte(s["type"]),
+        perte     = fmt_eur(s["perte_totale_eur"]),
+        arret     = s["heures_arret"],
+        degradees = s["heures_degradees"],
+        acc_min   = s["accessibilite_min"],
+    ))
+    charge = charge_utile(data, site)
+    out.write(_PAGE_TABLEAU.format(nom=nom, simulation=_SIMULATION.format() if charge["simulation"] else ""))
+    _hypotheses(data, "04", out)
+    out.write(_PAGE_PIED.format())
+    out.write(_PAGE_SCRIPT.format())
+    out.write(_NOYAU_SIMULATION.format())
+    out.write(_PAGE_DONNEES.format())
+    out.write(json.dumps(charge, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/"))
+    out.write(_PAGE_FIN.format(page_h=PAGE_H))
+
+
+def ecrire_index(data, out, etapes_rapport=()):
+    # Page portefeuille : un site par ligne (tri cote navigateur), par perte
+    # decroissante ; section diagnostics si le fichier porte un bloc "telemetry"
+    resultats = data["resultats"]
+    ordre     = sorted(range(len(resultats)), key=lambda k: -resultats[k]["perte_totale_eur"])
+    total     = sum(s["perte_totale_eur"] for s in resultats)
+    arrets    = sum(1 for s in resultats if s["heures_arret"] > 0)
+    _debut_page(data, out)
+    out.write(_PAGE_INDEX.format(resume=(
+        f"{len(resultats)} site(s) &middot; perte totale {fmt_eur(total)} &middot; "
+        f"{arrets} site(s) a l'arret au moins une heure &middot; {len(data['meteo']['times'])} h")))
+    for k in ordre:
+        s = resultats[k]
+        out.write(_LIGNE_SITE.format(
+            nom       = _texte(s["site_nom"]),
+            lien      = f"sites/{fichier_site(s['site_id'])}",
+            type      = _texte(s["type"]),
+            perte_v   = s["perte_totale_eur"],
+            perte     = fmt_eur(s["perte_totale_eur"]),
+            arret     = s["heures_arret"],
+            degradees = s["heures_degradees"],
+            acc_min   = s["accessibilite_min"],
+            spark     = sparkline(s["chronologie"].taux_activite),
+        ))
+    out.write(_PAGE_INDEX_FIN.format())
+    _hypotheses(data, "02", out)
+    if data.get("telemetry"):
+        ecrire_diagnostics(data["telemetry"], etapes_rapport, "03", out)
+    out.write(_PAGE_PIED.format())
+    out.write(_SCRIPT_INDEX.format())
+
+
+def generate(data, site=None):
+    # Page portefeuille (site None) ou page de detail du site d'indice site, en
+    # memoire (banc de performance, tests) ; rendre() ecrit en flux
+    buf = io.StringIO()
+    if site is None:
+        ecrire_index(data, buf)
+    else:
+        ecrire_site(data, site, buf)
+    return buf.getvalue()
+
+
+# ============================================================
+# RENDU DES PAGES (PARALLELE, ECRITURE SI CHANGEMENT)
+# ============================================================
+
+def fichier_site(site_id):
+    return re.sub(r"[^\w.-]", "_", str(site_id)) + ".html"
+
+
+class Tee:
+    # Duplique chaque ecriture vers plusieurs fichiers et tient l'empreinte du
+    # texte hors horodatage. L'horodatage est ecrit d'un bloc (_debut_page) :
+    # le retirer section par section equivaut a le retirer de la page entiere.
+    def __init__(self, *flux):
+        self.flux = flux
+        self.hash = hashlib.sha256()
+
+    def write(self, texte):
+        self.hash.update(_HORODATAGE.sub("", texte).encode("utf-8"))
+        for f in self.flux:
+            f.write(texte)
+
+
+def empreinte(chemin):
+    # Empreinte d'une page existante hors horodatage (lue ligne a ligne)
+    h = hashlib.sha256()
+    with open(chemin, encoding="utf-8") as f:
+        for ligne in f:
+            h.update(_HORODATAGE.sub("", ligne).encode("utf-8"))
+    return h.hexdigest()
+
+
+def ecrire_si_change(chemins, ecrire):
+    # Ecrit la page en flux (ecrire(out), section par section) dans un fichier
+    # temporaire par chemin, puis ne remplace que les chemins dont le contenu
+    # hors horodatage a change. Renvoie le nombre de fichiers ecrits.
+    tmps = [f"{c}.{os.getpid()}.tmp" for c in chemins]
+    flux = []
+    try:
+        for c, t in zip(chemins, tmps):
+            os.makedirs(os.path.dirname(c) or ".", exist_ok=True)
+            flux.append(open(t, "w", encoding="utf-8"))
+        tee = Tee(*flux)
+        ecrire(tee)
+    except BaseException:
+        for f, t in zip(flux, tmps):
+            f.close()
+            os.remove(t)
+        raise
+    for f in flux:
+        f.close()
+
+    nouvelle, ecrits = tee.hash.hexdigest(), 0
+    for c, t in zip(chemins, tmps):
+        try:
+            inchangee = empreinte(c) == nouvelle
+        except OSError:
+            inchangee = False
+        if inchangee:
+            os.remove(t)
+        else:
+            os.replace(t, c)
+            ecrits += 1
+    return ecrits
+
+
+def _rendre_site(tache):
+    # Tache du pool : (donnees reduites au site, dossiers) -> pages ecrites
+    data, dossiers = tache
+    nom = fichier_site(data["resultats"][0]["site_id"])
+    return ecrire_si_change([os.path.join(d, "sites", nom) for d in dossiers],
+                            lambda out: ecrire_site(data, 0, out))
+
+
+def rendre(data, dossiers=DOSSIERS, workers=None, etapes_rapport=()):
+    # Index + une page par site dans chaque dossier ; pages de site reparties
+    # sur un pool de processus au-dela de SITES_SEQUENTIEL sites. Les pages
+    # de sites disparus sont supprimees. Renvoie (pages ecrites, pages).
+    ecrits = ecrire_si_change([os.path.join(d, "rapport.html") for d in dossiers],
+                              lambda out: ecrire_index(data, out, etapes_rapport))
+
+    commun = {k: v for k, v in data.items() if k not in ("resultats", "telemetry")}
+    taches = [(dict(commun, resultats=[s]), dossiers) for s in data["resultats"]]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(taches) > SITES_SEQUENTIEL:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(workers) as pool:
+            ecrits += sum(pool.map(_rendre_site, taches, chunksize=max(1, len(taches) // (4 * workers))))
+    else:
+        ecrits += sum(map(_rendre_site, taches))
+
+    attendus = {fichier_site(s["site_id"]) for s in data["resultats"]}
+    for d in dossiers:
+        rep = os.path.join(d, "sites")
+        for nom in os.listdir(rep) if os.path.isdir(rep) else ():
+            if nom.endswith(".html") and nom not in attendus:
+                os.remove(os.path.join(rep, nom))
+    return ecrits, len(dossiers) * (1 + len(taches))
+
+
+def arguments(ap):
+    # Options du rendu (aussi celles de twice.py report / all)
+    ap.add_argument("--workers", type=int, default=None,
+                    help="processus de rendu des pages de site (defaut : nombre de coeurs)")
+    return ap
+
+
+def publier(data, workers=None):
+    # Rendu des pages dans DOSSIERS ; les etapes deja mesurees (lecture ou
+    # passage en memoire) figurent dans les diagnostics de l'index
     print("Generation rapport HTML...")
-    html = generate(data)
-    import os
-    os.makedirs("docs", exist_ok=True)
-    Path("outputs/rapport.html").write_text(html, encoding="utf-8")
-    Path("docs/rapport.html").write_text(html, encoding="utf-8")
-    print("Rapport genere : outputs/rapport.html + docs/rapport.html")
+    with tel.span("rendu") as sp:
+        ecrits, pages = rendre(data, DOSSIERS, workers, tel.etapes())
+        sp.compter(pages)
+    tel.afficher(tel.etapes())
+    print(f"Rapport genere : {ecrits}/{pages} page(s) ecrite(s) (inchangees sinon) "
+          f"dans {' + '.join(DOSSIERS)} : rapport.html, sites/")
+
+
+def main(argv=None):
+    ap = arguments(argparse.ArgumentParser(description="TWICE — rapport HTML (portefeuille + une page par site)"))
+    ap.add_argument("--parite", metavar="TIRAGES", type=int, nargs="?", const=20,
+                    help="au lieu du rendu : verifier que la simulation des pages (node) reproduit "
+                         "la chaine Python, sur les hypotheses du run et TIRAGES perturbations par site")
+    a  = ap.parse_args(argv)
+    tel.demarrer()
+    print("Chargement resultats...")
+    with tel.span("lecture") as sp:
+        data = fmt.charger("outputs/resultats_latest.json")
+        sp.compter(len(data["meteo"]["times"]) * len(data["resultats"]))
+    if a.parite is not None:
+        raise SystemExit(1 if verifier_simulation(data, a.parite) else 0)
+    publier(data, a.workers)
 
 
 if __name__ == "__main__":
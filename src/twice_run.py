@@ -3,10 +3,25 @@ TWICE — Digital Twin Bettembourg
 Chaine causale : pluie -> route -> accessibilite -> pertes
 """
 
+import argparse
+import hashlib
 import json
-import requests
 from datetime import datetime, timezone
 
+import numpy as np
+
+import twice_archive as archive
+import twice_cache as cache
+import twice_engine as engine
+import twice_evenements as evenements
+import twice_format as fmt
+import twice_graphe as graphe
+import twice_incremental as incr
+import twice_meteo as meteo
+import twice_portefeuille as ptf
+import twice_spatial as spatial
+import twice_telemetrie as tel
+
 # ============================================================
 # HYPOTHESES (modifiables ici)
 # ============================================================
@@ -20,6 +35,27 @@ FORECAST_DAYS       = 7
 # ============================================================
 # CONFIGURATION
 # ============================================================
+# Point meteo par defaut ; chaque site / route peut porter ses propres
+# "lat" / "lon", et une route sa "geometrie" [[lat, lon], ...] (alea
+# agrege sur les mailles de prevision traversees, cf. twice_spatial)
+ZONE = {"lat": 49.525, "lon": 6.110}
+
+# Extrait OpenStreetMap local (.osm, .osm.bz2) : accessibilite par temps de
+# parcours portes <-> echangeurs. None = moyenne ponderee des routes_critiques.
+RESEAU_OSM = None
+
+# Portefeuille de sites externe (.csv, .json, cf. twice_portefeuille) ;
+# None = liste SITES ci-dessous.
+PORTEFEUILLE = None
+
+# CA journaliers imposes par site (id -> EUR), ex. entrees du workflow
+# (--ca eurohub_sud=500000) ; prioritaires sur ceux du portefeuille.
+CA = {}
+
+SORTIE     = "outputs/resultats_latest.json"
+SORTIE_NPZ = "outputs/resultats_latest.npz"
+ARCHIVE    = archive.CHEMIN     # archive SQLite des runs (None = pas d'archive)
+
 SITES = [
     {
         "id": "eurohub_sud",
@@ -46,39 +82,51 @@ SITES = [
 ]
 
 RESEAU_ROUTIER = [
-    {"id": "A3_bettembourg",  "nom": "A3 Bettembourg",            "type": "motorway",  "seuil_impact": 0.50, "seuil_coupure": 1.00},
-    {"id": "N31_bettembourg", "nom": "N31 Bettembourg-Dudelange", "type": "primary",   "seuil_impact": 0.42, "seuil_coupure": 0.83},
+    {"id": "A3_bettembourg",  "nom": "A3 Bettembourg",            "type": "motorway",  "seuil_impact": 0.50, "seuil_coupure": 1.00, "osm": {"ref": "A3"}},
+    {"id": "N31_bettembourg", "nom": "N31 Bettembourg-Dudelange", "type": "primary",   "seuil_impact": 0.42, "seuil_coupure": 0.83, "osm": {"ref": "N31"}},
     {"id": "voirie_interne",  "nom": "Voirie interne terminal",   "type": "secondary", "seuil_impact": 0.33, "seuil_coupure": 0.67},
     {"id": "route_wolser",    "nom": "Route zone Wolser",         "type": "secondary", "seuil_impact": 0.33, "seuil_coupure": 0.67},
 ]
 
 STATUT_VERS_SCORE = {"normal": 1.0, "impacte": 0.5, "coupe": 0.0}
 
+# Reseau OSM : multiplicateur de vitesse des troncons selon le statut de la route
+STATUT_VERS_VITESSE = {"normal": 1.0, "impacte": 0.5, "coupe": 0.0}
+
 
 # ============================================================
 # FONCTIONS
 # ============================================================
 
+def coordonnees(entree):
+    return (entree.get("lat", ZONE["lat"]), entree.get("lon", ZONE["lon"]))
+
+
+def portefeuille():
+    # Sites actifs en colonnes : fichier PORTEFEUILLE (instantane en cache) ou SITES
+    pf = ptf.charger(PORTEFEUILLE) if PORTEFEUILLE else ptf.depuis_sites(SITES)
+    rang = {sid: k for k, sid in enumerate(pf.ids)}
+    for sid, ca in CA.items():
+        if sid not in rang:
+            raise ValueError(f"--ca : site {sid!r} absent du portefeuille")
+        pf.ca_journalier[rang[sid]] = ca
+    return pf
+
+
 def fetch_meteo():
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude":      49.525,
-        "longitude":     6.110,
-        "hourly":        "precipitation",
-        "past_days":     PAST_DAYS,
-        "forecast_days": FORECAST_DAYS,
-        "timezone":      "Europe/Luxembourg",
-    }
-    r = requests.get(url, params=params, timeout=15)
-    r.raise_for_status()
-    data = r.json()
-    times  = data["hourly"]["time"]
-    precip = data["hourly"]["precipitation"]
+    zone = coordonnees(ZONE)
+    times, series, now_index = fetch_meteo_points([zone])
+    return times, series[zone], now_index
+
 
-    now_str   = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:00")
-    now_index = max(i for i, t in enumerate(times) if t <= now_str)
+def fetch_meteo_points(points):
+    times, series = meteo.fetch_points(points, PAST_DAYS, FORECAST_DAYS)
+    return times, series, index_maintenant(times)
 
-    return times, precip, now_index
+
+def index_maintenant(times):
+    now_str = cache.maintenant().strftime("%Y-%m-%dT%H:00")
+    return max(i for i, t in enumerate(times) if t <= now_str)
 
 
 def indice_alea(precip):
@@ -112,78 +160,359 @@ def taux_activite(acc):
     return round((acc - SEUIL_ARRET) / (SEUIL_NORMAL - SEUIL_ARRET), 3)
 
 
-def run():
-    print("=== TWICE démarrage ===")
-    times, precip, now_index = fetch_meteo()
-    print(f"  {len(times)} heures, now_index={now_index} ({times[now_index]})")
+def config_hash():
+    brut = json.dumps({
+        "hypotheses": [SEUIL_MAX_MM, FENETRE_GLISSANTE_H, SEUIL_NORMAL, SEUIL_ARRET, PAST_DAYS, FORECAST_DAYS],
+        "zone":       ZONE,
+        "sites":      ptf.cle(PORTEFEUILLE) if PORTEFEUILLE else SITES,
+        "reseau":     RESEAU_ROUTIER,
+        "scores":     STATUT_VERS_SCORE,
+        "osm":        RESEAU_OSM,
+        "vitesses":   STATUT_VERS_VITESSE,
+        **({"ca": CA} if CA else {}),
+    }, sort_keys=True)
+    return hashlib.sha256(brut.encode("utf-8")).hexdigest()[:16]
 
-    indices = indice_alea(precip)
 
-    resultats = []
-    for site in SITES:
-        chrono = []
-        for i, idx in enumerate(indices):
-            statuts = {
-                r["id"]: statut_route(r["seuil_impact"], r["seuil_coupure"], idx)
-                for r in RESEAU_ROUTIER
-            }
-            acc   = accessibilite(site, statuts)
-            taux  = taux_activite(acc)
-            perte = round((site["ca_journalier"] / 24.0) * (1.0 - taux), 2)
-            chrono.append({
-                "time":            times[i],
-                "is_forecast":     i > now_index,
-                "precipitation_mm": float(precip[i] or 0),
-                "indice_alea":     indices[i],
-                "accessibilite":   acc,
-                "taux_activite":   taux,
-                "perte_eur":       perte,
-                "statuts_routes":  statuts,
-            })
+def hypotheses():
+    h = {
+        "H1": f"Indice = cumul {FENETRE_GLISSANTE_H}h glissantes / {SEUIL_MAX_MM}mm",
+        "H2": "Route impactee si indice >= seuil_impact, coupee si >= seuil_coupure",
+        "H3": f"Activite pleine si accessibilite >= {SEUIL_NORMAL}, arret si <= {SEUIL_ARRET}",
+        "H4": "CA journalier reparti uniformement sur 24h",
+        "H5": "CA journalier = parametre fictif a calibrer",
+        "H6": f"Fenetre = {PAST_DAYS}j historiques + {FORECAST_DAYS}j previsions",
+    }
+    if RESEAU_OSM:
+        h["H7"] = "Accessibilite = temps libre / temps actuel, portes <-> echangeurs (OSM)"
+    return h
+
+
+def index_spatial():
+    return spatial.indexer([r.get("geometrie") for r in RESEAU_ROUTIER])
+
+
+def points_meteo(pf):
+    # Points distincts : zone, sites et routes localises, puis mailles
+    # traversees par les geometries de routes
+    return list(dict.fromkeys([coordonnees(ZONE)] + pf.coordonnees(coordonnees(ZONE))
+                              + [coordonnees(r) for r in RESEAU_ROUTIER] + spatial.centres(index_spatial())))
+
+
+def entrees_meteo(pf, source=None):
+    # Une serie par point de points_meteo. source : points ->
+    # (times, series, now_index), fetch_meteo_points par defaut
+    points = points_meteo(pf)
+    times, series, now_index = (source or fetch_meteo_points)(points)
+    print(f"  {len(times)} heures, {len(points)} point(s), now_index={now_index} ({times[now_index]})")
+    rang   = {p: k for k, p in enumerate(points)}
+    precip = engine.en_tableau([series[p] for p in points])
+    return times, now_index, points, rang, precip
+
+
+def point_routes(rang):
+    return spatial.Projection(index_spatial(), rang, [coordonnees(r) for r in RESEAU_ROUTIER])
+
+
+def graphe_osm():
+    # Graphe de l'extrait RESEAU_OSM, ou None (routes_critiques)
+    if not RESEAU_OSM:
+        return None
+    g = graphe.charger(RESEAU_OSM, RESEAU_ROUTIER)
+    print(f"  reseau OSM : {len(g.coords)} noeuds, {len(g.libre)} troncons, {len(g.jonctions)} echangeur(s)")
+    return g
+
+
+def acces_osm(pf, g=None):
+    # Evaluateur d'accessibilite sur le graphe OSM, ou None (routes_critiques).
+    # g : graphe deja charge (evaluation par lots de sites)
+    g = graphe_osm() if g is None else g
+    if g is None:
+        return None
+    # Porte d'un site : "porte" {"lat", "lon"} si renseignee, sinon le site
+    return graphe.Accessibilite(g, pf.portes(coordonnees(ZONE)), STATUT_VERS_VITESSE)
+
+
+def parametres(rang, pf):
+    return {
+        "fenetre":      FENETRE_GLISSANTE_H,
+        "seuil_max":    SEUIL_MAX_MM,
+        "seuil_normal": SEUIL_NORMAL,
+        "seuil_arret":  SEUIL_ARRET,
+        "point_routes": point_routes(rang),
+        "acces":        acces_osm(pf),
+    }
+
+
+def chronologie(modele, precip, params):
+    # Chaine complete, une etape mesuree par maillon
+    with tel.span("alea") as sp:
+        indices = engine.indice_alea(precip, params["fenetre"], params["seuil_max"])
+        sp.compter(indices.size)
+    with tel.span("statuts") as sp:
+        codes = engine.statuts_routes(engine.indices_routes(indices, params["point_routes"]),
+                                      modele.seuils_impact, modele.seuils_coupure)
+        sp.compter(codes.size)
+    with tel.span("accessibilite") as sp:
+        chrono = evenements.evaluer_statuts(modele, codes, params["seuil_normal"], params["seuil_arret"],
+                                            params["acces"], indices)
+        sp.compter(len(chrono.debuts))
+    return chrono
+
 
+def _nombre(v):
+    # Valeurs entieres ecrites sans decimale, comme saisies dans SITES
+    return int(v) if v.is_integer() else v
+
+
+def routes_critiques(pf, k):
+    # [[route_id, poids], ...] du site k, dans l'ordre de sommation
+    d, f = pf.indptr[k], pf.indptr[k + 1]
+    return [[pf.route_ids[c], _nombre(p)] for c, p in zip(pf.colonnes[d:f].tolist(), pf.poids[d:f].tolist())]
+
+
+def modele_simulation(modele, chrono, params):
+    # Ce qu'il faut au rapport pour refaire statuts -> accessibilite -> pertes
+    # dans le navigateur (simulation "et si") : indice d'alea de chaque route,
+    # series distinctes une seule fois ({"zone": true} si c'est celle du
+    # point ZONE, deja ecrite), en milliemes entiers quand elles sont
+    # arrondies a 3 decimales (k / 1000 redonne le meme flottant), seuils et
+    # scores. Avec un reseau OSM l'accessibilite ne se recalcule pas hors du
+    # graphe : seuls CA et seuils d'activite restent modifiables.
+    n       = chrono.n
+    idx     = np.broadcast_to(engine.indices_routes(chrono.indices, params["point_routes"]),
+                              (len(modele.route_ids), n))
+    series, serie_route, vus = [], [], {}
+    for ligne in idx:
+        cle = ligne.tobytes()
+        if cle not in vus:
+            vus[cle] = len(series)
+            milliemes = np.rint(ligne * 1000)
+            if np.array_equal(ligne, chrono.indices.reshape(-1, n)[0]):
+                series.append({"zone": True})
+            elif np.array_equal(milliemes / 1000, ligne):
+                series.append({"echelle": 1000, "valeurs": milliemes.astype(np.int64).tolist()})
+            else:
+                series.append({"echelle": 1, "valeurs": ligne.tolist()})
+        serie_route.append(vus[cle])
+    return {
+        "seuil_normal":   params["seuil_normal"],
+        "seuil_arret":    params["seuil_arret"],
+        "scores":         modele.scores.tolist(),
+        "seuils_impact":  modele.seuils_impact.tolist(),
+        "seuils_coupure": modele.seuils_coupure.tolist(),
+        "indices":        series,
+        "serie_route":    serie_route,
+        "accessibilite":  "osm" if params["acces"] is not None else "routes_critiques",
+    }
+
+
+def construire_rapport(pf, modele, chrono, times, now_index, points, precip, points_sites, agg=None,
+                       params=None):
+    # params (parametres) : ajoute le bloc "modele" de la simulation du rapport
+    agg       = chrono.agreger() if agg is None else agg
+    indices   = chrono.indices.tolist()
+    precip_mm = precip.tolist()
+    ca        = [_nombre(v) for v in pf.ca_journalier.tolist()]
+
+    resultats = []
+    for k in range(len(pf)):
         resultats.append({
-            "site_id":           site["id"],
-            "site_nom":          site["nom"],
-            "type":              site["type"],
-            "ca_journalier_eur": site["ca_journalier"],
-            "perte_totale_eur":  round(sum(h["perte_eur"] for h in chrono), 2),
-            "heures_normales":   sum(1 for h in chrono if h["taux_activite"] == 1.0),
-            "heures_degradees":  sum(1 for h in chrono if 0 < h["taux_activite"] < 1.0),
-            "heures_arret":      sum(1 for h in chrono if h["taux_activite"] == 0.0),
-            "accessibilite_min": min(h["accessibilite"] for h in chrono),
-            "chronologie":       chrono,
+            "site_id":           pf.ids[k],
+            "site_nom":          pf.noms[k],
+            "type":              pf.types[k],
+            "ca_journalier_eur": ca[k],
+            "perte_totale_eur":  float(agg["perte_totale_eur"][k]),
+            "heures_normales":   int(agg["heures_normales"][k]),
+            "heures_degradees":  int(agg["heures_degradees"][k]),
+            "heures_arret":      int(agg["heures_arret"][k]),
+            "accessibilite_min": float(agg["accessibilite_min"][k]),
+            "point":             points_sites[k],
+            "routes_critiques":  routes_critiques(pf, k),
+            "intervalles":       chrono.site(k),
         })
-        print(f"  [{site['nom']}] perte={resultats[-1]['perte_totale_eur']:,.0f}€  arret={resultats[-1]['heures_arret']}h")
 
     rapport = {
-        "projet":       "TWICE",
-        "zone":         "Bettembourg, Luxembourg",
-        "generated_at": datetime.now(timezone.utc).isoformat(),
-        "now_index":    now_index,
-        "hypotheses": {
-            "H1": f"Indice = cumul {FENETRE_GLISSANTE_H}h glissantes / {SEUIL_MAX_MM}mm",
-            "H2": "Route impactee si indice >= seuil_impact, coupee si >= seuil_coupure",
-            "H3": f"Activite pleine si accessibilite >= {SEUIL_NORMAL}, arret si <= {SEUIL_ARRET}",
-            "H4": "CA journalier reparti uniformement sur 24h",
-            "H5": "CA journalier = parametre fictif a calibrer",
-            "H6": f"Fenetre = {PAST_DAYS}j historiques + {FORECAST_DAYS}j previsions",
-        },
+        "format":        fmt.FORMAT,
+        "version":       fmt.VERSION,
+        "projet":        "TWICE",
+        "zone":          "Bettembourg, Luxembourg",
+        "generated_at":  datetime.now(timezone.utc).isoformat(),
+        "now_index":     now_index,
+        "config_hash":   config_hash(),
+        "hypotheses":    hypotheses(),
+        "temps":         fmt.encoder_temps(times),
         "meteo": {
-            "times":         times,
-            "precipitation": [float(p or 0) for p in precip],
-            "now_index":     now_index,
+            "points": [
+                {"lat": lat, "lon": lon, "precipitation": precip_mm[k], "indice_alea": indices[k]}
+                for k, (lat, lon) in enumerate(points)
+            ],
         },
-        "indices_alea": indices,
-        "resultats":    resultats,
+        "routes":        modele.route_ids,
+        "statuts_codes": list(engine.STATUTS),
+        "statuts":       chrono.intervalles_statuts(),
+        "resultats":     resultats,
     }
+    if params is not None:
+        rapport["modele"] = modele_simulation(modele, chrono, params)
+    return rapport
+
+
+def archiver(rapport):
+    # Ajout du run a l'archive, puis politique de retention
+    with tel.span("archive", len(rapport["resultats"])):
+        con = archive.ouvrir(ARCHIVE)
+        try:
+            run_id    = archive.ajouter(con, rapport)
+            supprimes = archive.compacter(con)
+        finally:
+            con.close()
+    print(f"  Archive : {ARCHIVE} (run #{run_id}" + (f", {supprimes} run(s) hors retention supprime(s))"
+                                                    if supprimes else ")"))
+
+
+def run(incremental=False, npz=False):
+    print("=== TWICE démarrage ===")
+    tel.demarrer()
+    with tel.span("portefeuille") as sp:
+        pf     = portefeuille()
+        modele = engine.compiler(pf, RESEAU_ROUTIER, STATUT_VERS_SCORE)
+        sp.compter(len(pf))
+    with tel.span("fetch") as sp:
+        times, now_index, points, rang, precip = entrees_meteo(pf)
+        sp.compter(precip.size)
+
+    with tel.span("reseau") as sp:
+        params = parametres(rang, pf)
+        sp.compter(len(RESEAU_ROUTIER))
+
+    sim = None
+    if incremental:
+        with tel.span("incremental") as sp:
+            sim = incr.recalculer(SORTIE, config_hash(), hypotheses(), times, precip, modele, params)
+            sp.compter(0 if sim is None else sim["statuts"].size)
+    if sim is None:
+        chrono = chronologie(modele, precip, params)
+    else:
+        chrono = evenements.depuis_heures(sim)
+    print(f"  {len(chrono.debuts)} intervalle(s) d'etat du reseau sur {chrono.n} heures")
+    if params["acces"] is not None:
+        print(f"  reseau OSM : {len(params['acces'].memo)} etat(s), {params['acces'].dijkstras} arbre(s) calcule(s)")
+
+    with tel.span("agregation", len(pf)):
+        agg = chrono.agreger()
+    with tel.span("assemblage", len(pf)):
+        rapport = construire_rapport(pf, modele, chrono, times, now_index, points, precip,
+                                     [rang[c] for c in pf.coordonnees(coordonnees(ZONE))], agg, params)
+    for r in rapport["resultats"]:
+        print(f"  [{r['site_nom']}] perte={r['perte_totale_eur']:,.0f}€  arret={r['heures_arret']}h")
 
     import os
     os.makedirs("outputs", exist_ok=True)
-    with open("outputs/resultats_latest.json", "w", encoding="utf-8") as f:
-        json.dump(rapport, f, ensure_ascii=False, indent=2)
-    print("  Sauvegarde : outputs/resultats_latest.json")
+    with tel.span("serialisation") as sp:
+        fmt.ecrire_json(rapport, SORTIE)
+        sp.compter(os.path.getsize(SORTIE))
+    print(f"  Sauvegarde : {SORTIE}")
+    if npz:
+        with tel.span("serialisation_npz") as sp:
+            fmt.ecrire_npz(rapport, SORTIE_NPZ)
+            sp.compter(os.path.getsize(SORTIE_NPZ))
+        print(f"  Sauvegarde : {SORTIE_NPZ}")
+    if ARCHIVE:
+        archiver(rapport)
+
+    # Telemetrie ajoutee apres coup : la serialisation y figure aussi
+    rapport["telemetry"] = tel.resume()
+    fmt.ajouter_json(SORTIE, "telemetry", rapport["telemetry"])
+    tel.afficher(rapport["telemetry"]["etapes"])
     print("=== TWICE termine ===")
+    return rapport
+
+
+def ca_site(texte):
+    sid, sep, v = texte.partition("=")
+    try:
+        ca = float(v)
+    except ValueError:
+        ca = None
+    if not sep or not sid or ca is None or ca < 0:
+        raise argparse.ArgumentTypeError(f"attendu SITE=EUR (ex. eurohub_sud=500000), lu {texte!r}")
+    return sid, ca
+
+
+def options_configuration(ap):
+    # Source meteo, reseau et sites : options communes a tous les points
+    # d'entree (run, service, backfill, ensemble), appliquees par configurer
+    ap.add_argument("--offline", action="store_true",
+                    help="n'utiliser que le cache meteo local, quel que soit son age")
+    ap.add_argument("--replay", metavar="INSTANTANE",
+                    help="rejouer la chaine a partir d'un instantane de reponses meteo")
+    ap.add_argument("--osm", metavar="EXTRAIT",
+                    help="accessibilite par temps de parcours sur un extrait OpenStreetMap local")
+    ap.add_argument("--portefeuille", metavar="FICHIER",
+                    help="sites lus depuis un portefeuille .csv / .json au lieu de SITES")
+    ap.add_argument("--ca", metavar="SITE=EUR", type=ca_site, action="append", default=[],
+                    help="CA journalier impose a un site (repetable), ex. --ca eurohub_sud=500000")
+    return ap
+
+
+def configurer(a, enregistrer=False):
+    global RESEAU_OSM, PORTEFEUILLE, CA
+    if a.osm:
+        RESEAU_OSM = a.osm
+    if a.portefeuille:
+        PORTEFEUILLE = a.portefeuille
+    CA = dict(a.ca)
+    cache.configurer(hors_ligne=a.offline, rejeu=a.replay, enregistrer=enregistrer)
+
+
+def options_archive(ap):
+    # Archive des runs : options du run et du service, appliquees par configurer_archive
+    ap.add_argument("--archive", metavar="BASE", default=ARCHIVE,
+                    help=f"archive SQLite des runs (defaut {ARCHIVE})")
+    ap.add_argument("--sans-archive", action="store_true", help="ne pas archiver le run")
+    return ap
+
+
+def configurer_archive(a):
+    global ARCHIVE
+    ARCHIVE = None if a.sans_archive else a.archive
+
+
+def arguments(ap):
+    # Options du run (aussi celles de twice.py run / all)
+    options_configuration(ap)
+    options_archive(ap)
+    ap.add_argument("--snapshot", metavar="INSTANTANE",
+                    help="enregistrer les reponses meteo utilisees dans un instantane")
+    ap.add_argument("--incremental", action="store_true",
+                    help="ne recalculer que les heures dont les entrees ont change depuis le dernier run")
+    ap.add_argument("--npz", action="store_true",
+                    help=f"ecrire aussi le conteneur binaire {SORTIE_NPZ}")
+    ap.add_argument("--profil", metavar="DOSSIER",
+                    help="profiler le run (cProfile + tracemalloc) et ecrire les resumes dans DOSSIER")
+    return ap
+
+
+def executer(a):
+    # Applique les options (arguments) et lance le run ; renvoie le rapport
+    configurer_archive(a)
+    configurer(a, enregistrer=bool(a.snapshot))
+    if a.profil:
+        with tel.profiler(a.profil):
+            rapport = run(incremental=a.incremental, npz=a.npz)
+    else:
+        rapport = run(incremental=a.incremental, npz=a.npz)
+    if a.snapshot:
+        cache.sauver_instantane(a.snapshot)
+        print(f"  Instantane : {a.snapshot}")
+    return rapport
+
+
+def main(argv=None):
+    ap = arguments(argparse.ArgumentParser(description="TWICE — simulation pluie -> pertes"))
+    executer(ap.parse_args(argv))
 
 
 if __name__ == "__main__":
-    run()
+    main()
@@ -0,0 +1,299 @@
+"""
+TWICE — Mode service (processus resident + API HTTP/JSON locale)
+La configuration, le modele compile, les parametres du reseau (projection
+spatiale, graphe OSM) et la derniere meteo restent en memoire. Une boucle
+asyncio interroge la source meteo toutes les PERIODE_S secondes (le cache
+disque evite les requetes tant que le cycle de prevision n'a pas change) et ne
+recalcule la chaine que si les entrees ont change. Les reponses sont
+serialisees une fois par calcul et servies avec ETag (304 si inchangees) :
+  GET /summary                  resume du dernier calcul
+  GET /sites                    agregats par site
+  GET /sites/{id}/chronologie   serie horaire d'un site (forme historique)
+La source meteo est injectable (points -> times, series, now_index) pour
+tester le service sans reseau.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import threading
+from datetime import datetime, timezone
+from urllib.parse import unquote, urlsplit
+
+import twice_engine as engine
+import twice_format as fmt
+import twice_run as twice
+import twice_telemetrie as tel
+
+# ============================================================
+# PARAMETRES
+# ============================================================
+HOTE          = "127.0.0.1"
+PORT          = 8750
+PERIODE_S     = 300     # intervalle entre deux interrogations de la source
+ENTETE_MAX_KO = 16      # taille maximale d'une requete (ligne + en-tetes)
+CORPS_MAX_KO  = 64      # corps de requete lu et ignore au plus ; au-dela, connexion fermee
+
+STATUTS_HTTP = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+# ============================================================
+# VUES (REPONSES D'UN CALCUL)
+# ============================================================
+
+def _json(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class Vues:
+    # Corps JSON d'un calcul, serialises a la construction (/summary, /sites)
+    # ou au premier appel (chronologie par site), avec leur ETag
+
+    def __init__(self, rapport, version):
+        self.rapport  = rapport
+        self.version  = version
+        self.rang     = {r["site_id"]: k for k, r in enumerate(rapport["resultats"])}
+        self._corps   = {}
+        self._verrou  = threading.Lock()
+        sites = [{k: v for k, v in r.items() if k != "intervalles"} for r in rapport["resultats"]]
+        self._ajouter("/sites", {"generated_at": rapport["generated_at"], "sites": sites})
+        self._ajouter("/summary", self._resume(sites))
+
+    def _ajouter(self, chemin, obj):
+        corps = _json(obj)
+        etag  = '"' + hashlib.sha1(corps).hexdigest()[:20] + '"'
+        self._corps[chemin] = (corps, etag)
+        return self._corps[chemin]
+
+    def _resume(self, sites):
+        r     = self.rapport
+        times = fmt.decoder_temps(r["temps"])
+        return {
+            "projet":           r["projet"],
+            "zone":             r["zone"],
+            "version":          self.version,
+            "generated_at":     r["generated_at"],
+            "config_hash":      r["config_hash"],
+            "debut":            times[0] if times else None,
+            "fin":              times[-1] if times else None,
+            "heures":           len(times),
+            "now_index":        r["now_index"],
+            "maintenant":       times[r["now_index"]] if times else None,
+            "intervalles":      len(r["statuts"]["debut"]),
+            "sites":            len(sites),
+            "perte_totale_eur": round(sum(s["perte_totale_eur"] for s in sites), 2),
+            "heures_arret_max": max((s["heures_arret"] for s in sites), default=0),
+            "telemetry":        r.get("telemetry"),
+        }
+
+    def _chronologie(self, k):
+        # Forme historique (un dict par heure) du seul site k
+        r   = self.rapport
+        col = fmt.etendre(dict(r, resultats=[r["resultats"][k]]))
+        s   = fmt.vers_legacy(col)["resultats"][0]
+        return {"site_id": s["site_id"], "site_nom": s["site_nom"], "chronologie": list(s["chronologie"])}
+
+    def corps(self, chemin):
+        # (corps, etag) ou None si le chemin n'existe pas
+        if chemin in self._corps:
+            return self._corps[chemin]
+        morceaux = chemin.strip("/").split("/")
+        if len(morceaux) != 3 or morceaux[0] != "sites" or morceaux[2] != "chronologie":
+            return None
+        k = self.rang.get(morceaux[1])
+        if k is None:
+            return None
+        with self._verrou:
+            return self._corps.get(chemin) or self._ajouter(chemin, self._chronologie(k))
+
+
+# ============================================================
+# ETAT RESIDENT
+# ============================================================
+
+class Service:
+    # Modele, parametres reseau et dernier calcul en memoire. source : meme
+    # signature que twice_run.fetch_meteo_points (par defaut Open-Meteo).
+
+    def __init__(self, source=None, periode_s=PERIODE_S):
+        self.source    = source
+        self.periode_s = periode_s
+        self.pf        = twice.portefeuille()
+        self.modele    = engine.compiler(self.pf, twice.RESEAU_ROUTIER, twice.STATUT_VERS_SCORE)
+        self.params    = None
+        self.rang      = None
+        self.signature = None
+        self.vues      = None
+        self.calculs   = 0
+        self.erreur    = None
+
+    def _signature(self, times, now_index, precip):
+        h = hashlib.sha256(_json([times, now_index]))
+        h.update(precip.tobytes())
+        return h.hexdigest()
+
+    def rafraichir(self):
+        # Interroge la source ; recalcule si les entrees ont change. Bloquant
+        # (appele hors boucle asyncio). Renvoie True si un calcul a eu lieu.
+        tel.demarrer()
+        with tel.span("fetch") as sp:
+            times, now_index, points, rang, precip = twice.entrees_meteo(self.pf, self.source)
+            sp.compter(precip.size)
+        signature = self._signature(times, now_index, precip)
+        if signature == self.signature:
+            return False
+
+        if rang != self.rang:
+            with tel.span("reseau") as sp:
+                self.params, self.rang = twice.parametres(rang, self.pf), rang
+                sp.compter(len(twice.RESEAU_ROUTIER))
+        chrono = twice.chronologie(self.modele, precip, self.params)
+        with tel.span("agregation", len(self.pf)):
+            agg = chrono.agreger()
+        with tel.span("assemblage", len(self.pf)):
+            rapport = twice.construire_rapport(self.pf, self.modele, chrono, times, now_index, points, precip,
+                                               [rang[c] for c in self.pf.coordonnees(twice.coordonnees(twice.ZONE))],
+                                               agg, self.params)
+        if twice.ARCHIVE:
+            twice.archiver(rapport)
+        rapport["telemetry"] = tel.resume()
+        vues = Vues(rapport, self.calculs + 1)
+        # Bascule en une affectation : les requetes en cours gardent l'ancien calcul
+        self.vues, self.signature = vues, signature
+        self.calculs += 1
+        print(f"  [{datetime.now(timezone.utc):%H:%M:%S}] calcul #{self.calculs} : "
+              f"{len(chrono.debuts)} intervalle(s), {len(times)} heures")
+        return True
+
+    async def actualiser(self):
+        # Une erreur de source garde le dernier calcul servi
+        try:
+            await asyncio.to_thread(self.rafraichir)
+            self.erreur = None
+        except Exception as e:
+            self.erreur = f"{type(e).__name__}: {e}"
+            print(f"  rafraichissement en echec : {self.erreur}")
+
+    async def boucle(self):
+        while True:
+            await asyncio.sleep(self.periode_s)
+            await self.actualiser()
+
+    # ------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------
+
+    def reponse(self, methode, cible, entetes):
+        # (statut, en-tetes, corps) pour une requete ; sans E/S
+        if methode not in ("GET", "HEAD"):
+            return 405, {"Allow": "GET, HEAD"}, _json({"erreur": "methode non supportee"})
+        vues = self.vues
+        if vues is None:
+            return 503, {"Retry-After": "5"}, _json({"erreur": self.erreur or "premier calcul en cours"})
+        trouve = vues.corps(unquote(urlsplit(cible).path).rstrip("/") or "/")
+        if trouve is None:
+            return 404, {}, _json({"erreur": f"introuvable : {cible}"})
+        corps, etag = trouve
+        demandes = [t.strip().removeprefix("W/") for t in entetes.get("if-none-match", "").split(",")]
+        if etag in demandes or "*" in demandes:
+            return 304, {"ETag": etag}, b""
+        return 200, {"ETag": etag}, corps
+
+    async def client(self, lecteur, ecrivain):
+        # HTTP/1.1 minimal : requetes successives sur la connexion (keep-alive)
+        try:
+            while True:
+                try:
+                    brut = await lecteur.readuntil(b"\r\n\r\n")
+                except asyncio.LimitOverrunError:
+                    await self._ecrire(ecrivain, 400, {}, _json({"erreur": "en-tetes trop longs"}), "GET", False)
+                    return
+                except asyncio.IncompleteReadError:
+                    return
+                lignes = brut.decode("latin-1").split("\r\n")
+                try:
+                    methode, cible, protocole = lignes[0].split(" ")
+                except ValueError:
+                    await self._ecrire(ecrivain, 400, {}, _json({"erreur": "requete invalide"}), "GET", False)
+                    return
+                entetes = {}
+                for l in lignes[1:]:
+                    if ":" in l:
+                        k, v = l.split(":", 1)
+                        entetes[k.strip().lower()] = v.strip()
+                garder = (entetes.get("connection", "").lower() != "close"
+                          if protocole == "HTTP/1.1" else entetes.get("connection", "").lower() == "keep-alive")
+                # Corps eventuel (ignore) : lu pour que la requete suivante
+                # commence au bon octet ; sinon la connexion est fermee apres
+                # la reponse
+                try:
+                    longueur = int(entetes.get("content-length", "0"))
+                    if longueur < 0:
+                        raise ValueError
+                except ValueError:
+                    await self._ecrire(ecrivain, 400, {}, _json({"erreur": "Content-Length invalide"}), "GET", False)
+                    return
+                if "transfer-encoding" in entetes or longueur > CORPS_MAX_KO * 1024:
+                    garder = False
+                elif longueur:
+                    await lecteur.readexactly(longueur)
+                statut, ent, corps = self.reponse(methode, cible, entetes)
+                await self._ecrire(ecrivain, statut, ent, corps, methode, garder)
+                if not garder:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            ecrivain.close()
+
+    async def _ecrire(self, ecrivain, statut, entetes, corps, methode, garder):
+        tete = [f"HTTP/1.1 {statut} {STATUTS_HTTP[statut]}",
+                "Content-Type: application/json; charset=utf-8",
+                f"Content-Length: {len(corps)}",
+                "Cache-Control: no-cache",
+                f"Connection: {'keep-alive' if garder else 'close'}"]
+        tete += [f"{k}: {v}" for k, v in entetes.items()]
+        ecrivain.write(("\r\n".join(tete) + "\r\n\r\n").encode("latin-1"))
+        if methode != "HEAD":
+            ecrivain.write(corps)
+        await ecrivain.drain()
+
+    async def servir(self, hote=HOTE, port=PORT):
+        # Premier calcul avant d'accepter les requetes, puis boucle de rafraichissement
+        await self.actualiser()
+        serveur = await asyncio.start_server(self.client, hote, port, limit=ENTETE_MAX_KO * 1024)
+        rafraichissement = asyncio.create_task(self.boucle())
+        print(f"=== TWICE service sur http://{hote}:{serveur.sockets[0].getsockname()[1]} ===")
+        try:
+            async with serveur:
+                await serveur.serve_forever()
+        finally:
+            rafraichissement.cancel()
+
+
+def arguments(ap):
+    # Options du run (configuration, archive) et du seul service
+    twice.options_configuration(ap)
+    twice.options_archive(ap)
+    ap.add_argument("--hote", default=HOTE)
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument("--periode", type=float, default=PERIODE_S,
+                    help="secondes entre deux interrogations de la source meteo")
+    return ap
+
+
+def main(argv=None):
+    ap = arguments(argparse.ArgumentParser(description="TWICE — service resident et API HTTP/JSON locale"))
+    a  = ap.parse_args(argv)
+    twice.configurer_archive(a)
+    twice.configurer(a)
+    try:
+        asyncio.run(Service(periode_s=a.periode).servir(a.hote, a.port))
+    except KeyboardInterrupt:
+        print("=== TWICE service arrete ===")
+
+
+if __name__ == "__main__":
+    main()
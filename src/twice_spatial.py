@@ -0,0 +1,152 @@
+"""
+TWICE — Alea spatialise par troncon
+Une route de RESEAU_ROUTIER peut porter une "geometrie" (polyligne
+[[lat, lon], ...]). Chaque segment est reparti sur les mailles de la grille de
+prevision qu'il traverse (decoupage aux bords de maille), avec la part de sa
+longueur dans chacune. L'indice d'un segment est la moyenne des indices de ses
+mailles ponderee par ces parts ; celui d'une route, le maximum de ses segments.
+L'index est calcule une fois et mis en cache disque, cle = geometries + grille :
+les runs horaires ne font plus que des lectures de tableaux.
+Une route sans geometrie reste alimentee par son point (lat / lon ou ZONE).
+"""
+
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+
+import twice_engine as engine
+import twice_meteo as meteo
+
+REPERTOIRE = os.environ.get("TWICE_SPATIAL_DIR", ".cache/spatial")
+
+
+# ============================================================
+# DECOUPAGE SUR LA GRILLE
+# ============================================================
+
+def _coupures(u0, u1):
+    # Parametres t in ]0, 1[ ou u franchit un bord de maille (k + 0.5)
+    if u0 == u1:
+        return []
+    lo, hi = sorted((u0, u1))
+    return [(k + 0.5 - u0) / (u1 - u0) for k in range(math.floor(lo - 0.5) + 1, math.ceil(hi - 0.5))]
+
+
+def mailles_segment(a, b, grille=None):
+    # [(maille, part de longueur)] pour le segment a -> b, mailles au sens de
+    # twice_meteo.maille (round(lat / grille), round(lon / grille))
+    g = grille or meteo.GRILLE_DEG
+    y0, x0, y1, x1 = a[0] / g, a[1] / g, b[0] / g, b[1] / g
+    ts = sorted({0.0, 1.0, *_coupures(y0, y1), *_coupures(x0, x1)})
+    parts = {}
+    for t0, t1 in zip(ts, ts[1:]):
+        t = (t0 + t1) / 2
+        m = (round(y0 + t * (y1 - y0)), round(x0 + t * (x1 - x0)))
+        parts[m] = parts.get(m, 0.0) + (t1 - t0)
+    return list(parts.items()) or [((round(y0), round(x0)), 1.0)]
+
+
+# ============================================================
+# INDEX (CACHE DISQUE)
+# ============================================================
+
+def cle(geometries, grille):
+    brut = json.dumps({"geometries": geometries, "grille": grille}, sort_keys=True)
+    return hashlib.sha256(brut.encode("utf-8")).hexdigest()
+
+
+def _construire(geometries, grille):
+    # Segments ordonnes par route ; entrees (segment, maille) contigues par segment
+    # La longueur d'un segment n'intervient pas : l'indice d'une route est le
+    # maximum de ses segments (un segment coupe suffit a couper la route)
+    seg_route, debut, mailles, parts = [], [], [], []
+    for r, geo in enumerate(geometries):
+        for a, b in zip(geo, geo[1:]):
+            seg_route.append(r)
+            debut.append(len(parts))
+            for m, p in mailles_segment(a, b, grille):
+                mailles.append(m)
+                parts.append(p)
+    return {
+        "seg_route": np.array(seg_route, dtype=np.intp),
+        "debut":     np.array(debut, dtype=np.intp),
+        "mailles":   np.array(mailles, dtype=np.int64).reshape(-1, 2),
+        "parts":     np.array(parts, dtype=float),
+    }
+
+
+def indexer(geometries, grille=None):
+    # geometries : une polyligne (ou None) par route
+    g   = grille or meteo.GRILLE_DEG
+    geo = [list(map(list, p)) if p and len(p) >= 2 else [] for p in geometries]
+    if not any(geo):
+        return _construire(geo, g)
+    chemin = os.path.join(REPERTOIRE, cle(geo, g) + ".npz")
+    try:
+        with np.load(chemin) as z:
+            return {k: z[k] for k in z.files}
+    except (OSError, ValueError):
+        pass
+    index = _construire(geo, g)
+    os.makedirs(REPERTOIRE, exist_ok=True)
+    tmp = f"{chemin}.{os.getpid()}.tmp.npz"
+    np.savez(tmp, **index)
+    os.replace(tmp, chemin)
+    return index
+
+
+def centres(index, grille=None):
+    # Point representatif de chaque maille de l'index (a interroger en meteo)
+    g = grille or meteo.GRILLE_DEG
+    return [(round(i * g, 6), round(j * g, 6)) for i, j in dict.fromkeys(map(tuple, index["mailles"].tolist()))]
+
+
+# ============================================================
+# PROJECTION POINTS -> ROUTES
+# ============================================================
+
+class Projection:
+    # point_routes pour engine.evaluer : indices (..., points, heures) ->
+    # (..., routes, heures). lignes / parts : entrees (segment, maille) ;
+    # debut_seg : bornes des segments pour reduceat ; ordre / debut_route :
+    # segments regroupes par route.
+
+    def __init__(self, index, rang, points_routes, grille=None):
+        g     = grille or meteo.GRILLE_DEG
+        par_m = {meteo.maille(p): k for p, k in reversed(list(rang.items()))}
+        n     = len(points_routes)
+        avec  = np.zeros(n, dtype=bool)
+        avec[index["seg_route"]] = True
+
+        lignes = np.empty(0, dtype=np.intp)
+        if len(index["parts"]):
+            uniq, inv = np.unique(index["mailles"], axis=0, return_inverse=True)
+            lignes = np.array([par_m[meteo.maille((i * g, j * g))] for i, j in uniq.tolist()],
+                              dtype=np.intp)[inv.reshape(-1)]
+
+        # Route ponctuelle : un segment, une maille (son point), part 1
+        ponct = np.flatnonzero(~avec)
+        self.lignes    = np.concatenate([lignes, [rang[points_routes[r]] for r in ponct]]).astype(np.intp)
+        self.parts     = np.concatenate([index["parts"], np.ones(len(ponct))])
+        self.debut_seg = np.concatenate([index["debut"], len(index["parts"]) + np.arange(len(ponct))]).astype(np.intp)
+        seg_route      = np.concatenate([index["seg_route"], ponct]).astype(np.intp)
+        self.ordre       = np.argsort(seg_route, kind="stable")
+        self.seg_route   = seg_route[self.ordre]
+        self.debut_route = np.searchsorted(self.seg_route, np.arange(n))
+        self.ponctuel    = not avec.any()
+
+    def segments(self, indices):
+        # (..., segments, heures) regroupes par route, arrondis comme indice_alea
+        if self.ponctuel:
+            return indices[..., self.lignes, :]
+        v = indices[..., self.lignes, :] * self.parts[:, None]
+        return engine.arrondi(np.add.reduceat(v, self.debut_seg, axis=-2), 3)[..., self.ordre, :]
+
+    def __call__(self, indices):
+        seg = self.segments(indices)
+        if self.ponctuel:
+            return seg
+        return np.maximum.reduceat(seg, self.debut_route, axis=-2)
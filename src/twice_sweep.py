@@ -0,0 +1,320 @@
+"""
+TWICE — Balayage d'hypotheses et analyse de sensibilite
+Evalue la chaine pluie -> route -> accessibilite -> pertes pour chaque
+combinaison d'une grille ou d'un hypercube latin de valeurs d'hypotheses.
+Chaque etage est memoise sur les seuls parametres dont il depend :
+  cumul        <- FENETRE_GLISSANTE_H
+  indices      <- + SEUIL_MAX_MM
+  statuts      <- + seuil_impact / seuil_coupure par route
+  modele       <- poids des routes critiques (engine.compiler)
+  pertes       <- statuts, modele, SEUIL_NORMAL, SEUIL_ARRET
+Les pertes passent par le meme chemin que le run : chronologie aux
+changements d'etat (twice_evenements) et tables par site du moteur
+(engine.Tables, memorisees au niveau du module d'une combinaison a l'autre),
+ou accessibilite OSM si un reseau est configure.
+Sortie : perte_totale_eur par combinaison, tableau tornado (un parametre a la
+fois entre ses bornes, les autres a leur valeur de base) et correlations de
+rang sur l'ensemble du balayage.
+"""
+
+import argparse
+import itertools
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+import twice_engine as engine
+import twice_evenements as evenements
+import twice_run as twice
+
+SORTIE = "outputs/sweep_latest.json"
+
+GLOBAUX = ("SEUIL_MAX_MM", "FENETRE_GLISSANTE_H", "SEUIL_NORMAL", "SEUIL_ARRET")
+ENTIERS = ("FENETRE_GLISSANTE_H",)
+ETAPES  = ("cumul", "indices", "statuts", "modele", "pertes")
+
+
+def valeurs_base(pf=None):
+    # Nom de parametre -> valeur courante dans twice_run
+    #   seuil_impact.<route>, seuil_coupure.<route>, poids.<site>.<route>
+    pf   = twice.portefeuille() if pf is None else pf
+    base = {n: getattr(twice, n) for n in GLOBAUX}
+    for r in twice.RESEAU_ROUTIER:
+        base[f"seuil_impact.{r['id']}"]  = r["seuil_impact"]
+        base[f"seuil_coupure.{r['id']}"] = r["seuil_coupure"]
+    for k, sid in enumerate(pf.ids):
+        for rid, p in twice.routes_critiques(pf, k):
+            base[f"poids.{sid}.{rid}"] = p
+    return base
+
+
+# ============================================================
+# EVALUATION MEMOISEE
+# ============================================================
+
+class Balayage:
+
+    def __init__(self, precip, pf, params):
+        # pf : portefeuille du run ; params : twice_run.parametres (projection
+        # sur les routes, accessibilite OSM eventuelle)
+        self.precip       = precip
+        self.pf           = pf
+        self.point_routes = params["point_routes"]
+        self.acces        = params["acces"]
+        self.base         = valeurs_base(pf)
+        self.route_ids    = [r["id"] for r in twice.RESEAU_ROUTIER]
+        self.site_ids     = list(pf.ids)
+        self.cles_poids   = [k for k in self.base if k.startswith("poids.")]
+        self.caches       = {e: {} for e in ETAPES}
+        self.compteurs    = {e: [0, 0] for e in ETAPES}   # calculs, reutilisations
+
+    def _memo(self, etape, cle, calcul):
+        cache_etape = self.caches[etape]
+        if cle in cache_etape:
+            self.compteurs[etape][1] += 1
+            return cache_etape[cle]
+        self.compteurs[etape][0] += 1
+        v = cache_etape[cle] = calcul()
+        return v
+
+    def _modele(self, poids):
+        # Modele compile du portefeuille, poids des routes critiques remplaces
+        def compiler():
+            if poids == tuple(float(self.base[k]) for k in self.cles_poids):
+                sites = self.pf
+            else:
+                p = dict(zip(self.cles_poids, poids))
+                sites = [{"id": sid, "ca_journalier": ca,
+                          "routes_critiques": {rid: p[f"poids.{sid}.{rid}"]
+                                               for rid, _ in twice.routes_critiques(self.pf, k)}}
+                         for k, (sid, ca) in enumerate(zip(self.pf.ids, self.pf.ca_journalier.tolist()))]
+            return engine.compiler(sites, twice.RESEAU_ROUTIER, twice.STATUT_VERS_SCORE)
+        return self._memo("modele", poids, compiler)
+
+    def evaluer(self, valeurs):
+        # valeurs : {parametre: valeur} ; les parametres absents gardent leur valeur de base
+        v = dict(self.base, **valeurs)
+
+        fenetre = int(v["FENETRE_GLISSANTE_H"])
+        cumul   = self._memo("cumul", fenetre, lambda: engine.cumul_glissant(self.precip, fenetre))
+
+        k_idx   = (fenetre, float(v["SEUIL_MAX_MM"]))
+        indices = self._memo("indices", k_idx,
+                             lambda: engine.arrondi(np.minimum(cumul / k_idx[1], 1.0), 3))
+
+        si = tuple(float(v[f"seuil_impact.{rid}"]) for rid in self.route_ids)
+        sc = tuple(float(v[f"seuil_coupure.{rid}"]) for rid in self.route_ids)
+        k_st  = (k_idx, si, sc)
+        codes = self._memo("statuts", k_st,
+                           lambda: engine.statuts_routes(engine.indices_routes(indices, self.point_routes),
+                                                             np.array(si), np.array(sc)))
+
+        poids  = tuple(float(v[k]) for k in self.cles_poids)
+        modele = self._modele(poids)
+
+        # Meme chemin que twice_run.chronologie : chaine evaluee aux
+        # changements d'etat, tables par site (ou acces OSM)
+        k_p = (k_st, poids, float(v["SEUIL_NORMAL"]), float(v["SEUIL_ARRET"]))
+        return self._memo("pertes", k_p, lambda: evenements.evaluer_statuts(
+            modele, codes, k_p[2], k_p[3], self.acces).perte_totale())
+
+    def balayer(self, noms, combinaisons):
+        # (combinaisons, sites) de perte_totale_eur
+        out = np.empty((len(combinaisons), len(self.site_ids)))
+        for i, c in enumerate(combinaisons):
+            out[i] = self.evaluer(dict(zip(noms, c)))
+        return out
+
+    def statistiques(self):
+        return {e: {"calculs": c, "reutilisations": r} for e, (c, r) in self.compteurs.items()}
+
+
+# ============================================================
+# PLANS D'EXPERIENCE
+# ============================================================
+
+def _valeur(nom, x):
+    return int(round(x)) if nom in ENTIERS else float(x)
+
+
+def grille(axes):
+    # axes : {parametre: [valeurs]} -> produit cartesien
+    noms = list(axes)
+    return noms, [tuple(c) for c in itertools.product(*(axes[n] for n in noms))]
+
+
+def hypercube_latin(bornes, n, seed=None):
+    # bornes : {parametre: (min, max)} ; une valeur par strate et par parametre,
+    # strates appariees au hasard entre parametres
+    rng  = np.random.default_rng(seed)
+    noms = list(bornes)
+    cols = []
+    for nom in noms:
+        lo, hi = bornes[nom]
+        u = (rng.permutation(n) + rng.random(n)) / n
+        if nom in ENTIERS:
+            x = np.minimum(np.floor(lo + u * (hi - lo + 1)), hi)
+        else:
+            x = lo + u * (hi - lo)
+        cols.append([_valeur(nom, v) for v in x])
+    return noms, list(zip(*cols))
+
+
+def etendues(noms, combinaisons):
+    return {nom: (min(c[k] for c in combinaisons), max(c[k] for c in combinaisons))
+            for k, nom in enumerate(noms)}
+
+
+# ============================================================
+# SENSIBILITE
+# ============================================================
+
+def tornado(balayage, bornes):
+    # Un parametre a la fois entre ses bornes, les autres a leur valeur de base
+    base = balayage.evaluer({})
+    lignes = []
+    for nom, (lo, hi) in bornes.items():
+        p_lo = balayage.evaluer({nom: lo})
+        p_hi = balayage.evaluer({nom: hi})
+        lignes.append({
+            "parametre":       nom,
+            "base":            balayage.base[nom],
+            "bas":             lo,
+            "haut":            hi,
+            "perte_bas_eur":   round(float(p_lo.sum()), 2),
+            "perte_haut_eur":  round(float(p_hi.sum()), 2),
+            "ecart_eur":       round(float(p_hi.sum() - p_lo.sum()), 2),
+            "par_site": {
+                sid: {"bas": float(a), "haut": float(b)}
+                for sid, a, b in zip(balayage.site_ids, p_lo, p_hi)
+            },
+        })
+    lignes.sort(key=lambda l: -abs(l["ecart_eur"]))
+    return float(base.sum()), lignes
+
+
+def _rangs(x):
+    # rangs moyens (ex aequo partages)
+    x = np.asarray(x, dtype=float)
+    r = np.empty(len(x))
+    r[np.argsort(x, kind="stable")] = np.arange(len(x))
+    _, inv = np.unique(x, return_inverse=True)
+    return (np.bincount(inv, r) / np.bincount(inv))[inv]
+
+
+def correlations_rang(noms, combinaisons, totaux):
+    out = []
+    ry  = _rangs(totaux)
+    for k, nom in enumerate(noms):
+        rx = _rangs([c[k] for c in combinaisons])
+        if rx.std() == 0 or ry.std() == 0:
+            rho = None
+        else:
+            rho = round(float(np.corrcoef(rx, ry)[0, 1]), 4)
+        out.append({"parametre": nom, "spearman": rho})
+    out.sort(key=lambda l: -abs(l["spearman"] or 0))
+    return out
+
+
+# ============================================================
+# EXECUTION
+# ============================================================
+
+def lire_axe(spec, lhs):
+    # "NOM=v1,v2,v3" (grille) ou "NOM=min:max" (hypercube latin)
+    nom, _, vals = spec.partition("=")
+    nom = nom.strip()
+    if nom not in valeurs_base():
+        raise ValueError(f"Parametre inconnu : {nom!r} (voir --liste)")
+    if lhs:
+        lo, _, hi = vals.partition(":")
+        return nom, (_valeur(nom, float(lo)), _valeur(nom, float(hi)))
+    return nom, [_valeur(nom, float(x)) for x in vals.split(",") if x.strip()]
+
+
+def run(axes, lhs=None, seed=None):
+    print("=== TWICE balayage démarrage ===")
+    pf = twice.portefeuille()
+    times, now_index, points, rang, precip = twice.entrees_meteo(pf)
+    balayage = Balayage(precip, pf, twice.parametres(rang, pf))
+
+    if lhs:
+        noms, combinaisons = hypercube_latin(axes, lhs, seed)
+        plan = {"type": "hypercube_latin", "n": lhs, "seed": seed,
+                "bornes": {n: list(b) for n, b in axes.items()}}
+    else:
+        noms, combinaisons = grille(axes)
+        plan = {"type": "grille", "axes": axes}
+    print(f"  {len(combinaisons)} combinaison(s) de {len(noms)} parametre(s)")
+
+    pertes = balayage.balayer(noms, combinaisons)
+    totaux = pertes.sum(axis=1)
+    base_eur, lignes = tornado(balayage, axes if lhs else etendues(noms, combinaisons))
+    correlations = correlations_rang(noms, combinaisons, totaux)
+
+    print(f"  perte totale de base : {base_eur:,.0f}€")
+    print(f"  {'parametre':<36} {'bas':>8} {'haut':>8} {'perte bas':>14} {'perte haut':>14}")
+    for l in lignes:
+        print(f"  {l['parametre']:<36} {l['bas']:>8g} {l['haut']:>8g} "
+              f"{l['perte_bas_eur']:>13,.0f}€ {l['perte_haut_eur']:>13,.0f}€")
+    for e, st in balayage.statistiques().items():
+        print(f"  memo {e:<14} {st['calculs']:>6} calcul(s)  {st['reutilisations']:>6} reutilisation(s)")
+
+    rapport = {
+        "projet":         "TWICE",
+        "zone":           "Bettembourg, Luxembourg",
+        "mode":           "balayage",
+        "generated_at":   datetime.now(timezone.utc).isoformat(),
+        "now_index":      now_index,
+        "config_hash":    twice.config_hash(),
+        "plan":           plan,
+        "base":           {n: balayage.base[n] for n in noms},
+        "sites":          balayage.site_ids,
+        "perte_base_eur": round(base_eur, 2),
+        "combinaisons": {
+            "parametres":       noms,
+            "valeurs":          [list(c) for c in combinaisons],
+            "perte_totale_eur": pertes.tolist(),
+        },
+        "tornado":        lignes,
+        "correlations":   correlations,
+        "memo":           balayage.statistiques(),
+    }
+
+    os.makedirs("outputs", exist_ok=True)
+    with open(SORTIE, "w", encoding="utf-8") as f:
+        json.dump(rapport, f, ensure_ascii=False, separators=(",", ":"))
+    print(f"  Sauvegarde : {SORTIE}")
+    print("=== TWICE balayage termine ===")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="TWICE — balayage d'hypotheses et sensibilite des pertes")
+    ap.add_argument("--param", action="append", default=[], metavar="NOM=VALEURS",
+                    help="axe du balayage : NOM=v1,v2,... (grille) ou NOM=min:max (avec --lhs)")
+    ap.add_argument("--lhs", type=int, metavar="N",
+                    help="N tirages en hypercube latin au lieu d'une grille")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--liste", action="store_true", help="lister les parametres et leur valeur de base")
+    # Memes options que le run deterministe (portefeuille, CA, OSM, source meteo)
+    twice.options_configuration(ap)
+    a = ap.parse_args(argv)
+    twice.configurer(a)
+
+    if a.liste:
+        for nom, v in valeurs_base().items():
+            print(f"{nom:<36} {v}")
+        return
+    if not a.param:
+        ap.error("au moins un --param est requis")
+    try:
+        axes = dict(lire_axe(p, a.lhs) for p in a.param)
+    except ValueError as e:
+        ap.error(str(e))
+    run(axes, a.lhs, a.seed)
+
+
+if __name__ == "__main__":
+    main()
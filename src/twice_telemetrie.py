@@ -0,0 +1,138 @@
+"""
+TWICE — Telemetrie des etapes
+Chaque etape d'un run (fetch, alea, statuts, accessibilite, agregation,
+serialisation, rendu) est encadree par un span qui releve le temps mur, le
+temps CPU, le pic de memoire residente du processus atteint a sa sortie
+(ru_maxrss : cumule depuis le demarrage, pas le pic propre a l'etape, mesure
+par twice_bench) et le nombre d'elements traites. Le resume part dans le bloc "telemetry" de
+resultats_latest.json et dans la section "Diagnostics du run" du rapport.
+Profilage cProfile + tracemalloc sur option (profiler), hors mesures normales.
+"""
+
+import contextlib
+import os
+import platform
+import sys
+import time
+
+try:
+    import resource
+except ImportError:   # Windows : pas de getrusage
+    resource = None
+
+# ============================================================
+# PARAMETRES
+# ============================================================
+TOP_FONCTIONS   = 40    # lignes du resume cProfile (temps cumule)
+TOP_ALLOCATIONS = 25    # lignes du resume tracemalloc
+CADRES_PILE     = 10    # profondeur des piles d'allocation
+
+_etapes = []
+_debut  = None
+
+
+def rss_processus_mo():
+    # Pic de memoire residente du processus depuis son demarrage (ru_maxrss :
+    # Ko sous Linux, octets sous macOS)
+    if resource is None:
+        return None
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(r / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def demarrer():
+    global _debut
+    _etapes.clear()
+    _debut = (time.perf_counter(), time.process_time())
+
+
+# ============================================================
+# SPANS
+# ============================================================
+
+class Span:
+    # Etape en cours : elements renseigne par l'appelant (heures, points, octets...)
+    def __init__(self, nom, elements=None):
+        self.nom      = nom
+        self.elements = elements
+
+    def compter(self, n):
+        self.elements = int(n)
+
+
+@contextlib.contextmanager
+def span(nom, elements=None):
+    if _debut is None:
+        demarrer()
+    s = Span(nom, elements)
+    t0, c0 = time.perf_counter(), time.process_time()
+    try:
+        yield s
+    finally:
+        _etapes.append({
+            "etape":            s.nom,
+            "mur_s":            round(time.perf_counter() - t0, 4),
+            "cpu_s":            round(time.process_time() - c0, 4),
+            "rss_processus_mo": rss_processus_mo(),
+            "elements":         s.elements,
+        })
+
+
+def etapes():
+    return list(_etapes)
+
+
+def resume():
+    # Bloc "telemetry" : etapes dans l'ordre d'execution et totaux du processus
+    mur0, cpu0 = _debut or (time.perf_counter(), time.process_time())
+    return {
+        "etapes":           etapes(),
+        "mur_s":            round(time.perf_counter() - mur0, 4),
+        "cpu_s":            round(time.process_time() - cpu0, 4),
+        "rss_processus_mo": rss_processus_mo(),
+        "python":           platform.python_version(),
+        "plateforme":       platform.platform(terse=True),
+    }
+
+
+def afficher(liste):
+    for e in liste:
+        n   = "" if e["elements"] is None else f"  {e['elements']:>12,}"
+        rss = "" if e["rss_processus_mo"] is None else f"  rss processus {e['rss_processus_mo']:>8.1f} Mo"
+        print(f"  {e['etape']:<18} mur {e['mur_s']:>8.3f}s  cpu {e['cpu_s']:>8.3f}s{rss}{n}")
+
+
+# ============================================================
+# PROFILAGE (OPTIONNEL)
+# ============================================================
+
+@contextlib.contextmanager
+def profiler(dossier):
+    # cProfile + tracemalloc autour du bloc ; ecrit dans dossier :
+    # profil.pstats (snakeviz, pstats), profil.txt (temps cumule),
+    # memoire.txt (allocations vivantes en fin de bloc, par pile)
+    import cProfile, pstats, tracemalloc      # profilage seulement
+    os.makedirs(dossier, exist_ok=True)
+    prof = cProfile.Profile()
+    tracemalloc.start(CADRES_PILE)
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        snap = tracemalloc.take_snapshot()
+        _, pic = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        prof.dump_stats(os.path.join(dossier, "profil.pstats"))
+        with open(os.path.join(dossier, "profil.txt"), "w", encoding="utf-8") as f:
+            pstats.Stats(prof, stream=f).sort_stats("cumulative").print_stats(TOP_FONCTIONS)
+        snap = snap.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        with open(os.path.join(dossier, "memoire.txt"), "w", encoding="utf-8") as f:
+            f.write(f"pic trace : {pic / 1e6:.1f} Mo\n\n")
+            for st in snap.statistics("traceback")[:TOP_ALLOCATIONS]:
+                f.write(f"{st.size / 1e6:.2f} Mo en {st.count} bloc(s)\n")
+                for ligne in st.traceback.format():
+                    f.write(f"  {ligne}\n")
+                f.write("\n")
+        print(f"  Profil : {dossier}/profil.pstats, profil.txt, memoire.txt")
@@ -0,0 +1,126 @@
+"""
+TWICE — Configuration pytest
+Les modules de src/ s'importent a plat (import twice_engine as engine) ;
+ils sont rendus importables ici, comme pour python src/twice.py.
+Fixture open_meteo : serveur HTTP local qui tient lieu d'Open-Meteo ;
+meteo_fixe : series fixes par point, sans reseau, pour un run complet.
+"""
+
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+class OpenMeteo(ThreadingHTTPServer):
+    # Open-Meteo simule sur 127.0.0.1 : une serie par localisation demandee
+    # (pluie = [lat, lon]) sur les deux dernieres heures UTC (times), objet si
+    # une seule localisation, liste sinon. Reglages :
+    # pannes (prochaines reponses en 503), etag / last_modified (304 si la
+    # requete conditionnelle correspond), attente(lats) appelee avant de repondre.
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Requete)
+        heure = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0, tzinfo=None)
+        self.times         = [(heure - timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in (1, 0)]
+        self.requetes      = []     # (chemin, parametres, en-tetes, statut)
+        self.pannes        = 0
+        self.etag          = None
+        self.last_modified = None
+        self.attente       = None
+        self.verrou        = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/forecast"
+
+    def lots(self):
+        # Localisations de chaque requete servie (200), dans l'ordre d'arrivee
+        return [list(zip(q["latitude"], q["longitude"])) for _, q, _, statut in self.requetes if statut == 200]
+
+
+class Requete(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        s = self.server
+        q = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+        q["latitude"]  = [float(x) for x in q["latitude"].split(",")]
+        q["longitude"] = [float(x) for x in q["longitude"].split(",")]
+        if s.attente:
+            s.attente(q["latitude"])
+        with s.verrou:
+            if s.pannes:
+                s.pannes -= 1
+                statut = 503
+            elif s.etag and self.headers.get("If-None-Match") == s.etag:
+                statut = 304
+            elif s.last_modified and self.headers.get("If-Modified-Since") == s.last_modified:
+                statut = 304
+            else:
+                statut = 200
+            s.requetes.append((urlsplit(self.path).path, q, dict(self.headers), statut))
+        corps = b""
+        if statut == 200:
+            rep = [{"hourly": {"time": s.times, "precipitation": [a, b]}}
+                   for a, b in zip(q["latitude"], q["longitude"])]
+            corps = json.dumps(rep if len(rep) > 1 else rep[0]).encode("utf-8")
+        self.send_response(statut)
+        if s.etag:
+            self.send_header("ETag", s.etag)
+        if s.last_modified:
+            self.send_header("Last-Modified", s.last_modified)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+
+@pytest.fixture
+def open_meteo(monkeypatch, tmp_path):
+    # Serveur local, cache meteo vide dans tmp_path, session et mode reseau neufs
+    import twice_cache as cache
+    import twice_meteo as meteo
+    serveur = OpenMeteo()
+    threading.Thread(target=serveur.serve_forever, args=(0.05,), daemon=True).start()
+    monkeypatch.setattr(meteo, "URL", serveur.url)
+    monkeypatch.setattr(meteo, "_session", None)
+    monkeypatch.setattr(cache, "REPERTOIRE", str(tmp_path / "cache"))
+    cache.configurer()
+    yield serveur
+    serveur.shutdown()
+    serveur.server_close()
+    cache.configurer()
+
+
+@pytest.fixture
+def meteo_fixe(monkeypatch, tmp_path):
+    # Run complet dans tmp_path, sans archive : une serie par point (averses
+    # decalees d'un point a l'autre) sur 96 heures, now_index 47
+    import numpy as np
+    import twice_run as twice
+    monkeypatch.chdir(tmp_path)
+    for nom in ("ARCHIVE", "CA", "PORTEFEUILLE", "RESEAU_OSM"):
+        monkeypatch.setattr(twice, nom, getattr(twice, nom))
+    twice.ARCHIVE = None
+    times = [(datetime(2026, 10, 15) + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in range(96)]
+
+    def source(points):
+        rng    = np.random.default_rng(3)
+        series = {}
+        for k, p in enumerate(points):
+            s = np.round(rng.gamma(0.5, 6.0, len(times)) * (rng.random(len(times)) < 0.4), 1)
+            s[20 + 5 * k:26 + 5 * k] += 18.0
+            series[p] = s.tolist()
+        return times, series, 47
+
+    monkeypatch.setattr(twice, "fetch_meteo_points", source)
@@ -0,0 +1,131 @@
+"""
+TWICE — Archive SQLite des runs (twice_archive)
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import twice_archive as archive
+import twice_format as fmt
+
+T0 = datetime(2026, 10, 1)
+
+
+def rapport(emis, debut_h=0, heures=24, perte=10.0, sites=("a", "b")):
+    # Rapport v3 minimal : heures de validite T0 + debut_h .. + heures, deux
+    # intervalles par site (perte puis 0 a partir de la mi-horizon)
+    times = [(T0 + timedelta(hours=debut_h + h)).strftime(fmt.FMT_TEMPS) for h in range(heures)]
+    m = heures // 2
+    return {
+        "generated_at": emis,
+        "now_index":    0,
+        "config_hash":  "test",
+        "hypotheses":   {"H1": "test"},
+        "temps":        fmt.encoder_temps(times),
+        "meteo":        {"points": [{"lat": 49.5, "lon": 6.1, "precipitation": [0.0] * heures,
+                                     "indice_alea": [0.0] * heures}]},
+        "routes":        ["A3"],
+        "statuts_codes": ["normal", "impacte", "coupe"],
+        "statuts":       {"debut": [0], "codes": [[0]]},
+        "resultats": [
+            {"site_id": sid, "site_nom": sid.upper(), "perte_totale_eur": perte * m,
+             "heures_normales": heures - m, "heures_degradees": m, "heures_arret": 0,
+             "accessibilite_min": 0.5,
+             "intervalles": {"debut": [0, m], "fin": [m, heures], "accessibilite": [0.5, 1.0],
+                             "taux_activite": [0.5, 1.0], "perte_eur": [perte, 0.0]}}
+            for sid in sites
+        ],
+    }
+
+
+@pytest.fixture
+def con(tmp_path):
+    c = archive.ouvrir(str(tmp_path / "archive.sqlite"))
+    yield c
+    c.close()
+
+
+def heure(h):
+    return (T0 + timedelta(hours=h)).strftime(fmt.FMT_TEMPS)
+
+
+def nombre(con, table):
+    return con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_ajouter(con):
+    run = archive.ajouter(con, rapport("2026-10-01T00:10:00+00:00"))
+    assert nombre(con, "runs") == 1 and nombre(con, "sites") == 2
+    assert nombre(con, "resultats") == 2 and nombre(con, "intervalles") == 4
+    archive.ajouter(con, rapport("2026-10-01T01:10:00+00:00"))
+    assert nombre(con, "sites") == 2     # sites partages entre runs
+    assert archive.entrees(con, run)["points"][0]["lat"] == 49.5
+    assert [r["emis"] for r in archive.runs(con)] == ["2026-10-01T00:10:00", "2026-10-01T01:10:00"]
+
+    with pytest.raises(ValueError):
+        archive.ajouter(con, rapport("2026-10-01T02:10:00+00:00", heures=0))
+
+
+def test_prevision(con):
+    archive.ajouter(con, rapport("2026-10-01T00:10:00+00:00", perte=10.0))
+    archive.ajouter(con, rapport("2026-10-01T01:10:00+00:00", perte=20.0, debut_h=1))
+
+    # Dernier run emis au plus tard a emis (fuseaux convertis en UTC)
+    p = archive.prevision(con, "a", "2026-10-01T02:30:00+02:00", heure(3))
+    assert (p["emis"], p["perte_eur"], p["taux_activite"]) == ("2026-10-01T00:10:00", 10.0, 0.5)
+    p = archive.prevision(con, "a", "2026-10-01T01:10:00+00:00", heure(3))
+    assert p["perte_eur"] == 20.0
+    # Bornes [debut, fin[ des intervalles : heure 12 -> second intervalle du run 1
+    assert archive.prevision(con, "b", "2026-10-01T00:30:00", heure(11))["perte_eur"] == 10.0
+    assert archive.prevision(con, "b", "2026-10-01T00:30:00", heure(12))["perte_eur"] == 0.0
+
+    assert archive.prevision(con, "a", "2026-10-01T00:30:00", heure(24)) is None    # hors horizon
+    assert archive.prevision(con, "x", "2026-10-01T00:30:00", heure(3)) is None     # site inconnu
+    assert archive.prevision(con, "a", "2026-09-30T23:00:00", heure(3)) is None     # avant tout run
+
+
+def test_evolution(con):
+    for k in range(5):
+        archive.ajouter(con, rapport(f"2026-10-01T{k:02d}:10:00+00:00", perte=float(k), debut_h=2 * k))
+
+    ev = archive.evolution(con, "a", heure(4), n_runs=3, emis="2026-10-01T23:00:00")
+    assert [e["emis"][11:13] for e in ev] == ["02", "03", "04"]        # plus anciens d'abord
+    # Le run 3 commence a l'heure 6, le run 4 a l'heure 8 : heure 4 hors horizon
+    assert [e["perte_eur"] for e in ev] == [2.0, None, None]
+
+    ev = archive.evolution(con, "a", heure(4), n_runs=48, emis="2026-10-01T01:30:00")
+    assert [e["perte_eur"] for e in ev] == [0.0, 1.0]
+    assert [t["perte_totale_eur"] for t in archive.totaux(con, "b", 2)] == [36.0, 48.0]
+
+
+def test_compacter(con):
+    emis = [
+        "2026-10-30T10:00:00",                          # < 14 j : tous gardes
+        "2026-10-25T08:00:00", "2026-10-25T20:00:00",
+        "2026-10-10T06:00:00", "2026-10-10T18:00:00",   # > 14 j : dernier du jour
+        "2026-10-09T23:59:59",
+        "2025-10-01T12:00:00",                          # > 365 j : supprime
+    ]
+    for e in emis:
+        archive.ajouter(con, rapport(e))
+
+    n = archive.compacter(con, maintenant="2026-10-31T00:00:00+00:00")
+    restants = [r["emis"] for r in archive.runs(con, 100)]
+    assert n == 2
+    assert restants == ["2026-10-09T23:59:59", "2026-10-10T18:00:00", "2026-10-25T08:00:00",
+                        "2026-10-25T20:00:00", "2026-10-30T10:00:00"]
+    # Resultats et intervalles des runs supprimes partent avec eux
+    assert nombre(con, "resultats") == 2 * len(restants)
+    assert nombre(con, "intervalles") == 4 * len(restants)
+    # Idempotent
+    assert archive.compacter(con, maintenant="2026-10-31T00:00:00+00:00") == 0
+
+
+def test_compacter_jour_utc(con):
+    # Les jours de retention sont ceux de emis (UTC) : 23:30+02:00 = 21:30 UTC
+    archive.ajouter(con, rapport("2026-10-02T23:30:00+02:00"))
+    archive.ajouter(con, rapport("2026-10-02T20:00:00+00:00"))
+    archive.ajouter(con, rapport("2026-10-03T00:30:00+02:00"))    # 2 oct. 22:30 UTC
+    assert archive.compacter(con, maintenant="2026-11-01T00:00:00") == 2
+    assert [r["emis"] for r in archive.runs(con)] == ["2026-10-02T22:30:00"]
@@ -0,0 +1,119 @@
+"""
+TWICE — Rejeu historique (twice_backfill) sur le portefeuille et le modele du run
+"""
+
+import json
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+import twice_backfill as backfill
+import twice_engine as engine
+import twice_run as twice
+
+HEURES = 24 * 75
+TIMES  = [(datetime(2026, 1, 1) + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in range(HEURES)]
+
+
+@pytest.fixture
+def portefeuille(monkeypatch, tmp_path):
+    # Trois sites localises (trois points meteo en plus de la zone), CA impose a l'un
+    sites = [
+        {"id": "nord", "nom": "Nord", "type": "entrepots", "ca_journalier": 240000, "lat": 49.56, "lon": 6.12,
+         "routes_critiques": {"A3_bettembourg": 3, "N31_bettembourg": 1}},
+        {"id": "sud", "nom": "Sud", "type": "entrepots", "ca_journalier": 90000, "lat": 49.48, "lon": 6.09,
+         "routes_critiques": {"route_wolser": 2, "voirie_interne": 1}},
+        {"id": "est", "nom": "Est", "type": "terminal", "ca_journalier": 500000, "lat": 49.52, "lon": 6.18,
+         "routes_critiques": {"N31_bettembourg": 2, "voirie_interne": 2, "hors_reseau": 1}},
+    ]
+    chemin = tmp_path / "portefeuille.json"
+    chemin.write_text(json.dumps({"sites": sites}), encoding="utf-8")
+    monkeypatch.setattr(twice, "PORTEFEUILLE", str(chemin))
+    monkeypatch.setattr(twice, "CA", {"sud": 120000.0})
+    monkeypatch.setattr("twice_portefeuille.REPERTOIRE", str(tmp_path / "instantanes"))
+    pf = twice.portefeuille()
+    return pf, twice.points_meteo(pf)
+
+
+def pluie(n_points, graine=0):
+    rng = np.random.default_rng(graine)
+    p = np.round(rng.gamma(0.5, 9.0, (n_points, HEURES)) * (rng.random((n_points, HEURES)) < 0.3), 1)
+    p[:, 500:504] += 20.0
+    return p
+
+
+def blocs(precip, taille):
+    return ((TIMES[i:i + taille], precip[:, i:i + taille]) for i in range(0, HEURES, taille))
+
+
+def test_memes_sites_et_pertes_que_le_run(portefeuille):
+    pf, points = portefeuille
+    precip = pluie(len(points))
+    agg, n_h, bornes = backfill.rejouer(blocs(precip, 24 * 31), sites_par_lot=2)
+    assert (n_h, bornes) == (HEURES, [TIMES[0], TIMES[-1]])
+    assert agg.mois == ["2026-01", "2026-02", "2026-03"]
+
+    # Run deterministe sur les memes heures : meme portefeuille (CA impose
+    # compris), memes points, meme modele
+    modele = engine.compiler(pf, twice.RESEAU_ROUTIER, twice.STATUT_VERS_SCORE)
+    params = twice.parametres({p: k for k, p in enumerate(points)}, pf)
+    ref    = twice.chronologie(modele, precip, params).agreger()
+    cols   = {c: np.stack(v, axis=1) for c, v in agg.colonnes.items()}
+    for c in ("heures_arret", "heures_degradees", "heures_normales"):
+        assert cols[c].sum(axis=1).tolist() == ref[c].tolist()
+    assert cols["accessibilite_min"].min(axis=1).tolist() == ref["accessibilite_min"].tolist()
+    assert np.round(cols["perte_eur"].sum(axis=1), 2).tolist() == ref["perte_totale_eur"].tolist()
+    assert ref["perte_totale_eur"][1] > 0 and ref["heures_arret"].sum() > 0
+
+
+def test_ecriture_par_site(portefeuille, tmp_path):
+    pf, points = portefeuille
+    agg, n_h, bornes = backfill.rejouer(blocs(pluie(len(points)), 24 * 31))
+    chemin = str(tmp_path / "backfill.json")
+    backfill.ecrire(agg, pf, n_h, bornes, {"type": "test"}, chemin)
+    with open(chemin, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["config_hash"] == twice.config_hash()
+    assert [s["site_id"] for s in data["sites"]] == ["nord", "sud", "est"]
+    assert all(len(s["perte_eur"]) == len(data["mois"]) for s in data["sites"])
+
+
+def test_serie_unique_pour_tous_les_points(portefeuille):
+    # Fichier local (une serie) : appliquee a chaque point meteo
+    pf, points = portefeuille
+    serie = pluie(1)[0]
+    agg_1, _, _ = backfill.rejouer(((t, p[0].tolist()) for t, p in blocs(serie[None, :], 100)))
+    agg_p, _, _ = backfill.rejouer(blocs(np.repeat(serie[None, :], len(points), axis=0), 100))
+    for c in agg_1.colonnes:
+        assert np.array_equal(np.stack(agg_1.colonnes[c]), np.stack(agg_p.colonnes[c]))
+
+
+def test_source_archive_multi_points(open_meteo, monkeypatch):
+    monkeypatch.setattr(backfill, "URL_ARCHIVE", open_meteo.url.replace("/forecast", "/archive"))
+    points = [(49.52, 6.11), (49.56, 6.12), (49.48, 6.09)]
+    sortie = list(backfill.source_archive(points, date(2026, 1, 1), date(2026, 3, 15), mois_par_requete=1))
+
+    dates = [(q["start_date"], q["end_date"]) for _, q, _, _ in open_meteo.requetes]
+    assert dates == [("2026-01-01", "2026-01-31"), ("2026-02-01", "2026-02-28"), ("2026-03-01", "2026-03-15")]
+    assert all(lot == points for lot in open_meteo.lots())
+    for times, precip in sortie:
+        assert precip == [[lat, lon] for lat, lon in points]
+
+
+def test_memes_agregats_quelle_que_soit_la_taille_des_blocs(portefeuille, tmp_path):
+    # Fenetre glissante, mois et evenements a cheval sur les blocs : fichier
+    # ecrit identique pour des blocs d'une heure comme d'un seul bloc
+    pf, points = portefeuille
+    precip = pluie(len(points), graine=4)
+    sorties = {}
+    for taille in (1, 2, 5, 37, 744, 9600):
+        agg, n_h, bornes = backfill.rejouer(blocs(precip, taille), sites_par_lot=2)
+        chemin = str(tmp_path / f"backfill_{taille}.json")
+        backfill.ecrire(agg, pf, n_h, bornes, {"type": "test"}, chemin)
+        with open(chemin, encoding="utf-8") as f:
+            sorties[taille] = json.load(f)
+    ref = sorties[744]
+    assert any(s["pires_evenements"] for s in ref["sites"])
+    for taille, data in sorties.items():
+        assert data == ref, taille
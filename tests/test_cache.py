@@ -0,0 +1,147 @@
+"""
+TWICE — Cache disque des reponses meteo (twice_cache) contre un serveur HTTP local
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+import twice_cache as cache
+import twice_meteo as meteo
+import twice_run as twice
+
+pytest.importorskip("requests")
+
+POINT = (49.525, 6.11)
+
+
+def horodatage(texte):
+    return datetime.fromisoformat(texte).replace(tzinfo=timezone.utc).timestamp()
+
+
+@pytest.fixture
+def horloge(monkeypatch):
+    # Heure vue par twice_cache (time.time), reglable
+    t = {"maintenant": horodatage("2026-10-17T10:20:00")}
+    monkeypatch.setattr(cache.time, "time", lambda: t["maintenant"])
+    return t
+
+
+def fetch():
+    return meteo.fetch_points([POINT], 1, 1)
+
+
+def statuts(serveur):
+    return [statut for *_, statut in serveur.requetes]
+
+
+def entree():
+    noms = [n for n in os.listdir(cache.REPERTOIRE) if n.endswith(".json")]
+    assert len(noms) == 1
+    with open(os.path.join(cache.REPERTOIRE, noms[0]), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_frais_jusqu_au_cycle_suivant():
+    # Cycle horaire publie 15 min apres l'heure : recu a 10:20, frais jusqu'a 11:15
+    meta = {"recu_a": horodatage("2026-10-17T10:20:00")}
+    assert cache.frais(meta, horodatage("2026-10-17T11:14:59"))
+    assert not cache.frais(meta, horodatage("2026-10-17T11:15:00"))
+    # Recu avant la publication du cycle de 10:00 : perime des 10:15
+    meta = {"recu_a": horodatage("2026-10-17T10:05:00")}
+    assert cache.frais(meta, horodatage("2026-10-17T10:14:59"))
+    assert not cache.frais(meta, horodatage("2026-10-17T10:15:00"))
+
+
+def test_reponse_fraiche_sans_requete(open_meteo, horloge):
+    premier = fetch()
+    horloge["maintenant"] = horodatage("2026-10-17T11:14:00")
+    assert fetch() == premier
+    assert statuts(open_meteo) == [200]
+
+
+def test_revalidation_etag_304(open_meteo, horloge):
+    open_meteo.etag = '"v1"'
+    premier = fetch()
+    horloge["maintenant"] = horodatage("2026-10-17T11:20:00")
+    assert fetch() == premier
+    assert statuts(open_meteo) == [200, 304]
+    assert open_meteo.requetes[1][2]["If-None-Match"] == '"v1"'
+    # Reponse conservee, reception remise a l'heure de la revalidation
+    e = entree()
+    assert e["payload"]["hourly"]["precipitation"] == list(POINT)
+    assert e["meta"]["recu_a"] == horloge["maintenant"]
+    fetch()
+    assert statuts(open_meteo) == [200, 304]
+
+
+def test_revalidation_last_modified(open_meteo, horloge):
+    open_meteo.last_modified = "Sat, 17 Oct 2026 10:00:00 GMT"
+    premier = fetch()
+    horloge["maintenant"] = horodatage("2026-10-17T12:20:00")
+    assert fetch() == premier
+    assert statuts(open_meteo) == [200, 304]
+    assert open_meteo.requetes[1][2]["If-Modified-Since"] == open_meteo.last_modified
+    assert "If-None-Match" not in open_meteo.requetes[1][2]
+
+
+def test_repli_sur_le_cache_si_reseau_en_echec(open_meteo, horloge, monkeypatch):
+    monkeypatch.setattr(meteo, "BACKOFF_S", 0)
+    premier = fetch()
+    horloge["maintenant"] = horodatage("2026-10-17T13:20:00")
+    open_meteo.pannes = meteo.TENTATIVES + 1
+    assert fetch() == premier
+    assert statuts(open_meteo) == [200] + [503] * (meteo.TENTATIVES + 1)
+
+
+def test_hors_ligne(open_meteo, horloge):
+    cache.configurer(hors_ligne=True)
+    with pytest.raises(RuntimeError, match="Hors ligne"):
+        fetch()
+    cache.configurer()
+    premier = fetch()
+    # Hors ligne, le cache sert quel que soit son age
+    cache.configurer(hors_ligne=True)
+    horloge["maintenant"] = horodatage("2026-10-20T10:00:00")
+    assert fetch() == premier
+    assert statuts(open_meteo) == [200]
+
+
+def test_eviction_lru_par_taille(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "REPERTOIRE", str(tmp_path))
+    payload = {"hourly": {"precipitation": [0.1] * 200}}
+    for k, t in (("a", 100), ("b", 200), ("c", 300)):
+        cache.ecrire(k, {"recu_a": 0}, payload)
+        os.utime(cache._chemin(k), (t, t))
+    taille = os.path.getsize(cache._chemin("a"))
+    # Place pour deux entrees : une lecture rajeunit a, b et c partent
+    monkeypatch.setattr(cache, "TAILLE_MAX_MO", 2.5 * taille / (1024 * 1024))
+    assert cache.lire("a")["payload"] == payload
+    cache.ecrire("d", {"recu_a": 0}, payload)
+    assert sorted(os.listdir(tmp_path)) == ["a.json", "d.json"]
+
+
+def test_instantane_puis_rejeu_identique(open_meteo, tmp_path, monkeypatch):
+    # Run complet enregistre, puis rejoue sans reseau : meme resultat
+    monkeypatch.chdir(tmp_path)
+    for nom in ("ARCHIVE", "CA"):
+        monkeypatch.setattr(twice, nom, getattr(twice, nom))
+    instantane = str(tmp_path / "instantane.json")
+
+    enregistre = twice.executer(twice.arguments(argparse.ArgumentParser()).parse_args(
+        ["--snapshot", instantane, "--sans-archive"]))
+    n = len(open_meteo.requetes)
+    open_meteo.pannes = 100
+    rejoue = twice.executer(twice.arguments(argparse.ArgumentParser()).parse_args(
+        ["--replay", instantane, "--sans-archive"]))
+
+    assert len(open_meteo.requetes) == n
+    for r in (enregistre, rejoue):
+        r.pop("generated_at")
+        r.pop("telemetry")
+    assert rejoue == enregistre
+    with open(instantane, encoding="utf-8") as f:
+        assert len(json.load(f)["reponses"]) == n
@@ -0,0 +1,168 @@
+"""
+TWICE — Moteur vectorise (twice_engine) contre les fonctions scalaires de twice_run
+Egalite exacte (==, pas d'approximation) sur pluies et reseaux tires au hasard.
+"""
+
+import numpy as np
+import pytest
+
+import twice_engine as engine
+import twice_run as twice
+
+HEURES = 120
+
+
+def pluie(rng, points=1):
+    # Averses de forte intensite et valeurs manquantes (None) comme dans Open-Meteo
+    p = np.round(rng.gamma(0.6, 8.0, (points, HEURES)) * (rng.random((points, HEURES)) < 0.4), 1)
+    p = p.astype(object)
+    p[rng.random(p.shape) < 0.03] = None
+    return p.tolist()
+
+
+def reseau(rng, n):
+    out = []
+    for k in range(n):
+        si = round(float(rng.uniform(0.1, 0.6)), 2)
+        out.append({"id": f"r{k}", "seuil_impact": si, "seuil_coupure": round(si + float(rng.uniform(0.05, 0.5)), 2)})
+    return out
+
+
+def sites(rng, routes, n, largeur_max):
+    # Poids entiers ou decimaux, dont des nuls ; une route absente du reseau
+    out = []
+    for i in range(n):
+        w   = int(rng.integers(1, largeur_max + 1))
+        ids = list(rng.choice(routes, size=min(w, len(routes)), replace=False))
+        if i % 4 == 0:
+            ids.append("absente")
+        poids = [int(rng.integers(0, 4)) if rng.random() < 0.5 else round(float(rng.uniform(0, 3)), 1)
+                 for _ in ids]
+        out.append({"id": f"s{i}", "ca_journalier": round(float(rng.uniform(1e3, 9e5)), 2),
+                    "routes_critiques": dict(zip(ids, poids))})
+    return out
+
+
+def reference(sites, reseau, precip, point_routes):
+    # Chaine scalaire de twice_run, heure par heure
+    indices = [twice.indice_alea(p) for p in precip]
+    out = []
+    for site in sites:
+        acc, taux, perte = [], [], []
+        for i in range(HEURES):
+            statuts = {r["id"]: twice.statut_route(r["seuil_impact"], r["seuil_coupure"], indices[point_routes[k]][i])
+                       for k, r in enumerate(reseau)}
+            a = twice.accessibilite(site, statuts)
+            t = twice.taux_activite(a)
+            acc.append(a)
+            taux.append(t)
+            perte.append(round((site["ca_journalier"] / 24.0) * (1.0 - t), 2))
+        out.append((acc, taux, perte))
+    return indices, out
+
+
+def simuler(modele, precip, point_routes):
+    return engine.simuler(modele, engine.en_tableau(precip), twice.FENETRE_GLISSANTE_H, twice.SEUIL_MAX_MM,
+                          twice.SEUIL_NORMAL, twice.SEUIL_ARRET, point_routes)
+
+
+@pytest.mark.parametrize("graine", range(4))
+@pytest.mark.parametrize("largeur_max", [engine.TABLE_MAX_ROUTES, engine.TABLE_MAX_ROUTES + 3])
+def test_chaine_identique_au_scalaire(graine, largeur_max):
+    rng      = np.random.default_rng(graine)
+    res      = reseau(rng, engine.TABLE_MAX_ROUTES + 4)
+    sts      = sites(rng, [r["id"] for r in res], 12, largeur_max)
+    precip   = pluie(rng, 3)
+    point_r  = rng.integers(0, 3, len(res)).tolist()
+    indices, ref = reference(sts, res, precip, point_r)
+
+    modele = engine.compiler(sts, res, twice.STATUT_VERS_SCORE)
+    sim    = simuler(modele, precip, point_r)
+    assert sim["indices"].tolist() == indices
+    for k, (acc, taux, perte) in enumerate(ref):
+        assert sim["accessibilite"][k].tolist() == acc
+        assert sim["taux_activite"][k].tolist() == taux
+        assert sim["perte_eur"][k].tolist() == perte
+
+    # Produit creux (sans tables) : memes valeurs
+    assert engine.accessibilite(modele, sim["statuts"]).tolist() == sim["accessibilite"].tolist()
+
+    agg = engine.agreger(sim)
+    for k, (acc, taux, perte) in enumerate(ref):
+        assert agg["perte_totale_eur"][k] == round(sum(perte), 2)
+        assert agg["heures_normales"][k] == sum(1 for t in taux if t == 1.0)
+        assert agg["heures_degradees"][k] == sum(1 for t in taux if 0 < t < 1.0)
+        assert agg["heures_arret"][k] == sum(1 for t in taux if t == 0.0)
+        assert agg["accessibilite_min"][k] == min(acc)
+
+
+def test_tables_et_repli_lru():
+    # Sites de TABLE_MAX_ROUTES routes (table dense) et au-dela (cache LRU)
+    rng   = np.random.default_rng(7)
+    res   = reseau(rng, engine.TABLE_MAX_ROUTES + 2)
+    ids   = [r["id"] for r in res]
+    sts   = [{"id": "table", "ca_journalier": 1e5, "routes_critiques": {r: k + 1 for k, r in enumerate(ids[:engine.TABLE_MAX_ROUTES])}},
+             {"id": "lru",   "ca_journalier": 2e5, "routes_critiques": {r: k + 1 for k, r in enumerate(ids + ["absente"])}}]
+    modele = engine.compiler(sts, res, twice.STATUT_VERS_SCORE)
+    tables = modele.table(twice.SEUIL_NORMAL, twice.SEUIL_ARRET)
+    assert tables.en_table[tables.groupe].tolist() == [True, False]
+
+    precip = pluie(rng, len(res))
+    point_r = list(range(len(res)))
+    _, ref = reference(sts, res, precip, point_r)
+    for _ in range(2):      # second passage : combinaisons servies par le LRU
+        sim = simuler(modele, precip, point_r)
+        for k, (acc, taux, perte) in enumerate(ref):
+            assert sim["accessibilite"][k].tolist() == acc
+            assert sim["taux_activite"][k].tolist() == taux
+            assert sim["perte_eur"][k].tolist() == perte
+    assert tables.lru[int(tables.groupe[1])]
+
+
+def test_tables_toutes_combinaisons():
+    # Toutes les combinaisons de statuts de 5 routes (une par heure) : table
+    # lue au code base 3 (route k de routes_critiques -> 3^k) == combinaison
+    ids = ["a", "b", "c", "d", "e"]
+    res = [{"id": r, "seuil_impact": 0.1, "seuil_coupure": 0.2} for r in ids]
+    sts = [{"id": "s1", "ca_journalier": 1e5,    "routes_critiques": {"c": 2}},
+           {"id": "s2", "ca_journalier": 2400.0, "routes_critiques": {"e": 1, "a": 2.5, "d": 0.5}},
+           {"id": "s3", "ca_journalier": 9e5,    "routes_critiques": {"e": 1, "a": 2.5, "d": 0.5}},
+           {"id": "s4", "ca_journalier": 5e4,    "routes_critiques": {"b": 1, "d": 3, "absente": 2, "a": 0}},
+           {"id": "s5", "ca_journalier": 7e3,    "routes_critiques": dict(zip(ids[::-1], [1, 2, 3, 1, 2]))}]
+    modele = engine.compiler(sts, res, twice.STATUT_VERS_SCORE)
+    tables = modele.table(twice.SEUIL_NORMAL, twice.SEUIL_ARRET)
+    # Memes poids, CA differents : une seule table ; poids nul final ignore
+    assert tables.groupe[1] == tables.groupe[2]
+    assert len(tables.configs[tables.groupe[3]]) == 3
+
+    combi = (np.arange(3 ** len(ids))[None, :] // 3 ** np.arange(len(ids))[:, None]) % 3
+    acc, taux, perte = tables(combi.astype(np.int8))
+    scores = tuple(modele.scores.tolist())
+    for i, site in enumerate(sts):
+        w  = len(tables.configs[tables.groupe[i]])
+        rc = site["routes_critiques"]
+        for j in range(combi.shape[1]):
+            codes = [int(combi[ids.index(r), j]) if r in ids else 0 for r in rc]
+            ref   = engine.combinaison(tuple(rc.values()), scores, codes, site["ca_journalier"],
+                                       twice.SEUIL_NORMAL, twice.SEUIL_ARRET)
+            assert (acc[i, j], taux[i, j], perte[i, j]) == ref, (site["id"], codes)
+            code = sum(c * 3 ** k for k, c in enumerate(codes[:w]))
+            assert tuple(tables.tables[tables.groupe[i], :, code].tolist()) == ref[:2]
+
+
+def test_route_absente_toujours_normale():
+    res = [{"id": "a", "seuil_impact": 0.1, "seuil_coupure": 0.2}]
+    sts = [{"id": "s", "ca_journalier": 2400, "routes_critiques": {"a": 1, "fantome": 1}}]
+    modele = engine.compiler(sts, res, twice.STATUT_VERS_SCORE)
+    sim = simuler(modele, [60.0] * HEURES, None)
+    # a coupee, fantome normale : accessibilite 0.5
+    assert sim["accessibilite"][0].tolist() == [twice.accessibilite(sts[0], {"a": "coupe"})] * HEURES == [0.5] * HEURES
+
+
+def test_arrondi_comme_round():
+    rng = np.random.default_rng(3)
+    # Demi-unites exactes et voisines, valeurs quelconques
+    x = np.concatenate([(np.arange(-2000, 2000) + 0.5) / 1000, rng.uniform(-5, 5, 5000),
+                        np.nextafter((np.arange(2000) + 0.5) / 1000, 1.0)])
+    for n in (2, 3):
+        assert engine.arrondi(x, n).tolist() == [round(v, n) for v in x.tolist()]
@@ -0,0 +1,45 @@
+"""
+TWICE — Mode ensemble (twice_ensemble) : sans bruit, chaque membre reproduit
+le run deterministe
+"""
+
+import json
+
+import numpy as np
+
+import twice_engine as engine
+import twice_ensemble as ensemble
+import twice_run as twice
+
+
+def test_perturbation_nulle():
+    rng    = np.random.default_rng(0)
+    precip = rng.gamma(0.5, 6.0, (3, 40))
+    for bruit, sigma, dec in (("multiplicatif", 0.0, 3), ("decalage", 0.5, 0), ("mixte", 0.0, 0)):
+        m = ensemble.perturber(precip, 4, rng, bruit, sigma, dec)
+        assert m.shape == (4, 3, 40)
+        assert all(np.array_equal(x, precip) for x in m), bruit
+
+
+def test_sigma_nul_egal_au_run_deterministe(meteo_fixe):
+    ref = twice.run()
+    ensemble.main(["--membres", "7", "--lot", "3", "--bruit", "multiplicatif", "--sigma", "0",
+                   "--seed", "1", "--workers", "1"])
+    with open("outputs/ensemble_latest.json", encoding="utf-8") as f:
+        data = json.load(f)
+
+    assert data["ensemble"]["n_membres"] == 7
+    assert [s["site_id"] for s in data["resultats"]] == [r["site_id"] for r in ref["resultats"]]
+    assert any(r["perte_totale_eur"] > 0 for r in ref["resultats"])
+    for s, r in zip(data["resultats"], ref["resultats"]):
+        pt = s["perte_totale_eur"]
+        assert pt["p10"] == pt["p50"] == pt["p90"] == pt["moyenne"] == r["perte_totale_eur"]
+        assert s["heures_arret"]["distribution"] == {str(r["heures_arret"]): 7}
+        # Chronologie horaire : pertes de chaque percentile = pertes du run
+        iv     = r["intervalles"]
+        perte  = np.repeat(iv["perte_eur"], np.subtract(iv["fin"], iv["debut"]))
+        taux   = np.repeat(iv["taux_activite"], np.subtract(iv["fin"], iv["debut"]))
+        for q in ensemble.PERCENTILES:
+            assert s["chronologie"][f"perte_p{q}"] == engine.arrondi(perte, 2).tolist()
+        assert s["chronologie"]["proba_arret"] == (taux == 0.0).astype(float).tolist()
+        assert s["chronologie"]["proba_degrade"] == ((taux > 0) & (taux < 1.0)).astype(float).tolist()
@@ -0,0 +1,103 @@
+"""
+TWICE — Chronologie par evenements (twice_evenements) : intervalles aux bords
+de l'horizon contre la chaine horaire
+"""
+
+import numpy as np
+import pytest
+
+import twice_engine as engine
+import twice_evenements as evenements
+import twice_run as twice
+
+
+@pytest.fixture(scope="module")
+def modele():
+    return engine.compiler(twice.portefeuille(), twice.RESEAU_ROUTIER, twice.STATUT_VERS_SCORE)
+
+
+def codes_au_hasard(modele, n, graine, bords=()):
+    # Statuts par paliers (quelques changements), plus des changements
+    # forces aux heures de bords
+    rng   = np.random.default_rng(graine)
+    codes = np.repeat(rng.integers(0, 3, (len(modele.route_ids), 1)), n, axis=1).astype(np.int8)
+    for h in [*rng.integers(0, max(n, 1), 4), *bords]:
+        codes[rng.integers(len(modele.route_ids)), h:] = rng.integers(0, 3)
+    return codes
+
+
+def horaire(modele, codes):
+    return engine.chaine(modele, codes, twice.SEUIL_NORMAL, twice.SEUIL_ARRET)
+
+
+def chronologie(modele, codes):
+    return evenements.evaluer_statuts(modele, codes, twice.SEUIL_NORMAL, twice.SEUIL_ARRET)
+
+
+def test_changements_aux_bords():
+    assert evenements.changements(np.zeros((2, 0))).tolist() == []
+    assert evenements.changements(np.zeros((2, 1))).tolist() == [0]
+    assert evenements.changements(np.zeros((2, 5))).tolist() == [0]
+    s = np.zeros((2, 5))
+    s[0, 1:] = 1
+    assert evenements.changements(s).tolist() == [0, 1]
+    s = np.zeros((2, 5))
+    s[1, 4] = 1
+    assert evenements.changements(s).tolist() == [0, 4]
+    # Plusieurs series (dont une a axe de tete) : union des changements
+    t = np.zeros((3, 2, 5))
+    t[2, 0, 2:] = 1
+    assert evenements.changements(s, t).tolist() == [0, 2, 4]
+
+
+@pytest.mark.parametrize("n, bords", [(1, ()), (2, (1,)), (48, (1, 47)), (48, (0,)), (200, (199,))])
+def test_intervalles_couvrent_l_horizon(modele, n, bords):
+    codes = codes_au_hasard(modele, n, n, bords)
+    chrono = chronologie(modele, codes)
+    ref    = horaire(modele, codes)
+    assert chrono.debuts[0] == 0 and chrono.longueurs.sum() == n
+    assert evenements.changements(codes).tolist() == chrono.debuts.tolist()
+    for c in ("accessibilite", "taux_activite", "perte_eur"):
+        assert chrono.heures(c).tolist() == ref[c].tolist(), c
+    for k in range(len(modele.ca_journalier)):
+        iv = chrono.site(k)
+        assert iv["debut"][0] == 0 and iv["fin"][-1] == n
+        assert iv["fin"][:-1] == iv["debut"][1:]
+        # Intervalles fusionnes : deux voisins different toujours
+        for c in ("accessibilite", "taux_activite", "perte_eur"):
+            assert np.repeat(iv[c], np.subtract(iv["fin"], iv["debut"])).tolist() == ref[c][k].tolist()
+        voisins = list(zip(iv["accessibilite"], iv["taux_activite"], iv["perte_eur"]))
+        assert all(a != b for a, b in zip(voisins, voisins[1:]))
+
+
+def test_changement_a_la_derniere_heure(modele):
+    # Seule la derniere heure differe : deux intervalles, le second d'une heure
+    n = 30
+    codes = np.zeros((len(modele.route_ids), n), dtype=np.int8)
+    codes[:, -1] = 2
+    chrono = chronologie(modele, codes)
+    assert chrono.debuts.tolist() == [0, n - 1]
+    assert chrono.longueurs.tolist() == [n - 1, 1]
+    assert chrono.agreger()["heures_normales"].tolist() == engine.agreger(horaire(modele, codes))["heures_normales"].tolist()
+
+
+@pytest.mark.parametrize("n", [1, 2, 37, 500])
+def test_agreger_comme_la_chaine_horaire(modele, n):
+    codes = codes_au_hasard(modele, n, 7 * n, (0, n - 1))
+    agg   = chronologie(modele, codes).agreger()
+    ref   = engine.agreger(horaire(modele, codes))
+    assert agg.keys() == ref.keys()
+    for c in ref:
+        assert agg[c].tolist() == ref[c].tolist(), c
+
+
+@pytest.mark.parametrize("bloc", [1, 7, 64, evenements.BLOC_H])
+def test_perte_totale_par_blocs(modele, monkeypatch, bloc):
+    # Somme sequentielle identique quel que soit le decoupage en blocs,
+    # y compris un bloc final partiel et un horizon de plus d'un bloc
+    monkeypatch.setattr(evenements, "BLOC_H", bloc)
+    n = 2 * bloc + 3 if bloc < 100 else bloc + 5
+    codes = codes_au_hasard(modele, n, bloc, (bloc - 1, bloc, n - 1))
+    ref   = engine.agreger(horaire(modele, codes))["perte_totale_eur"]
+    assert chronologie(modele, codes).perte_totale().tolist() == ref.tolist()
+    assert ref.sum() > 0
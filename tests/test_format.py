@@ -0,0 +1,231 @@
+"""
+TWICE — Format de resultats (twice_format) : v3 -> v2 -> structure historique
+Un fichier ecrit comme par le run d'origine (v1, un dict par heure), les
+formats v2 / v3 et le conteneur .npz doivent tous se relire, via charger(),
+en la meme structure historique.
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+import twice_engine as engine
+import twice_format as fmt
+import twice_run as twice
+
+HEURES    = 72
+NOW_INDEX = 40
+TIMES     = [f"2026-10-{16 + h // 24:02d}T{h % 24:02d}:00" for h in range(HEURES)]
+
+
+def pluie():
+    rng = np.random.default_rng(5)
+    p = np.round(rng.gamma(0.5, 6.0, HEURES) * (rng.random(HEURES) < 0.5), 1).astype(object)
+    p[30:34] += 25.0
+    p[12] = None
+    return p.tolist()
+
+
+def rapport_v1(times, precip, now_index):
+    # Structure ecrite par le run d'origine (chaine scalaire, un dict par heure)
+    indices = twice.indice_alea(precip)
+    resultats = []
+    for site in twice.SITES:
+        chrono = []
+        for i, idx in enumerate(indices):
+            statuts = {r["id"]: twice.statut_route(r["seuil_impact"], r["seuil_coupure"], idx)
+                       for r in twice.RESEAU_ROUTIER}
+            acc   = twice.accessibilite(site, statuts)
+            taux  = twice.taux_activite(acc)
+            chrono.append({
+                "time":             times[i],
+                "is_forecast":      i > now_index,
+                "precipitation_mm": float(precip[i] or 0),
+                "indice_alea":      indices[i],
+                "accessibilite":    acc,
+                "taux_activite":    taux,
+                "perte_eur":        round((site["ca_journalier"] / 24.0) * (1.0 - taux), 2),
+                "statuts_routes":   statuts,
+            })
+        resultats.append({
+            "site_id":           site["id"],
+            "site_nom":          site["nom"],
+            "type":              site["type"],
+            "ca_journalier_eur": site["ca_journalier"],
+            "perte_totale_eur":  round(sum(h["perte_eur"] for h in chrono), 2),
+            "heures_normales":   sum(1 for h in chrono if h["taux_activite"] == 1.0),
+            "heures_degradees":  sum(1 for h in chrono if 0 < h["taux_activite"] < 1.0),
+            "heures_arret":      sum(1 for h in chrono if h["taux_activite"] == 0.0),
+            "accessibilite_min": min(h["accessibilite"] for h in chrono),
+            "chronologie":       chrono,
+        })
+    return {
+        "projet":       "TWICE",
+        "zone":         "Bettembourg, Luxembourg",
+        "generated_at": "2026-10-17T16:00:00+00:00",
+        "now_index":    now_index,
+        "hypotheses":   twice.hypotheses(),
+        "meteo":        {"times": times, "precipitation": [float(p or 0) for p in precip], "now_index": now_index},
+        "indices_alea": indices,
+        "resultats":    resultats,
+    }
+
+
+def rapport_v3(times, precip, now_index):
+    # Meme run par la chaine actuelle (moteur, intervalles)
+    pf     = twice.portefeuille()
+    modele = engine.compiler(pf, twice.RESEAU_ROUTIER, twice.STATUT_VERS_SCORE)
+    times, now_index, points, rang, p = twice.entrees_meteo(pf, lambda pts: (times, {q: precip for q in pts}, now_index))
+    assert len(points) == 1
+    params = twice.parametres(rang, pf)
+    chrono = twice.chronologie(modele, p, params)
+    return twice.construire_rapport(pf, modele, chrono, times, now_index, points, p, [0] * len(pf))
+
+
+def en_json(v):
+    if isinstance(v, np.ndarray):
+        return v.tolist()
+    raise TypeError(type(v).__name__)
+
+
+def historique(data):
+    # Structure historique en objets JSON (chronologies materialisees)
+    return json.loads(json.dumps(data, default=lambda v: list(v) if isinstance(v, fmt.ChronologieSite) else en_json(v)))
+
+
+@pytest.fixture(scope="module")
+def v1():
+    return rapport_v1(TIMES, pluie(), NOW_INDEX)
+
+
+@pytest.fixture(scope="module")
+def v3():
+    return rapport_v3(TIMES, pluie(), NOW_INDEX)
+
+
+@pytest.fixture
+def fichiers(v1, v3, tmp_path):
+    chemins = {v: str(tmp_path / f"resultats_{v}.json") for v in ("v1", "v2", "v3")}
+    with open(chemins["v1"], "w", encoding="utf-8") as f:
+        json.dump(v1, f, ensure_ascii=False, indent=2)
+    with open(chemins["v2"], "w", encoding="utf-8") as f:
+        json.dump(fmt.etendre(v3), f, default=en_json)
+    fmt.ecrire_json(v3, chemins["v3"])
+    chemins["npz"] = str(tmp_path / "resultats.npz")
+    fmt.ecrire_npz(v3, chemins["npz"])
+    return chemins
+
+
+def sans_metadonnees(data, reference):
+    # Champs de la structure historique seulement (v3 ajoute config_hash,
+    # routes_critiques...) ; generated_at differe d'un run a l'autre
+    out = {k: data[k] for k in reference if k != "generated_at"}
+    out["resultats"] = [{k: s[k] for k in r} for s, r in zip(data["resultats"], reference["resultats"])]
+    return out
+
+
+def test_v1_relu_tel_quel(v1, fichiers):
+    assert all(r["perte_totale_eur"] > 0 for r in v1["resultats"])
+    assert historique(fmt.charger(fichiers["v1"])) == v1
+
+
+@pytest.mark.parametrize("version", ["v2", "v3", "npz"])
+def test_meme_structure_historique(v1, fichiers, version):
+    data = historique(fmt.charger(fichiers[version]))
+    assert sans_metadonnees(data, v1) == {k: v for k, v in v1.items() if k != "generated_at"}
+
+
+def test_v3_en_intervalles(v3):
+    # Moins d'intervalles que d'heures, bornes [debut, fin[ jointives
+    assert v3["version"] == fmt.VERSION
+    assert 1 < len(v3["statuts"]["debut"]) < HEURES
+    for r in v3["resultats"]:
+        iv = r["intervalles"]
+        assert iv["debut"][0] == 0 and iv["fin"][-1] == HEURES
+        assert iv["fin"][:-1] == iv["debut"][1:]
+    v2 = fmt.etendre(v3)
+    assert v2["version"] == fmt.VERSION_HORAIRE
+    assert v2["statuts"].shape == (len(twice.RESEAU_ROUTIER), HEURES)
+    assert fmt.etendre(v2) is v2
+
+
+def test_npz_projete_en_memoire(fichiers):
+    col = fmt.charger_colonnes(fichiers["npz"])
+    assert isinstance(col["statuts"], np.memmap)
+    assert all(isinstance(c, np.memmap) for r in col["resultats"] for c in r["colonnes"].values())
+    assert col["statuts"].tolist() == fmt.etendre(fmt.charger_colonnes(fichiers["v3"]))["statuts"].tolist()
+
+
+def chronologies_dicts(col):
+    # Chronologies telles que vers_legacy les construisait (list[dict] par site)
+    times  = fmt.decoder_temps(col["temps"])
+    points = col["meteo"]["points"]
+    codes  = np.asarray(col["statuts"]).reshape(len(col["routes"]), len(times)).T.tolist()
+    out = []
+    for r in col["resultats"]:
+        p = {k: np.asarray(points[r.get("point", 0)][k]).tolist() for k in ("precipitation", "indice_alea")}
+        c = {k: np.asarray(v).tolist() for k, v in r["colonnes"].items()}
+        out.append([{
+            "time":             times[i],
+            "is_forecast":      i > col["now_index"],
+            "precipitation_mm": p["precipitation"][i],
+            "indice_alea":      p["indice_alea"][i],
+            "accessibilite":    c["accessibilite"][i],
+            "taux_activite":    c["taux_activite"][i],
+            "perte_eur":        c["perte_eur"][i],
+            "statuts_routes":   {rid: engine.STATUTS[s] for rid, s in zip(col["routes"], codes[i])},
+        } for i in range(len(times))])
+    return out
+
+
+def test_chronologie_site_comme_liste_de_dicts(v3):
+    col  = fmt.etendre(v3)
+    refs = chronologies_dicts(col)
+    for s, ref in zip(fmt.vers_legacy(col)["resultats"], refs):
+        chrono = s["chronologie"]
+        assert isinstance(chrono, fmt.ChronologieSite)
+        assert len(chrono) == len(ref) == HEURES
+        # Champ par champ, types compris
+        for h, r in zip(chrono, ref):
+            assert h.keys() == r.keys()
+            for k in r:
+                assert h[k] == r[k] and type(h[k]) is type(r[k]), k
+        assert list(chrono) == ref
+        assert chrono == ref and ref == chrono and chrono == chrono
+        assert chrono != ref[:-1] and chrono != ref[:-1] + [dict(ref[-1], perte_eur=-1.0)]
+        assert chrono != tuple(ref)
+        for i in (0, NOW_INDEX, NOW_INDEX + 1, HEURES - 1, -1, -HEURES):
+            assert chrono[i] == ref[i], i
+        for i in (HEURES, -HEURES - 1):
+            with pytest.raises(IndexError):
+                chrono[i]
+        for t in (slice(None), slice(None, None, -1), slice(5, 50, 7), slice(-3, None), slice(HEURES, None)):
+            assert chrono[t] == ref[t], t
+        with pytest.raises(TypeError):
+            hash(chrono)
+
+
+@pytest.mark.parametrize("now_index", [-1, 0, 7, 8, NOW_INDEX, HEURES - 1])
+def test_masque_prevision(v3, now_index):
+    # Masque de bits (packbits, 8 heures par octet) : is_forecast = i > now_index
+    data   = fmt.vers_legacy(dict(fmt.etendre(v3), now_index=now_index))
+    chrono = data["resultats"][0]["chronologie"]
+    assert len(chrono.prevision) == (HEURES + 7) // 8
+    assert [h["is_forecast"] for h in chrono] == [i > now_index for i in range(HEURES)]
+    assert data["meteo"]["now_index"] == now_index
+
+
+def test_version_future_refusee(v3, tmp_path):
+    chemin = str(tmp_path / "futur.json")
+    fmt.ecrire_json(dict(v3, version=fmt.VERSION + 1), chemin)
+    with pytest.raises(ValueError, match="non supporte"):
+        fmt.charger(chemin)
+
+
+def test_temps_irregulier():
+    # Heures locales autour d'un changement d'heure : liste explicite
+    times = ["2026-10-25T01:00", "2026-10-25T02:00", "2026-10-25T02:00", "2026-10-25T03:00"]
+    assert fmt.encoder_temps(times) == {"liste": times}
+    assert fmt.decoder_temps(fmt.encoder_temps(TIMES)) == TIMES
+    assert "liste" not in fmt.encoder_temps(TIMES)
@@ -0,0 +1,146 @@
+"""
+TWICE — Accessibilite par graphe OSM (twice_graphe) : plus courts chemins
+incrementaux contre des arbres recalcules a chaque etat du reseau
+"""
+
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+import twice_engine as engine
+import twice_graphe as graphe
+import twice_run as twice
+
+N = 6     # grille N x N de noeuds
+
+# Route Wolser : voie de service doublant un troncon plus rapide (jamais dans un arbre)
+RESEAU = [dict(r, osm={"name": "Route Wolser"}) if r["id"] == "route_wolser" else r for r in twice.RESEAU_ROUTIER]
+
+
+@pytest.fixture(scope="module")
+def extrait(tmp_path_factory):
+    # Grille irreguliere : autoroute A3 (sens unique, deux chaussees) en
+    # colonne 0 avec echangeurs, N31 sur la ligne 2, voirie residentielle
+    # ailleurs, Route Wolser en parallele d'un troncon de la ligne 4
+    rng = np.random.default_rng(0)
+    noeuds = {}
+    for i, j in itertools.product(range(N), range(N)):
+        noeuds[i * N + j + 1] = (49.50 + 0.004 * i + rng.uniform(-0.001, 0.001),
+                                 6.08 + 0.006 * j + rng.uniform(-0.001, 0.001))
+    jonctions = {1 + 0 * N, 1 + 3 * N, 1 + 5 * N}
+    voies = []
+    colonne = [i * N + 1 for i in range(N)]
+    voies.append((colonne, {"highway": "motorway", "ref": "A3"}))
+    voies.append((colonne[::-1], {"highway": "motorway", "ref": "A3"}))
+    for i in range(N):
+        ligne = [i * N + j + 1 for j in range(N)]
+        tags  = {"highway": "primary", "ref": "N31"} if i == 2 else {"highway": "residential"}
+        voies.append((ligne, tags))
+    for j in range(1, N):
+        voies.append(([i * N + j + 1 for i in range(N)], {"highway": "secondary", "maxspeed": "40"}))
+    voies.append(([2 * N + 1, 2 * N + 2], {"highway": "motorway_link", "oneway": "no"}))
+    voies.append(([4 * N + 5, 4 * N + 6], {"highway": "service", "name": "Route Wolser"}))
+
+    lignes = ["<?xml version='1.0' encoding='UTF-8'?>", "<osm version='0.6'>"]
+    for nid, (lat, lon) in noeuds.items():
+        tag = "<tag k='highway' v='motorway_junction'/>" if nid in jonctions else ""
+        lignes.append(f"<node id='{nid}' lat='{lat}' lon='{lon}'>{tag}</node>")
+    for k, (refs, tags) in enumerate(voies):
+        nds = "".join(f"<nd ref='{r}'/>" for r in refs)
+        tgs = "".join(f"<tag k='{a}' v='{b}'/>" for a, b in tags.items())
+        lignes.append(f"<way id='{k + 1}'>{nds}{tgs}</way>")
+    lignes.append("</osm>")
+    chemin = tmp_path_factory.mktemp("osm") / "extrait.osm"
+    chemin.write_text("\n".join(lignes), encoding="utf-8")
+    return str(chemin)
+
+
+@pytest.fixture(scope="module")
+def g(extrait):
+    return graphe.charger(extrait, RESEAU)
+
+
+PORTES = [(49.512, 6.095), (49.503, 6.110), (49.518, 6.082)]
+
+
+def reference(g, portes, etat):
+    # Arbres recalcules depuis zero pour l'etat, memes ratios que Accessibilite
+    facteurs = np.array([twice.STATUT_VERS_VITESSE[s] for s in engine.STATUTS])
+    acc = graphe.Accessibilite(g, portes, twice.STATUT_VERS_VITESSE)
+
+    def temps(poids):
+        out = []
+        for porte, jonc in acc.paires:
+            sortant = graphe.dijkstra(g.sortants, porte, poids)[0]
+            entrant = graphe.dijkstra(g.entrants, porte, poids)[0]
+            out.append([sortant[j] for j in jonc] + [entrant[j] for j in jonc])
+        return out
+
+    libre  = temps(g.temps(facteurs[[0] * len(g.troncons_route)]))
+    actuel = temps(g.temps(facteurs[list(etat)]))
+    ratios = []
+    for l_site, t_site in zip(libre, actuel):
+        r = [(l / t if t < math.inf else 0.0) for l, t in zip(l_site, t_site) if l < math.inf]
+        ratios.append(sum(r) / len(r) if r else 1.0)
+    return engine.arrondi(np.array(ratios), 3).tolist()
+
+
+def test_lecture(g):
+    assert len(g.coords) == N * N
+    assert len(g.jonctions) == 3
+    # A3 couvre les deux chaussees de l'autoroute, N31 la ligne 2 dans les deux sens
+    assert len(g.troncons_route[0]) == 2 * (N - 1)
+    assert len(g.troncons_route[1]) == 2 * (N - 1)
+    assert g.troncons_route[2] == []
+    assert len(g.troncons_route[3]) == 2
+
+
+def test_incremental_egal_recalcule(g):
+    # Suite d'etats au hasard : apres chaque changement de statut, les
+    # arbres maintenus (ou recalcules s'ils sont invalides) donnent les memes ratios
+    acc = graphe.Accessibilite(g, PORTES, twice.STATUT_VERS_VITESSE)
+    rng = np.random.default_rng(1)
+    for _ in range(40):
+        etat = tuple(int(c) for c in rng.integers(0, 3, len(RESEAU)))
+        acc.memo.clear()
+        assert acc.etat(etat).tolist() == reference(g, PORTES, etat), etat
+
+
+def test_arbres_conserves_hors_chemins(g):
+    # Route Wolser hors de tous les arbres : ralentie, coupee puis retablie
+    # sans aucun recalcul ; N31 ralentie invalide les arbres qui l'empruntent
+    acc = graphe.Accessibilite(g, PORTES, twice.STATUT_VERS_VITESSE)
+    n   = acc.dijkstras
+    for etat, recalcul in (((0, 0, 0, 1), False), ((0, 0, 0, 2), False),
+                           ((0, 1, 0, 2), True), ((0, 1, 0, 0), False)):
+        acc.memo.clear()
+        assert acc.etat(etat).tolist() == reference(g, PORTES, etat)
+        assert (acc.dijkstras > n) == recalcul, etat
+        n = acc.dijkstras
+
+
+def test_coupure_et_memo(g):
+    acc = graphe.Accessibilite(g, PORTES, twice.STATUT_VERS_VITESSE)
+    assert acc.etat((0, 0, 0, 0)).tolist() == [1.0] * len(PORTES)
+    coupe = acc.etat((2, 2, 0, 0))
+    assert (coupe < 1.0).any()
+    n = acc.dijkstras
+    # codes (routes, heures) : un calcul par etat distinct, memorise
+    codes = np.array([[0, 2, 2, 0], [0, 2, 2, 0], [0, 0, 0, 0], [0, 0, 0, 0]], dtype=np.int8)
+    out = acc(codes)
+    assert out.shape == (len(PORTES), 4)
+    assert out[:, 1].tolist() == coupe.tolist() and out[:, 0].tolist() == [1.0] * len(PORTES)
+    assert acc.dijkstras == n
+
+
+def test_arbre_valide():
+    # Chemin 0 -> 1 -> 2 (troncons 0, 1) et raccourci 0 -> 2 (troncon 2)
+    ext   = [(0, 1), (1, 2), (0, 2)].__getitem__
+    arbre = ([0.0, 1.0, 2.0], [-1, 0, 1])
+    poids = [1.0, 1.0, 5.0]
+    assert graphe.arbre_valide(arbre, ext, [2], poids, [1.0, 1.0, 6.0])       # hors arbre, ralenti
+    assert graphe.arbre_valide(arbre, ext, [2], poids, [1.0, 1.0, 3.0])       # accelere, pas plus court
+    assert not graphe.arbre_valide(arbre, ext, [2], poids, [1.0, 1.0, 1.5])   # accelere, plus court
+    assert not graphe.arbre_valide(arbre, ext, [1], poids, [1.0, 2.0, 5.0])   # dans l'arbre, ralenti
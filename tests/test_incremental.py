@@ -0,0 +1,111 @@
+"""
+TWICE — Recalcul incremental (twice_incremental) contre un calcul complet
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import twice_engine as engine
+import twice_evenements as evenements
+import twice_format as fmt
+import twice_incremental as incr
+import twice_run as twice
+
+HEURES = 96
+POINTS = [(49.52, 6.10), (49.54, 6.12), (49.50, 6.08)]
+T0     = datetime(2026, 10, 10)
+
+
+def heures(decalage, n=HEURES):
+    return [(T0 + timedelta(hours=decalage + h)).strftime(fmt.FMT_TEMPS) for h in range(n)]
+
+
+def pluie(rng, n):
+    return np.round(rng.gamma(0.5, 10.0, (len(POINTS), n)) * (rng.random((len(POINTS), n)) < 0.4), 1)
+
+
+@pytest.fixture(scope="module")
+def contexte():
+    pf     = twice.portefeuille()
+    modele = engine.compiler(pf, twice.RESEAU_ROUTIER, twice.STATUT_VERS_SCORE)
+    params = {"fenetre": twice.FENETRE_GLISSANTE_H, "seuil_max": twice.SEUIL_MAX_MM,
+              "seuil_normal": twice.SEUIL_NORMAL, "seuil_arret": twice.SEUIL_ARRET,
+              "point_routes": [0, 1, 2, 1], "acces": None}
+    return pf, modele, params
+
+
+def ecrire_precedent(chemin, contexte, times, precip):
+    # Run complet ecrit comme twice_run.run (format v3, intervalles)
+    pf, modele, params = contexte
+    chrono = evenements.simuler(modele, precip, params["fenetre"], params["seuil_max"], params["seuil_normal"],
+                                params["seuil_arret"], params["point_routes"])
+    rapport = twice.construire_rapport(pf, modele, chrono, times, 0, POINTS, precip, [0] * len(pf))
+    fmt.ecrire_json(rapport, chemin)
+
+
+def complet(contexte, precip):
+    _, modele, p = contexte
+    return engine.simuler(modele, precip, p["fenetre"], p["seuil_max"], p["seuil_normal"], p["seuil_arret"],
+                          p["point_routes"])
+
+
+def test_identique_au_calcul_complet(contexte, tmp_path):
+    # Fenetre decalee (dans les deux sens), pluie modifiee sur des heures et
+    # points au hasard, dont les bords de la fenetre glissante
+    _, modele, params = contexte
+    chemin = str(tmp_path / "resultats.json")
+    rng    = np.random.default_rng(0)
+    for cas in range(200):
+        ancien = pluie(rng, HEURES + 40)
+        ecrire_precedent(chemin, contexte, heures(0), ancien[:, :HEURES])
+
+        d      = int(rng.integers(-6, 30))
+        precip = np.concatenate([np.zeros((len(POINTS), 6)), ancien], axis=1)[:, 6 + d:6 + d + HEURES].copy()
+        for _ in range(int(rng.integers(0, 4))):
+            precip[rng.integers(len(POINTS)), rng.integers(HEURES)] = round(float(rng.uniform(0, 40)), 1)
+
+        sim = incr.recalculer(chemin, twice.config_hash(), twice.hypotheses(), heures(d), precip, modele, params)
+        ref = complet(contexte, precip)
+        assert sim is not None
+        for k in ("indices", "statuts", "accessibilite", "taux_activite", "perte_eur"):
+            assert np.broadcast_to(sim[k], ref[k].shape).tolist() == ref[k].tolist(), (cas, k)
+
+
+def test_heures_propres_reprises(contexte, tmp_path):
+    _, modele, params = contexte
+    chemin = str(tmp_path / "resultats.json")
+    precip = pluie(np.random.default_rng(1), HEURES)
+    ecrire_precedent(chemin, contexte, heures(0), precip)
+
+    etat = incr.charger_etat(chemin, modele)
+    _, sale = incr.heures_a_recalculer(heures(0), precip, etat, params["fenetre"])
+    assert not sale.any()
+
+    # Une heure modifiee salit sa fenetre glissante : h .. h + fenetre - 1
+    modifiee = precip.copy()
+    modifiee[1, 40] += 5.0
+    _, sale = incr.heures_a_recalculer(heures(0), modifiee, etat, params["fenetre"])
+    assert np.flatnonzero(sale).tolist() == list(range(40, 40 + params["fenetre"]))
+
+
+def test_calcul_complet_force(contexte, tmp_path, monkeypatch):
+    _, modele, params = contexte
+    chemin = str(tmp_path / "resultats.json")
+    precip = pluie(np.random.default_rng(2), HEURES)
+    ecrire_precedent(chemin, contexte, heures(0), precip)
+    h, hyp = twice.config_hash(), twice.hypotheses()
+
+    def recalculer(config_hash, hypotheses):
+        return incr.recalculer(chemin, config_hash, hypotheses, heures(0), precip, modele, params)
+
+    assert recalculer(h, hyp) is not None
+    assert recalculer("autre", hyp) is None
+    assert recalculer(h, dict(hyp, H1="autre")) is None
+    monkeypatch.setattr(twice, "SEUIL_MAX_MM", twice.SEUIL_MAX_MM + 10)
+    assert recalculer(twice.config_hash(), twice.hypotheses()) is None
+    # Run precedent absent ou d'un autre portefeuille
+    assert incr.recalculer(str(tmp_path / "absent.json"), h, hyp, heures(0), precip, modele, params) is None
+    autre = engine.compiler(twice.SITES[:1], twice.RESEAU_ROUTIER, twice.STATUT_VERS_SCORE)
+    assert incr.charger_etat(chemin, autre) is None
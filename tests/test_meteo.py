@@ -0,0 +1,96 @@
+"""
+TWICE — Acquisition multi-points (twice_meteo) contre un serveur HTTP local
+Les requetes passent par la vraie chaine : session partagee avec reprises,
+twice_cache.get_json, lecture des reponses objet / liste.
+"""
+
+import time
+
+import pytest
+
+import twice_meteo as meteo
+
+pytest.importorskip("requests")
+
+
+def test_une_requete_par_maille(open_meteo):
+    g = meteo.GRILLE_DEG
+    # Trois points dans la meme maille, un dans la voisine
+    points = [(49.5, 6.1), (49.5 + g / 4, 6.1), (49.5, 6.1 - g / 4), (49.5 + g, 6.1)]
+    times, series = meteo.fetch_points(points, 1, 1)
+
+    assert open_meteo.lots() == [[(49.5, 6.1), (49.5 + g, 6.1)]]
+    q = open_meteo.requetes[0][1]
+    assert (q["hourly"], q["past_days"], q["forecast_days"]) == ("precipitation", "1", "1")
+    assert times == open_meteo.times
+    # Chaque point recoit la serie du representant de sa maille
+    assert list(series) == points
+    assert series[points[1]] == series[points[2]] == [49.5, 6.1]
+    assert series[points[3]] == [49.5 + g, 6.1]
+
+
+def test_point_unique_reponse_objet(open_meteo):
+    times, series = meteo.fetch_points([(49.5, 6.1)], 1, 1)
+    assert len(open_meteo.lots()) == 1
+    assert series == {(49.5, 6.1): [49.5, 6.1]}
+
+
+def test_decoupage_en_lots(open_meteo, monkeypatch):
+    monkeypatch.setattr(meteo, "POINTS_PAR_REQUETE", 3)
+    points = [(49.0 + k * meteo.GRILLE_DEG, 6.0) for k in range(8)]
+    _, series = meteo.fetch_points(points, 1, 1)
+
+    lots = open_meteo.lots()
+    assert len(lots) == 3
+    assert sorted(len(lot) for lot in lots) == [2, 3, 3]
+    assert sorted(p for lot in lots for p in lot) == points
+    assert all(series[p] == [p[0], p[1]] for p in points)
+
+
+def test_reassemblage_lots_desordonnes(open_meteo, monkeypatch):
+    # Lots [p0, p1] [p2, p3] [p4, p5] [p6] : le premier ne repond qu'une
+    # fois les trois autres servis
+    monkeypatch.setattr(meteo, "POINTS_PAR_REQUETE", 2)
+    monkeypatch.setattr(meteo, "CONCURRENCE", 4)
+    points = [(49.0 + k * meteo.GRILLE_DEG, 6.0) for k in range(7)]
+
+    def attente(lats):
+        fin = time.monotonic() + 5
+        while lats[0] == points[0][0] and len(open_meteo.requetes) < 3:
+            assert time.monotonic() < fin
+            time.sleep(0.005)
+
+    open_meteo.attente = attente
+    demandes = points + [(points[3][0], points[3][1] + meteo.GRILLE_DEG / 4)]
+    _, series = meteo.fetch_points(demandes, 1, 1)
+
+    lots = open_meteo.lots()
+    assert len(lots) == 4 and lots[-1][0] == points[0]
+    assert list(series) == demandes
+    for p in points:
+        assert series[p] == [p[0], p[1]]
+    assert series[demandes[-1]] == [points[3][0], points[3][1]]
+
+
+def test_reprise_apres_5xx(open_meteo):
+    open_meteo.pannes = 1
+    _, series = meteo.fetch_points([(49.5, 6.1), (49.6, 6.2)], 1, 1)
+    assert [statut for *_, statut in open_meteo.requetes] == [503, 200]
+    assert series[(49.6, 6.2)] == [49.6, 6.2]
+
+
+def test_fetch_horaire_url(open_meteo):
+    url = open_meteo.url.replace("/forecast", "/ensemble")
+    points = [(49.5, 6.1), (49.6, 6.2)]
+    times, horaire = meteo.fetch_horaire(points, {"hourly": "precipitation"}, url)
+    assert [chemin for chemin, *_ in open_meteo.requetes] == ["/v1/ensemble"]
+    assert horaire[points[1]]["precipitation"] == [49.6, 6.2]
+
+
+def test_session_partagee(open_meteo):
+    s = meteo.session()
+    assert meteo.session() is s
+    retry = s.get_adapter(open_meteo.url).max_retries
+    assert retry.total == meteo.TENTATIVES
+    assert retry.backoff_factor == meteo.BACKOFF_S
+    assert {429, 503} <= set(retry.status_forcelist)
@@ -0,0 +1,51 @@
+"""
+TWICE — Lecture des portefeuilles (twice_portefeuille)
+"""
+
+import json
+
+import pytest
+
+import twice_portefeuille as ptf
+
+EN_TETE = "id,nom,type,ca_journalier,routes_critiques\n"
+
+
+def ecrire(tmp_path, nom, texte):
+    chemin = tmp_path / nom
+    chemin.write_text(texte, encoding="utf-8")
+    return str(chemin)
+
+
+def test_csv_colonnes_et_matrice(tmp_path):
+    chemin = ecrire(tmp_path, "sites.csv", EN_TETE
+                    + "a,Site A,logistique,240000,A3:3;N31:2\n"
+                    + "b,,,0,N31:1\n")
+    pf = ptf.lire_csv(chemin)
+    assert pf.ids == ["a", "b"] and pf.noms == ["Site A", "b"]
+    assert pf.ca_journalier.tolist() == [240000.0, 0.0]
+    assert pf.route_ids == ["A3", "N31"]
+    assert pf.indptr.tolist() == [0, 2, 3] and pf.colonnes.tolist() == [0, 1, 1]
+    assert pf.poids_tot.tolist() == [5.0, 1.0]
+
+
+@pytest.mark.parametrize("ca", ["-1", "nan", "", "abc", "inf"])
+def test_csv_ca_invalide_nomme_la_ligne(tmp_path, ca):
+    chemin = ecrire(tmp_path, "sites.csv", EN_TETE + "a,A,,1000,A3:1\n" + f"b,B,,{ca},A3:1\n")
+    with pytest.raises(ValueError, match=r"sites\.csv:3 : ca_journalier"):
+        ptf.lire_csv(chemin)
+
+
+@pytest.mark.parametrize("ca", [-5, None, "NaN", "x"])
+def test_json_ca_invalide_nomme_le_site(tmp_path, ca):
+    sites = [{"id": "a", "ca_journalier": 1000, "routes_critiques": {"A3": 1}},
+             {"id": "b", "ca_journalier": ca, "routes_critiques": {"A3": 1}}]
+    chemin = ecrire(tmp_path, "sites.json", json.dumps({"sites": sites}))
+    with pytest.raises(ValueError, match=r"site 2 \('b'\) : ca_journalier"):
+        ptf.lire(chemin)
+
+
+def test_json_nan_litteral(tmp_path):
+    chemin = ecrire(tmp_path, "sites.json", '[{"id": "a", "ca_journalier": NaN, "routes_critiques": {}}]')
+    with pytest.raises(ValueError, match="ca_journalier"):
+        ptf.lire(chemin)
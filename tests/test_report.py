@@ -0,0 +1,161 @@
+"""
+TWICE — Rapport HTML (twice_report) sur un run construit en memoire
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import twice_engine as engine
+import twice_format as fmt
+import twice_report as report
+import twice_run as twice
+import twice_spatial as spatial
+import twice_telemetrie as tel
+
+HEURES = 72
+
+
+def source(points):
+    # Pluie synthetique par point, avec des episodes qui coupent les routes
+    times = [f"2026-10-{16 + h // 24:02d}T{h % 24:02d}:00" for h in range(HEURES)]
+    series = {}
+    for k, p in enumerate(points):
+        rng = np.random.default_rng(k)
+        pluie = np.round(rng.gamma(0.5, 6.0, HEURES) * (rng.random(HEURES) < 0.5), 1)
+        pluie[30:34] += 25.0
+        series[p] = pluie.tolist()
+    return times, series, 40
+
+
+def rapport_memoire(src=source):
+    # Meme enchainement que twice_run.run, sans ecriture ni archive
+    pf     = twice.portefeuille()
+    modele = engine.compiler(pf, twice.RESEAU_ROUTIER, twice.STATUT_VERS_SCORE)
+    times, now_index, points, rang, precip = twice.entrees_meteo(pf, src)
+    params = twice.parametres(rang, pf)
+    chrono = twice.chronologie(modele, precip, params)
+    return twice.construire_rapport(pf, modele, chrono, times, now_index, points, precip,
+                                    [rang[c] for c in pf.coordonnees(twice.coordonnees(twice.ZONE))],
+                                    params=params)
+
+
+@pytest.fixture(scope="module")
+def data():
+    return fmt.vers_legacy(fmt.etendre(rapport_memoire()))
+
+
+def test_rendu_en_flux_identique_a_generate(data, tmp_path):
+    dossiers = (str(tmp_path / "a"), str(tmp_path / "b"))
+    ecrits, pages = report.rendre(data, dossiers, workers=1)
+    assert ecrits == pages == 2 * (1 + len(data["resultats"]))
+    for d in dossiers:
+        with open(os.path.join(d, "rapport.html"), encoding="utf-8") as f:
+            assert f.read() == report.generate(data)
+        for k, s in enumerate(data["resultats"]):
+            with open(os.path.join(d, "sites", report.fichier_site(s["site_id"])), encoding="utf-8") as f:
+                assert f.read() == report.generate(data, k)
+    assert not [n for d in dossiers for n in os.listdir(os.path.join(d, "sites")) if n.endswith(".tmp")]
+
+
+def test_reecriture_seulement_si_changement(data, tmp_path):
+    dossiers = (str(tmp_path),)
+    report.rendre(data, dossiers, workers=1)
+    assert report.rendre(data, dossiers, workers=1)[0] == 0
+
+    # Seul l'horodatage change : rien n'est reecrit
+    autre = dict(data, generated_at="2030-01-01T00:00:00+00:00")
+    assert report.rendre(autre, dossiers, workers=1)[0] == 0
+
+    # Un site change : sa page et l'index
+    s0 = dict(data["resultats"][0], perte_totale_eur=data["resultats"][0]["perte_totale_eur"] + 1)
+    assert report.rendre(dict(data, resultats=[s0] + data["resultats"][1:]), dossiers, workers=1)[0] == 2
+
+
+def test_erreur_de_rendu_laisse_la_page_en_place(data, tmp_path):
+    chemin = str(tmp_path / "page.html")
+    report.ecrire_si_change([chemin], lambda out: out.write("avant"))
+
+    def echec(out):
+        out.write("debut")
+        raise RuntimeError("rendu interrompu")
+    with pytest.raises(RuntimeError):
+        report.ecrire_si_change([chemin], echec)
+    assert open(chemin, encoding="utf-8").read() == "avant"
+    assert os.listdir(tmp_path) == ["page.html"]
+
+
+def test_modules_charges_par_report():
+    # Chemin de report (twice.py report) : numpy pour les colonnes, ni le run
+    # ni l'acquisition meteo
+    code = "import sys, twice_report; print(' '.join(sorted(sys.modules)))"
+    sortie = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(report.__file__),
+                            capture_output=True, text=True, check=True)
+    charges = set(sortie.stdout.split())
+    assert "numpy" in charges
+    assert not charges & {"twice_run", "twice_graphe", "twice_meteo", "twice_cache", "requests"}
+
+
+def test_diagnostics_pic_rss_du_processus():
+    # Pic du processus, non decroissant d'une etape a l'autre ; les fichiers
+    # ecrits avant le renommage (rss_max_mo) restent lisibles
+    tel.demarrer()
+    for nom in ("a", "b"):
+        with tel.span(nom):
+            pass
+    a, b = tel.etapes()
+    if a["rss_processus_mo"] is not None:
+        assert 0 < a["rss_processus_mo"] <= b["rss_processus_mo"]
+    ancien = {"etape": "fetch", "mur_s": 0.5, "cpu_s": 0.1, "rss_max_mo": 123.4, "elements": 10}
+    assert "123.4" in report.ligne_diagnostic(ancien)
+    assert "RSS processus" in report._PAGE_DIAGNOSTICS
+
+
+def test_noms_de_sites_echappes(data):
+    nom = '<img src=x onerror="alert(1)"> & Cie'
+    s0  = dict(data["resultats"][0], site_nom=nom, type="<u>entrepot</u>")
+    d   = dict(data, resultats=[s0] + data["resultats"][1:])
+    for page in (report.generate(d), report.generate(d, 0)):
+        assert "<img src=x" not in page and "<u>entrepot" not in page
+        assert "&lt;img src=x onerror=&quot;alert(1)&quot;&gt; &amp; Cie" in page
+        assert "&lt;u&gt;entrepot&lt;/u&gt;" in page
+
+
+# ============================================================
+# PARITE DE LA SIMULATION "ET SI" (NOYAU JS <-> PYTHON)
+# ============================================================
+
+node = pytest.mark.skipif(shutil.which("node") is None, reason="node (Node.js) introuvable")
+
+
+@node
+def test_parite_simulation(data):
+    # Hypotheses du run (ses intervalles et agregats) + tirages perturbes
+    assert report.verifier_simulation(data, cas=25, graine=1) == 0
+
+
+@node
+def test_parite_simulation_routes_localisees(monkeypatch, tmp_path):
+    # Routes a points propres et a geometrie : une serie d'indices par route
+    reseau = [dict(r) for r in twice.RESEAU_ROUTIER]
+    reseau[0]["lat"], reseau[0]["lon"] = 49.49, 6.05
+    reseau[1]["geometrie"] = [[49.50, 6.08], [49.53, 6.13], [49.56, 6.15]]
+    monkeypatch.setattr(twice, "RESEAU_ROUTIER", reseau)
+    monkeypatch.setattr(spatial, "REPERTOIRE", str(tmp_path))
+    d = fmt.vers_legacy(fmt.etendre(rapport_memoire()))
+    assert len(d["modele"]["indices"]) > 1
+    assert report.verifier_simulation(d, cas=10, graine=2) == 0
+
+
+@node
+def test_parite_detecte_un_ecart(data, monkeypatch):
+    # Le test n'est pas vide : un noyau JS altere est signale
+    noyau = report._NOYAU_SIMULATION.replace("if (acc >= seuilNormal) return 1.0;",
+                                             "if (acc >= seuilNormal) return 0.999;")
+    assert noyau != report._NOYAU_SIMULATION
+    monkeypatch.setattr(report, "_NOYAU_SIMULATION", noyau)
+    assert report.verifier_simulation(data, cas=2) > 0
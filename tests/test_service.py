@@ -0,0 +1,174 @@
+"""
+TWICE — Service resident (twice_service) avec une source meteo simulee
+"""
+
+import argparse
+import asyncio
+import json
+
+import pytest
+
+import twice_run as twice
+import twice_service as service
+
+HEURES = 48
+TIMES  = [f"2026-10-{16 + h // 24:02d}T{h % 24:02d}:00" for h in range(HEURES)]
+
+
+class Source:
+    # Meme signature que twice_run.fetch_meteo_points ; pluie reglable
+    def __init__(self):
+        self.pluie = [0.0] * HEURES
+        self.appels = 0
+
+    def __call__(self, points):
+        self.appels += 1
+        return TIMES, {p: list(self.pluie) for p in points}, 30
+
+
+@pytest.fixture
+def source(monkeypatch):
+    monkeypatch.setattr(twice, "ARCHIVE", None)
+    return Source()
+
+
+@pytest.fixture
+def svc(source):
+    return service.Service(source=source)
+
+
+def get(svc, chemin, **entetes):
+    statut, ent, corps = svc.reponse("GET", chemin, {k.replace("_", "-"): v for k, v in entetes.items()})
+    return statut, ent, json.loads(corps) if corps else None
+
+
+def test_503_avant_premier_calcul(svc):
+    statut, ent, corps = get(svc, "/summary")
+    assert statut == 503
+    assert ent["Retry-After"]
+    assert "erreur" in corps
+
+
+def test_200_puis_304(svc):
+    assert svc.rafraichir()
+    statut, ent, corps = get(svc, "/summary")
+    assert statut == 200
+    assert corps["heures"] == HEURES and corps["sites"] == len(svc.pf)
+    etag = ent["ETag"]
+
+    statut, ent, corps = get(svc, "/summary", if_none_match=etag)
+    assert (statut, ent["ETag"], corps) == (304, etag, None)
+    assert get(svc, "/summary", if_none_match=f'W/{etag}, "autre"')[0] == 304
+    assert get(svc, "/summary", if_none_match='"autre"')[0] == 200
+
+
+def test_chronologie_et_404(svc):
+    svc.rafraichir()
+    sid = svc.pf.ids[0]
+    statut, _, corps = get(svc, f"/sites/{sid}/chronologie")
+    assert statut == 200
+    assert corps["site_id"] == sid and len(corps["chronologie"]) == HEURES
+
+    assert get(svc, "/sites/inconnu/chronologie")[0] == 404
+    assert get(svc, "/inexistant")[0] == 404
+    assert svc.reponse("POST", "/summary", {})[0] == 405
+
+
+def test_pas_de_recalcul_si_entrees_inchangees(svc, source):
+    assert svc.rafraichir()
+    etag = get(svc, "/sites")[1]["ETag"]
+    assert svc.rafraichir() is False
+    assert source.appels == 2 and svc.calculs == 1
+    assert get(svc, "/sites", if_none_match=etag)[0] == 304
+
+
+def test_nouvel_etag_si_entrees_changent(svc, source):
+    svc.rafraichir()
+    _, ent, avant = get(svc, "/sites")
+    source.pluie[20:24] = [30.0, 30.0, 30.0, 30.0]
+    assert svc.rafraichir()
+    statut, ent2, apres = get(svc, "/sites", if_none_match=ent["ETag"])
+    assert statut == 200 and ent2["ETag"] != ent["ETag"]
+    assert svc.calculs == 2
+    assert sum(s["perte_totale_eur"] for s in apres["sites"]) > sum(s["perte_totale_eur"] for s in avant["sites"])
+    assert get(svc, "/summary")[2]["version"] == 2
+
+
+def test_erreur_de_source_garde_le_dernier_calcul(svc, source):
+    asyncio.run(svc.actualiser())
+    etag = get(svc, "/summary")[1]["ETag"]
+
+    def panne(points):
+        raise OSError("source indisponible")
+    svc.source = panne
+    asyncio.run(svc.actualiser())
+    assert "OSError" in svc.erreur
+    assert get(svc, "/summary", if_none_match=etag)[0] == 304
+
+
+async def echanger(svc, *requetes):
+    # Requetes envoyees d'un bloc sur une connexion : (statut, en-tetes, corps)
+    # de chaque reponse lue, puis True si le serveur a ferme la connexion
+    serveur = await asyncio.start_server(svc.client, "127.0.0.1", 0)
+    port = serveur.sockets[0].getsockname()[1]
+    async with serveur:
+        lecteur, ecrivain = await asyncio.open_connection("127.0.0.1", port)
+        ecrivain.write(b"".join(requetes))
+        await ecrivain.drain()
+        reponses = []
+        while True:
+            try:
+                tete = await asyncio.wait_for(lecteur.readuntil(b"\r\n\r\n"), 5)
+            except asyncio.IncompleteReadError:
+                break
+            lignes  = tete.decode("latin-1").split("\r\n")
+            entetes = {k.lower(): v.strip() for k, v in (l.split(":", 1) for l in lignes[1:] if ":" in l)}
+            corps   = await lecteur.readexactly(int(entetes["content-length"]))
+            reponses.append((int(lignes[0].split(" ")[1]), entetes, corps))
+            if len(reponses) == len(requetes) or entetes["connection"] == "close":
+                break
+        ferme = await asyncio.wait_for(lecteur.read(), 5) == b""
+        ecrivain.close()
+    return reponses, ferme
+
+
+def test_keep_alive_apres_corps_de_requete(svc):
+    # Le corps du POST est lu et ignore : le GET suivant est servi sur la connexion
+    svc.rafraichir()
+    reponses, ferme = asyncio.run(echanger(
+        svc,
+        b"POST /summary HTTP/1.1\r\nContent-Length: 11\r\n\r\nGET /sites ",
+        b"GET /summary HTTP/1.1\r\n\r\n",
+        b"GET /sites HTTP/1.1\r\nConnection: close\r\n\r\n"))
+    assert [r[0] for r in reponses] == [405, 200, 200]
+    assert json.loads(reponses[1][2])["sites"] == len(svc.pf)
+    assert "sites" in json.loads(reponses[2][2])
+    assert ferme
+
+
+@pytest.mark.parametrize("entete, statut", [(b"Transfer-Encoding: chunked", 405),
+                                            (b"Content-Length: %d" % (service.CORPS_MAX_KO * 1024 + 1), 405),
+                                            (b"Content-Length: -3", 400),
+                                            (b"Content-Length: abc", 400)])
+def test_corps_non_lu_ferme_la_connexion(svc, entete, statut):
+    svc.rafraichir()
+    reponses, ferme = asyncio.run(echanger(
+        svc, b"POST /summary HTTP/1.1\r\n" + entete + b"\r\n\r\n", b"GET /summary HTTP/1.1\r\n\r\n"))
+    assert [r[0] for r in reponses] == [statut]
+    assert reponses[0][1]["connection"] == "close" and ferme
+
+
+def test_options_du_run(monkeypatch, tmp_path):
+    # Memes options de configuration et d'archive que le run, plus hote / port / periode
+    run_opts = {a.dest for a in twice.arguments(argparse.ArgumentParser())._actions}
+    svc_opts = {a.dest for a in service.arguments(argparse.ArgumentParser())._actions}
+    assert svc_opts - run_opts == {"hote", "port", "periode"}
+    assert run_opts - svc_opts == {"snapshot", "incremental", "npz", "profil"}
+
+    for nom in ("ARCHIVE", "CA", "PORTEFEUILLE"):
+        monkeypatch.setattr(twice, nom, getattr(twice, nom))
+    a = service.arguments(argparse.ArgumentParser()).parse_args(
+        ["--portefeuille", "sites.csv", "--ca", "eurohub_sud=500000", "--sans-archive", "--port", "0"])
+    twice.configurer_archive(a)
+    twice.configurer(a)
+    assert (twice.PORTEFEUILLE, twice.CA, twice.ARCHIVE, a.port) == ("sites.csv", {"eurohub_sud": 500000.0}, None, 0)
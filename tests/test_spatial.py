@@ -0,0 +1,96 @@
+"""
+TWICE — Alea spatialise par troncon (twice_spatial) : parts de longueur par
+maille, moyenne ponderee par segment, maximum par route
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import twice_engine as engine
+import twice_meteo as meteo
+import twice_spatial as spatial
+
+G   = meteo.GRILLE_DEG
+LAT = 2475.2 * G   # milieu de la rangee de mailles 2475
+
+
+def point(x):
+    # Point de la rangee LAT, x en mailles de longitude
+    return (LAT, x * G)
+
+
+def test_segment_dans_une_maille():
+    assert spatial.mailles_segment(point(304.1), point(304.4)) == [((2475, 304), 1.0)]
+    # Segment degenere : sa maille, part 1
+    assert spatial.mailles_segment(point(304.1), point(304.1)) == [((2475, 304), 1.0)]
+
+
+def test_parts_de_longueur_par_maille():
+    # 304.25 -> 305.25 : bord de maille a 304.5, un quart puis trois quarts
+    parts = dict(spatial.mailles_segment(point(304.25), point(305.25)))
+    assert parts.keys() == {(2475, 304), (2475, 305)}
+    assert parts[(2475, 304)] == pytest.approx(0.25)
+    assert parts[(2475, 305)] == pytest.approx(0.75)
+    # Diagonale a travers trois mailles, dans les deux sens : memes parts, somme 1
+    a, b = (2474.8 * G, 304.1 * G), (2476.1 * G, 305.4 * G)
+    aller, retour = dict(spatial.mailles_segment(a, b)), dict(spatial.mailles_segment(b, a))
+    assert aller.keys() == retour.keys() and len(aller) >= 3
+    assert all(aller[m] == pytest.approx(retour[m]) for m in aller)
+    assert sum(aller.values()) == pytest.approx(1.0)
+
+
+@pytest.fixture
+def repertoire(monkeypatch, tmp_path):
+    monkeypatch.setattr(spatial, "REPERTOIRE", str(tmp_path))
+    return tmp_path
+
+
+def test_index_en_cache_disque(repertoire):
+    geometries = [[point(304.25), point(305.25), point(306.5)], None]
+    index = spatial.indexer(geometries)
+    assert index["seg_route"].tolist() == [0, 0]
+    assert index["debut"].tolist() == [0, 2]
+    assert os.listdir(repertoire) == [spatial.cle([list(map(list, geometries[0])), []], G) + ".npz"]
+    relu = spatial.indexer(geometries)
+    assert all(np.array_equal(relu[k], index[k]) for k in index)
+    # Autre grille, autre cle
+    spatial.indexer(geometries, 2 * G)
+    assert len(os.listdir(repertoire)) == 2
+
+
+def test_projection_moyenne_ponderee_puis_maximum(repertoire):
+    # Route 0 : segments 304.25 -> 305.25 (1/4, 3/4) puis 305.25 -> 306.5
+    # (1/5, 4/5) ; route 1 sans geometrie, alimentee par son point
+    geometries = [[point(304.25), point(305.25), point(306.5)], None]
+    index  = spatial.indexer(geometries)
+    ponct  = (49.6, 6.2)
+    points = [ponct] + spatial.centres(index)
+    rang   = {p: k for k, p in enumerate(points)}
+    proj   = spatial.Projection(index, rang, [None, ponct])
+
+    rng     = np.random.default_rng(0)
+    indices = engine.arrondi(rng.uniform(0, 1.5, (len(points), 48)), 3)
+    c304, c305, c306 = (rang[p] for p in spatial.centres(index))
+    seg  = proj.segments(indices)
+    pond = engine.arrondi(0.25 * indices[c304] + 0.75 * indices[c305], 3)
+    assert np.allclose(seg[0], pond, atol=1e-12)
+    assert np.allclose(seg[1], engine.arrondi(0.2 * indices[c305] + 0.8 * indices[c306], 3), atol=1e-12)
+
+    routes = proj(indices)
+    assert routes.shape == (2, 48)
+    assert routes[0].tolist() == np.maximum(seg[0], seg[1]).tolist()
+    assert routes[1].tolist() == indices[rang[ponct]].tolist()
+    # Axes en tete (membres d'ensemble) conserves
+    assert proj(np.stack([indices, indices]))[1].tolist() == routes.tolist()
+
+
+def test_sans_geometrie_projection_ponctuelle(repertoire):
+    points = [(49.5, 6.1), (49.6, 6.2)]
+    rang   = {p: k for k, p in enumerate(points)}
+    proj   = spatial.Projection(spatial.indexer([None, None, None]), rang, [points[1], points[0], points[1]])
+    assert proj.ponctuel
+    indices = np.arange(2 * 5, dtype=float).reshape(2, 5)
+    assert proj(indices).tolist() == indices[[1, 0, 1]].tolist()
+    assert os.listdir(repertoire) == []
@@ -0,0 +1,61 @@
+"""
+TWICE — Balayage d'hypotheses (twice_sweep) contre le run deterministe
+"""
+
+import json
+
+import pytest
+
+import twice_run as twice
+import twice_sweep as sweep
+
+
+def balayer(*args):
+    sweep.main(list(args))
+    with open(sweep.SORTIE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def pertes_run():
+    return [r["perte_totale_eur"] for r in twice.run()["resultats"]]
+
+
+def test_point_unique_egal_au_run(meteo_fixe):
+    ref  = pertes_run()
+    data = balayer("--param", f"SEUIL_MAX_MM={twice.SEUIL_MAX_MM}")
+    assert any(ref)
+    assert data["combinaisons"]["perte_totale_eur"] == [ref]
+    assert data["perte_base_eur"] == round(sum(ref), 2)
+
+
+def test_point_unique_portefeuille_et_ca(meteo_fixe, tmp_path):
+    # Memes options que le run : portefeuille et CA imposes
+    chemin = tmp_path / "sites.json"
+    chemin.write_text(json.dumps({"sites": [
+        {"id": "nord", "nom": "Nord", "type": "entrepots", "ca_journalier": 240000, "lat": 49.56, "lon": 6.12,
+         "routes_critiques": {"A3_bettembourg": 3, "N31_bettembourg": 1}},
+        {"id": "sud", "nom": "Sud", "type": "entrepots", "ca_journalier": 90000,
+         "routes_critiques": {"route_wolser": 2, "voirie_interne": 1}},
+    ]}), encoding="utf-8")
+    data = balayer("--portefeuille", str(chemin), "--ca", "sud=120000", "--param", f"SEUIL_ARRET={twice.SEUIL_ARRET}")
+    # Options appliquees a la configuration du run (restauree par meteo_fixe)
+    assert twice.CA == {"sud": 120000.0}
+    assert data["sites"] == ["nord", "sud"]
+    assert data["combinaisons"]["perte_totale_eur"] == [pertes_run()]
+
+
+@pytest.mark.parametrize("nom, valeur", [("SEUIL_MAX_MM", 20.0), ("FENETRE_GLISSANTE_H", 6),
+                                         ("SEUIL_NORMAL", 0.9), ("seuil_coupure.N31_bettembourg", 0.5)])
+def test_point_hors_base_egal_au_run_modifie(meteo_fixe, monkeypatch, nom, valeur):
+    # Un point du balayage = run avec l'hypothese modifiee ; la base est
+    # evaluee d'abord pour que l'etage memoise soit reellement reutilise
+    data = balayer("--param", f"{nom}={sweep.valeurs_base()[nom]},{valeur}")
+    if "." in nom:
+        champ, rid = nom.split(".")
+        reseau = [dict(r, **{champ: valeur}) if r["id"] == rid else r for r in twice.RESEAU_ROUTIER]
+        monkeypatch.setattr(twice, "RESEAU_ROUTIER", reseau)
+    else:
+        monkeypatch.setattr(twice, nom, valeur)
+    assert data["combinaisons"]["perte_totale_eur"][1] == pertes_run()
+    assert data["memo"]["cumul"]["calculs"] == (2 if nom == "FENETRE_GLISSANTE_H" else 1)
+    assert data["memo"]["modele"]["calculs"] == 1